@@ -7,18 +7,31 @@ from flask_login import LoginManager, current_user, logout_user
 from flask_migrate import Migrate
 from flask_caching import Cache
 from whitenoise import WhiteNoise
-from extensions import cache, csrf
+from werkzeug.local import LocalProxy
+from extensions import cache, csrf, realtime, assets, genesis
+from services.assets import is_immutable
 from dotenv import load_dotenv
 from models import db, User, StudyRoom, ProjectInvite
 from routes.auth import auth as auth_bp
 from routes import main_bp, projects_bp, social_bp, study_bp, api_bp, schedule_bp, settings_bp
-from utils import format_minutes, get_pending_invite
+from utils import format_minutes, get_pending_invite, get_active_room, get_focus_minutes, get_unread_count, request_memo
 from services.achievement_service import seed_achievements
+from services.focus_stats_service import register_focus_stats_listeners
+from services.presence_service import init_presence, get_presence
+from services.reminder_service import init_reminders
+from services.room_service import init_rooms
+from services.post_commit import init_post_commit
+from services.job_service import init_jobs
+from services.notification_service import register_notification_listeners
+from services.friend_service import register_friend_listeners
+from services.search_service import register_search_listeners, alembic_include_object
+from commands import register_commands
 
 load_dotenv()
 
 app = Flask(__name__)
-app.wsgi_app = WhiteNoise(app.wsgi_app, root='static/', prefix='static/')
+# Fingerprinted build output (static/dist) is served with far-future cache headers
+app.wsgi_app = WhiteNoise(app.wsgi_app, root='static/', prefix='static/', immutable_file_test=is_immutable)
 
 # Configure logging
 if not app.debug:
@@ -65,8 +78,38 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Realtime push (SSE). The in-process broker only reaches subscribers in the same worker,
+# so fan out through Postgres LISTEN/NOTIFY whenever we're on Postgres.
+default_realtime = 'postgres' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') else 'memory'
+app.config['REALTIME_BACKEND'] = os.environ.get('REALTIME_BACKEND', default_realtime)
+
+# Buffered presence heartbeats are written from a background thread in each worker
+app.config['PRESENCE_FLUSHER'] = not os.environ.get('MODO_TESTING')
+# Event reminders fire from a background thread in each worker (claims are race-safe);
+# disable it here when `flask reminders run --loop` runs as a separate process
+app.config['REMINDER_SCHEDULER'] = not os.environ.get('MODO_TESTING') and os.environ.get('REMINDER_SCHEDULER', '1') != '0'
+# Same for expiring idle study rooms (`flask rooms sweep --loop`)
+app.config['ROOM_SWEEPER'] = not os.environ.get('MODO_TESTING') and os.environ.get('ROOM_SWEEPER', '1') != '0'
+# Post-commit hooks (e.g. achievements after a logged session) run once the response is sent;
+# tests run them before the view returns so they can assert on the results
+app.config['POST_COMMIT_DEFERRED'] = not os.environ.get('MODO_TESTING')
+# Each worker drains the job queue from a background thread; disable it here when
+# `flask jobs work` runs as a separate process. Tests run jobs as soon as they commit.
+app.config['JOB_WORKER'] = not os.environ.get('MODO_TESTING') and os.environ.get('JOB_WORKER', '1') != '0'
+app.config['JOB_EAGER'] = bool(os.environ.get('MODO_TESTING'))
+
 # Caching Configuration
-app.config['CACHE_TYPE'] = 'SimpleCache'
+# SimpleCache is per-process, so by default share a filesystem cache between all
+# gunicorn workers on the host. CACHE_TYPE (e.g. RedisCache + CACHE_REDIS_URL) can
+# point at an external backend for multi-host deploys.
+if os.environ.get('MODO_TESTING'):
+    app.config['CACHE_TYPE'] = 'SimpleCache'
+else:
+    app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'FileSystemCache')
+    app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(app.instance_path, 'cache'))
+    app.config['CACHE_THRESHOLD'] = int(os.environ.get('CACHE_THRESHOLD', 5000))
+    if os.environ.get('CACHE_REDIS_URL'):
+        app.config['CACHE_REDIS_URL'] = os.environ['CACHE_REDIS_URL']
 app.config['CACHE_DEFAULT_TIMEOUT'] = 300
 
 # Session Security (Production)
@@ -77,9 +120,22 @@ if not app.debug and not os.environ.get('MODO_TESTING'):
     app.config['SESSION_COOKIE_HTTPONLY'] = True
 
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=alembic_include_object)
 cache.init_app(app)
 csrf.init_app(app)
+realtime.init_app(app)
+assets.init_app(app)
+genesis.init_app(app)
+init_presence(app)
+init_reminders(app)
+init_rooms(app)
+init_post_commit(app)
+init_jobs(app)
+register_focus_stats_listeners()
+register_notification_listeners()
+register_friend_listeners()
+register_search_listeners()
+register_commands(app)
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -139,13 +195,14 @@ def internal_error(error):
 def inject_active_sync():
     if not current_user.is_authenticated:
         return {}
-    active_room = StudyRoom.query.filter(
-        ((StudyRoom.host_id == current_user.id) | (StudyRoom.guest_id == current_user.id)),
-        StudyRoom.status == 'active'
-    ).first()
+    user_id = current_user.id
+    # Proxies defer each query until a template actually reads the value; the
+    # request memo then shares the result across every partial in the request
     return {
-        'active_sync_room': active_room,
-        'amoled_unlocked': current_user.total_focus_hours >= 10,
+        'active_sync_room': LocalProxy(lambda: get_active_room(user_id)),
+        'amoled_unlocked': LocalProxy(lambda: get_focus_minutes(user_id) >= 600),
+        'unread_notification_count': LocalProxy(lambda: get_unread_count(user_id)),
+        'current_presence': LocalProxy(lambda: request_memo(('presence', user_id), lambda: get_presence(current_user))),
         'now': datetime.now(timezone.utc).replace(tzinfo=None)
     }
 
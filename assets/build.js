@@ -0,0 +1,55 @@
+// Builds static/dist/: the purged, minified Tailwind stylesheet and vendored JS
+// libraries, plus the app's own CSS/JS, each copied under a content-hashed name.
+// manifest.json maps logical names to those files for services/assets.py.
+const { execFileSync } = require('child_process');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+
+const ROOT = path.resolve(__dirname, '..');
+const STATIC = path.join(ROOT, 'static');
+const DIST = path.join(STATIC, 'dist');
+const HASH_LENGTH = 12;
+
+const VENDOR = {
+    'vendor/htmx.min.js': 'node_modules/htmx.org/dist/htmx.min.js',
+    'vendor/alpine.min.js': 'node_modules/alpinejs/dist/cdn.min.js',
+    'vendor/sortable.min.js': 'node_modules/sortablejs/Sortable.min.js',
+};
+
+// Served from static/ under their own names too; sw.js must keep a stable URL
+const OWN = ['css/styles.css', 'js/events.js', 'js/outbox.js', 'js/timer.js', 'js/vim.js'];
+
+function fingerprint(manifest, logical, contents) {
+    const hash = crypto.createHash('sha256').update(contents).digest('hex').slice(0, HASH_LENGTH);
+    const ext = path.extname(logical);
+    const hashed = `dist/${logical.slice(0, -ext.length)}.${hash}${ext}`;
+    fs.mkdirSync(path.dirname(path.join(STATIC, hashed)), { recursive: true });
+    fs.writeFileSync(path.join(STATIC, hashed), contents);
+    manifest[logical] = hashed;
+}
+
+function build() {
+    fs.rmSync(DIST, { recursive: true, force: true });
+    fs.mkdirSync(DIST, { recursive: true });
+    const manifest = {};
+
+    const css = path.join(DIST, 'app.css');
+    execFileSync(path.join(ROOT, 'node_modules/.bin/tailwindcss'),
+        ['-c', 'tailwind.config.js', '-i', 'assets/app.css', '-o', css, '--minify'],
+        { cwd: ROOT, stdio: 'inherit' });
+    fingerprint(manifest, 'app.css', fs.readFileSync(css));
+    fs.rmSync(css);
+
+    for (const [logical, source] of Object.entries(VENDOR)) {
+        fingerprint(manifest, logical, fs.readFileSync(path.join(ROOT, source)));
+    }
+    for (const logical of OWN) {
+        fingerprint(manifest, logical, fs.readFileSync(path.join(STATIC, logical)));
+    }
+
+    fs.writeFileSync(path.join(DIST, 'manifest.json'), JSON.stringify(manifest, null, 2) + '\n');
+    console.log(`Built ${Object.keys(manifest).length} asset(s) into static/dist`);
+}
+
+build();
@@ -0,0 +1,154 @@
+import click
+from flask.cli import AppGroup
+
+focus_stats_cli = AppGroup('focus-stats', help='Maintain the materialized per-user focus totals and daily rollups.')
+
+@focus_stats_cli.command('check')
+def focus_stats_check():
+    """Report users whose stored totals drifted from FocusSession."""
+    from services.focus_stats_service import check_focus_stats
+    mismatches = check_focus_stats()
+    for user_id, have, want in mismatches:
+        click.echo(f"user {user_id}: stored={have} expected={want}")
+    if mismatches:
+        click.echo(f"{len(mismatches)} user(s) out of sync.")
+        raise SystemExit(1)
+    click.echo("Focus stats consistent.")
+
+@focus_stats_cli.command('reconcile')
+def focus_stats_reconcile():
+    """Backfill missing rows and repair drifted totals from FocusSession."""
+    from services.focus_stats_service import reconcile_focus_stats, rebuild_focus_daily
+    fixed = reconcile_focus_stats()
+    click.echo(f"Reconciled focus stats for {fixed} user(s).")
+    days = rebuild_focus_daily()
+    click.echo(f"Rebuilt {days} daily focus rollup row(s).")
+
+achievements_cli = AppGroup('achievements', help='Maintain achievement progress counters.')
+
+@achievements_cli.command('reconcile')
+@click.option('--all', 'all_users', is_flag=True, help='Recompute every user, not just untracked ones.')
+def achievements_reconcile(all_users):
+    """Seed achievements and backfill progress counters from source data."""
+    from services.achievement_service import reconcile_achievements, seed_achievements
+    seed_achievements()
+    results = reconcile_achievements(all_users=all_users)
+    unlocked = sum(len(u) for _, u in results)
+    click.echo(f"Reconciled {len(results)} user(s), {unlocked} achievement(s) unlocked.")
+
+reminders_cli = AppGroup('reminders', help='Schedule and fire event reminders.')
+
+@reminders_cli.command('rebuild')
+def reminders_rebuild():
+    """Recompute the next reminder for every event."""
+    from services.reminder_service import rebuild_reminders
+    count = rebuild_reminders()
+    click.echo(f"Scheduled {count} reminder(s).")
+
+@reminders_cli.command('run')
+@click.option('--loop', is_flag=True, help='Keep running instead of firing due reminders once.')
+def reminders_run(loop):
+    """Fire due reminders (use --loop for a dedicated scheduler process)."""
+    from flask import current_app
+    from services.reminder_service import fire_due_reminders
+    if loop:
+        current_app.extensions['reminder_scheduler'].run()
+    fired = fire_due_reminders()
+    click.echo(f"Sent {len(fired)} reminder(s).")
+
+rooms_cli = AppGroup('rooms', help='Study room lifecycle.')
+
+@rooms_cli.command('sweep')
+@click.option('--loop', is_flag=True, help='Keep sweeping instead of running a single pass.')
+def rooms_sweep(loop):
+    """Expire idle study rooms and purge their chat (use --loop for a dedicated process)."""
+    from flask import current_app
+    from services.room_service import sweep_all_rooms
+    if loop:
+        current_app.extensions['room_sweeper'].run()
+    removed = sweep_all_rooms()
+    click.echo(f"Expired {removed} room(s).")
+
+search_cli = AppGroup('search', help='Maintain the task full-text search index.')
+
+@search_cli.command('rebuild')
+def search_rebuild():
+    """Rebuild every task's search document (after bulk SQL edits or restores)."""
+    from services.search_service import rebuild_search_index
+    count = rebuild_search_index()
+    click.echo(f"Indexed {count} task(s).")
+
+friends_cli = AppGroup('friends', help='Maintain the friendship adjacency table.')
+
+@friends_cli.command('rebuild')
+def friends_rebuild():
+    """Recreate the symmetric friend links from accepted friendships."""
+    from services.friend_service import rebuild_friend_links
+    count = rebuild_friend_links()
+    click.echo(f"Wrote {count} friend link(s).")
+
+suggestions_cli = AppGroup('suggestions', help='Maintain precomputed friend suggestions.')
+
+@suggestions_cli.command('rebuild')
+@click.option('--batch-size', default=500, show_default=True, help='Users scored per transaction.')
+def suggestions_rebuild(batch_size):
+    """Re-rank friend suggestions for every user (run periodically, e.g. nightly)."""
+    from services.suggestion_service import rebuild_suggestions
+    count = rebuild_suggestions(batch_size)
+    click.echo(f"Stored {count} suggestion(s).")
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+@jobs_cli.command('work')
+@click.option('--once', is_flag=True, help='Drain what is due now and exit instead of polling forever.')
+def jobs_work(once):
+    """Run queued jobs (a dedicated worker process; web workers co-host one unless JOB_WORKER=0)."""
+    from flask import current_app
+    from services.job_service import run_due_jobs
+    if not once:
+        current_app.extensions['job_worker'].run()
+    total = 0
+    while True:
+        ran = run_due_jobs()
+        total += ran
+        if not ran:
+            break
+    click.echo(f"Ran {total} job(s).")
+
+@jobs_cli.command('enqueue')
+@click.argument('names', nargs=-1, required=True)
+def jobs_enqueue(names):
+    """Queue argument-less jobs by name (e.g. maintenance.startup)."""
+    from models import db
+    from services.job_service import enqueue, JOBS
+    unknown = [name for name in names if name not in JOBS]
+    if unknown:
+        raise click.BadParameter(f"unknown job(s): {', '.join(unknown)}; known: {', '.join(sorted(JOBS))}")
+    for name in names:
+        enqueue(name)
+    db.session.commit()
+    click.echo(f"Queued {len(names)} job(s).")
+
+@jobs_cli.command('stats')
+@click.option('--hours', default=24, show_default=True, help='Only jobs created in this window.')
+def jobs_stats(hours):
+    """Per-job counts, attempts and run times."""
+    from datetime import datetime, timedelta, timezone
+    from services.job_service import job_stats
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+    stats = job_stats(since)
+    for name, entry in sorted(stats.items()):
+        counts = ' '.join(f"{status}={count}" for status, count in sorted(entry['counts'].items()))
+        click.echo(f"{name}: {counts} attempts={entry['attempts']} avg_ms={entry['avg_ms']} max_ms={entry['max_ms']}")
+    if not stats:
+        click.echo("No jobs.")
+
+def register_commands(app):
+    app.cli.add_command(focus_stats_cli)
+    app.cli.add_command(achievements_cli)
+    app.cli.add_command(reminders_cli)
+    app.cli.add_command(rooms_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(friends_cli)
+    app.cli.add_command(suggestions_cli)
+    app.cli.add_command(jobs_cli)
@@ -11,10 +11,11 @@ echo "Target Port: $PORT"
 echo "Running database migrations (flask db upgrade)..."
 flask db upgrade || echo "Migration failed, but attempting to start anyway..."
 
-# Run repair and sync in the background so they don't block the web server
-echo "Starting background tasks (repair & sync)..."
-(python repair_migrations.py && python sync_achievements.py && echo "Background tasks complete.") &
+# Repair and sync run as a queued job, picked up by the job workers inside gunicorn
+echo "Queueing startup maintenance (repair & sync)..."
+flask jobs enqueue maintenance.startup || echo "Could not queue startup maintenance."
 
 # Start the application with verbose logging and bind to $PORT
+# gevent workers (gunicorn.conf.py) so long-lived SSE streams (/api/events) cost a greenlet, not a thread
 echo "Starting Gunicorn on port $PORT..."
-exec gunicorn --bind 0.0.0.0:$PORT --access-logfile - --error-logfile - --log-level info --workers 2 --timeout 120 app:app
+exec gunicorn -c gunicorn.conf.py --bind 0.0.0.0:$PORT app:app
@@ -1,5 +1,11 @@
 from flask_caching import Cache
 from flask_wtf.csrf import CSRFProtect
+from services.realtime import Realtime
+from services.assets import Assets
+from services.genesis_service import Genesis
 
 cache = Cache()
 csrf = CSRFProtect()
+realtime = Realtime()
+assets = Assets()
+genesis = Genesis()
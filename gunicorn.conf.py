@@ -0,0 +1,39 @@
+"""Gunicorn settings, shared by docker-entrypoint.sh and the Procfile.
+
+Every open tab keeps an /api/events stream, and study-room long-polls and Genesis
+replies mostly wait too, so workers are gevent: a waiting request is a greenlet,
+not one of a fixed pool of OS threads, and thousands fit in each worker. Gunicorn
+monkey-patches the standard library before the app is imported, so background
+loops and executors run as greenlets as well.
+"""
+import os
+
+def _realtime_backend():
+    # Same choice as app.py: LISTEN/NOTIFY on Postgres, the in-process broker otherwise
+    db_uri = os.environ.get('SQLALCHEMY_DATABASE_URI') or os.environ.get('DATABASE_URL') or ''
+    default = 'postgres' if db_uri.startswith(('postgres://', 'postgresql')) else 'memory'
+    return os.environ.get('REALTIME_BACKEND', default)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# The in-process broker only reaches streams held by its own worker, so events
+# published in one worker would never arrive in another
+single_worker = _realtime_backend() == 'memory' and workers > 1
+if single_worker:
+    workers = 1
+worker_class = 'gevent'
+# Open connections per worker, SSE streams included
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = 120
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
+def on_starting(server):
+    if single_worker:
+        server.log.warning("REALTIME_BACKEND is 'memory'; running a single worker so pushed events reach every stream")
+
+def post_fork(server, worker):
+    # Without this psycopg2 blocks the whole worker, every greenlet in it, for each query
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
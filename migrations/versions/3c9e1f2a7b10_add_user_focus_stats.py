@@ -0,0 +1,46 @@
+"""Add materialized per-user focus totals
+
+Revision ID: 3c9e1f2a7b10
+Revises: abbdf470f035
+Create Date: 2026-10-18 09:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1f2a7b10'
+down_revision = 'abbdf470f035'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_focus_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_minutes', sa.Integer(), nullable=False),
+    sa.Column('session_count', sa.Integer(), nullable=False),
+    sa.Column('partner_minutes', sa.Integer(), nullable=False),
+    sa.Column('partner_session_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from existing history; `flask focus-stats reconcile` repairs any later drift
+    op.execute("""
+        INSERT INTO user_focus_stats (user_id, total_minutes, session_count, partner_minutes, partner_session_count, updated_at)
+        SELECT user_id,
+               COALESCE(SUM(minutes), 0),
+               COUNT(id),
+               COALESCE(SUM(CASE WHEN partner_id IS NOT NULL THEN minutes ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN partner_id IS NOT NULL THEN 1 ELSE 0 END), 0),
+               CURRENT_TIMESTAMP
+        FROM focus_session
+        GROUP BY user_id
+    """)
+
+
+def downgrade():
+    op.drop_table('user_focus_stats')
@@ -0,0 +1,50 @@
+"""Add daily focus rollup
+
+Revision ID: 8d4b7e6c2f31
+Revises: 3c9e1f2a7b10
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b7e6c2f31'
+down_revision = '3c9e1f2a7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('focus_daily',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('minutes', sa.Integer(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('partner_minutes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    with op.batch_alter_table('focus_daily', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_focus_daily_day'), ['day'], unique=False)
+
+    # Backfill from existing history (DATE() works on both SQLite and Postgres)
+    op.execute("""
+        INSERT INTO focus_daily (user_id, day, minutes, sessions, partner_minutes)
+        SELECT user_id,
+               DATE(date),
+               COALESCE(SUM(minutes), 0),
+               COUNT(id),
+               COALESCE(SUM(CASE WHEN partner_id IS NOT NULL THEN minutes ELSE 0 END), 0)
+        FROM focus_session
+        WHERE date IS NOT NULL
+        GROUP BY user_id, DATE(date)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('focus_daily', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_focus_daily_day'))
+
+    op.drop_table('focus_daily')
@@ -0,0 +1,50 @@
+"""Add full-text search index for tasks
+
+Revision ID: a3d5e7f90b12
+Revises: f19c3a6d8e42
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5e7f90b12'
+down_revision = 'f19c3a6d8e42'
+branch_labels = None
+depends_on = None
+
+
+SUBTASKS = "(SELECT {agg} FROM subtask s WHERE s.task_id = t.id)"
+TAGS = "(SELECT {agg} FROM tag JOIN task_tags tt ON tt.tag_id = tag.id WHERE tt.task_id = t.id)"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+                   "title, tags, subtasks, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        op.execute(
+            "INSERT INTO task_search (rowid, title, tags, subtasks, description) "
+            "SELECT t.id, t.title, COALESCE(" + TAGS.format(agg="group_concat(tag.name, ' ')") + ", ''), "
+            "COALESCE(" + SUBTASKS.format(agg="group_concat(s.title, ' ')") + ", ''), COALESCE(t.description, '') "
+            "FROM task t"
+        )
+    elif dialect == 'postgresql':
+        op.execute("CREATE TABLE IF NOT EXISTS task_search ("
+                   "task_id INTEGER PRIMARY KEY REFERENCES task(id) ON DELETE CASCADE, document tsvector NOT NULL)")
+        op.execute(
+            "INSERT INTO task_search (task_id, document) "
+            "SELECT t.id, "
+            "setweight(to_tsvector('simple', t.title), 'A') || "
+            "setweight(to_tsvector('simple', COALESCE(" + TAGS.format(agg="string_agg(tag.name, ' ')") + ", '')), 'B') || "
+            "setweight(to_tsvector('simple', COALESCE(" + SUBTASKS.format(agg="string_agg(s.title, ' ')") + ", '')), 'C') || "
+            "setweight(to_tsvector('simple', COALESCE(t.description, '')), 'D') "
+            "FROM task t"
+        )
+        # Built after the backfill so the bulk load doesn't maintain it row by row
+        op.execute("CREATE INDEX IF NOT EXISTS ix_task_search_document ON task_search USING GIN (document)")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS task_search")
@@ -0,0 +1,28 @@
+"""Add client_id to focus_session
+
+Revision ID: a9c4e2f6d813
+Revises: f5a1c9e3b7d2
+Create Date: 2026-10-18 20:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e2f6d813'
+down_revision = 'f5a1c9e3b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('focus_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_id', sa.String(length=36), nullable=True))
+        batch_op.create_unique_constraint('uq_focus_session_client_id', ['client_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('focus_session', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_focus_session_client_id', type_='unique')
+        batch_op.drop_column('client_id')
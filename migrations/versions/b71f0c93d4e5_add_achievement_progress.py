@@ -0,0 +1,36 @@
+"""Add achievement progress counters
+
+Revision ID: b71f0c93d4e5
+Revises: 8d4b7e6c2f31
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71f0c93d4e5'
+down_revision = '8d4b7e6c2f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('achievement_progress',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('criteria_type', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'criteria_type')
+    )
+    with op.batch_alter_table('achievement', schema=None) as batch_op:
+        batch_op.create_index('ix_achievement_criteria', ['criteria_type', 'criteria_value'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('achievement', schema=None) as batch_op:
+        batch_op.drop_index('ix_achievement_criteria')
+
+    op.drop_table('achievement_progress')
@@ -0,0 +1,33 @@
+"""Add trigram index for username search
+
+Revision ID: c84e2b6a1f07
+Revises: a3d5e7f90b12
+Create Date: 2026-10-18 17:05:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84e2b6a1f07'
+down_revision = 'a3d5e7f90b12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(username, tokenize='trigram')")
+        op.execute('INSERT INTO user_search (rowid, username) SELECT u.id, u.username FROM "user" u')
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute('CREATE INDEX IF NOT EXISTS ix_user_username_trgm ON "user" USING GIN (username gin_trgm_ops)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS user_search")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_user_username_trgm")
@@ -0,0 +1,34 @@
+"""Add symmetric friend link table
+
+Revision ID: d2f6a8c0b493
+Revises: c84e2b6a1f07
+Create Date: 2026-10-18 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f6a8c0b493'
+down_revision = 'c84e2b6a1f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('friend_link',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('friend_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['friend_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'friend_id')
+    )
+    # One row per direction of every accepted friendship
+    op.execute("INSERT INTO friend_link (user_id, friend_id) "
+               "SELECT user_id, friend_id FROM friendship WHERE status = 'accepted' "
+               "UNION SELECT friend_id, user_id FROM friendship WHERE status = 'accepted'")
+
+
+def downgrade():
+    op.drop_table('friend_link')
@@ -0,0 +1,26 @@
+"""Add job.heartbeat_at
+
+Revision ID: d4f7a2c9e1b5
+Revises: b3e8d1f4a6c2
+Create Date: 2026-10-18 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f7a2c9e1b5'
+down_revision = 'b3e8d1f4a6c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,26 @@
+"""Add (room_id, id) index for cursor-based chat fetch
+
+Revision ID: e4a27c5d9b18
+Revises: b71f0c93d4e5
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a27c5d9b18'
+down_revision = 'b71f0c93d4e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_message_room_id_id', ['room_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_room_id_id')
@@ -0,0 +1,32 @@
+"""Add precomputed friend suggestions
+
+Revision ID: e7b3c5d1a926
+Revises: d2f6a8c0b493
+Create Date: 2026-10-18 18:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c5d1a926'
+down_revision = 'd2f6a8c0b493'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('friend_suggestion',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('suggested_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['suggested_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'suggested_id')
+    )
+
+
+def downgrade():
+    op.drop_table('friend_suggestion')
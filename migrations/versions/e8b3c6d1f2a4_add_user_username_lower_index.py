@@ -0,0 +1,24 @@
+"""Add lower(username) index
+
+Revision ID: e8b3c6d1f2a4
+Revises: d4f7a2c9e1b5
+Create Date: 2026-10-18 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3c6d1f2a4'
+down_revision = 'd4f7a2c9e1b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_username_lower', table_name='user')
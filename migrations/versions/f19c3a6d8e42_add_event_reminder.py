@@ -0,0 +1,43 @@
+"""Add event reminder queue
+
+Revision ID: f19c3a6d8e42
+Revises: e4a27c5d9b18
+Create Date: 2026-10-18 15:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19c3a6d8e42'
+down_revision = 'e4a27c5d9b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Populated by `flask reminders rebuild` (run from docker-entrypoint.sh);
+    # recurrence expansion lives in application code
+    op.create_table('event_reminder',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('occurrence_start', sa.DateTime(), nullable=False),
+    sa.Column('fire_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id')
+    )
+    with op.batch_alter_table('event_reminder', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_reminder_fire_at'), ['fire_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_event_reminder_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event_reminder', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_reminder_user_id'))
+        batch_op.drop_index(batch_op.f('ix_event_reminder_fire_at'))
+
+    op.drop_table('event_reminder')
@@ -0,0 +1,26 @@
+"""Add state_version to study_room
+
+Revision ID: f5a1c9e3b7d2
+Revises: e7b3c5d1a926
+Create Date: 2026-10-18 18:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a1c9e3b7d2'
+down_revision = 'e7b3c5d1a926'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('study_room', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('state_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('study_room', schema=None) as batch_op:
+        batch_op.drop_column('state_version')
@@ -52,26 +52,23 @@ class User(UserMixin, db.Model):
 
     notifications = db.relationship('Notification', backref='user', lazy=True, cascade="all, delete-orphan")
 
+    # Case-insensitive prefix lookups on the username (friend search)
+    __table_args__ = (db.Index('ix_user_username_lower', db.func.lower(username)),)
+
     @property
     def all_accessible_tasks(self):
-        # Fetch all active (todo) tasks for the user and their projects
-        personal_tasks = Task.query.filter_by(user_id=self.id, section_id=None, status='todo').all()
-        project_tasks = Task.query.join(ProjectSection).join(Project).join(ProjectMember).filter(
-            ProjectMember.user_id == self.id,
-            Task.status == 'todo'
-        ).all()
-        
-        all_tasks = list(set(personal_tasks + project_tasks))
-        all_tasks.sort(key=lambda t: (t.priority or 0, t.created_at or datetime.min.replace(tzinfo=timezone.utc)), reverse=True)
-        return all_tasks
+        # Fetch all active (todo) tasks for the user and their projects in one eager-loaded query
+        from services.task_service import accessible_tasks_query
+        from utils import request_memo
+        return request_memo(('accessible_tasks', self.id), lambda: accessible_tasks_query(self.id).all())
 
     @property
     def total_focus_hours(self):
-        from sqlalchemy import func
+        # Reads the materialized UserFocusStats row instead of summing every FocusSession
         # Use object_session(self) to ensure we're using the session this object belongs to
         from sqlalchemy.orm import object_session
         session = object_session(self) or db.session
-        total_mins = session.query(func.sum(FocusSession.minutes)).filter_by(user_id=self.id).scalar() or 0
+        total_mins = session.query(UserFocusStats.total_minutes).filter_by(user_id=self.id).scalar() or 0
         return total_mins / 60
 
 class Friendship(db.Model):
@@ -83,6 +80,18 @@ class Friendship(db.Model):
 
     __table_args__ = (db.UniqueConstraint('user_id', 'friend_id', name='_user_friend_uc'),)
 
+class FriendLink(db.Model):
+    # Both directions of every accepted Friendship, maintained by services.friend_service
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    friend_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+class FriendSuggestion(db.Model):
+    # Precomputed, ranked "people you may know" per user, refreshed by services.suggestion_service
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    suggested_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=utc_now)
+
 class StudyRoom(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     host_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -100,6 +109,8 @@ class StudyRoom(db.Model):
     active_start_time = db.Column(db.DateTime, nullable=True) # If set, timer is running
     seconds_remaining = db.Column(db.Integer, nullable=True) # Snapshot when paused
     last_activity = db.Column(db.DateTime, default=utc_now)
+    # Bumped on every change clients must see (timer control, mode switch, join); long-polls wait on it
+    state_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     host = db.relationship('User', foreign_keys=[host_id], backref='hosted_rooms', lazy=True)
     guest = db.relationship('User', foreign_keys=[guest_id], backref='guest_rooms', lazy=True)
@@ -190,6 +201,25 @@ class FocusSession(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=True)
     partner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Client-generated UUID; a replayed or retried log of the same session is ignored
+    client_id = db.Column(db.String(36), nullable=True, unique=True)
+
+class UserFocusStats(db.Model):
+    # Materialized lifetime totals, kept in sync with FocusSession by services.focus_stats_service
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_minutes = db.Column(db.Integer, default=0, nullable=False)
+    session_count = db.Column(db.Integer, default=0, nullable=False)
+    partner_minutes = db.Column(db.Integer, default=0, nullable=False)
+    partner_session_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+
+class FocusDaily(db.Model):
+    # Per-user, per-UTC-day rollup of FocusSession, maintained alongside UserFocusStats
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    minutes = db.Column(db.Integer, default=0, nullable=False)
+    sessions = db.Column(db.Integer, default=0, nullable=False)
+    partner_minutes = db.Column(db.Integer, default=0, nullable=False)
 
 class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -204,6 +234,15 @@ class Event(db.Model):
     recurrence_days = db.Column(db.String(50), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     completions = db.relationship('EventCompletion', backref='event', lazy=True, cascade="all, delete-orphan")
+    reminder = db.relationship('EventReminder', backref='event', uselist=False, lazy=True, cascade="all, delete-orphan")
+
+class EventReminder(db.Model):
+    """Next pending reminder for an event; the table ordered by fire_at is the scheduler's queue."""
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    occurrence_start = db.Column(db.DateTime, nullable=False)
+    fire_at = db.Column(db.DateTime, nullable=False, index=True)
 
 class EventCompletion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -249,6 +288,8 @@ class Achievement(db.Model):
     
     user_achievements = db.relationship('UserAchievement', backref='achievement', lazy=True)
 
+    __table_args__ = (db.Index('ix_achievement_criteria', 'criteria_type', 'criteria_value'),)
+
 class UserAchievement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
@@ -257,6 +298,13 @@ class UserAchievement(db.Model):
     
     user = db.relationship('User', backref='achievements', lazy=True)
 
+class AchievementProgress(db.Model):
+    # Per-user running counter for one achievement criteria type (see services.achievement_service)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    criteria_type = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=utc_now, onupdate=utc_now)
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('study_room.id'), nullable=False)
@@ -266,3 +314,30 @@ class ChatMessage(db.Model):
     
     user = db.relationship('User', backref='messages', lazy=True)
     room = db.relationship('StudyRoom', backref=db.backref('messages', cascade="all, delete-orphan"), lazy=True)
+
+    __table_args__ = (db.Index('ix_chat_message_room_id_id', 'room_id', 'id'),)
+
+class Job(db.Model):
+    """A unit of background work; the table ordered by run_at is the queue (see services.job_service)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued') # queued, running, done, failed
+    run_at = db.Column(db.DateTime, nullable=False, default=utc_now)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    locked_by = db.Column(db.String(100), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True) # renewed while running; the lease counts from here
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=utc_now)
+
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+
+class JobLock(db.Model):
+    # Leased mutex for claiming jobs on databases without SKIP LOCKED (SQLite)
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
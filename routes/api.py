@@ -1,14 +1,26 @@
-from flask import render_template, request, jsonify, abort, session
+import time
+from flask import render_template, request, jsonify, abort, Response, current_app, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import func
 from . import api_bp
 from models import db, FocusSession, StudyRoom, Task, Notification, User, Event
-from utils import create_notification, check_event_notifications, check_task_access
-from services.achievement_service import check_achievements
-from extensions import csrf
+from utils import check_task_access
+from services.cache_service import invalidate_user
+from services.notification_service import queue_broadcast
+from services.task_service import accessible_tasks_query
+from services import presence_service as presence
+from services.presence_service import get_presence, presence_snapshot, utc_now
+from services.room_service import bump_state_version, publish_room_state
+from services.session_service import ingest_sessions, new_client_id, BATCH_LIMIT
+from services.genesis_service import PERSONA, Saturated
+from extensions import cache, csrf, realtime
+from services.realtime import user_topic, room_topic, format_sse, BROADCAST_TOPIC
 import os
 
+# How long Genesis follow-ups (SET POMODOROS TO ...) remember the task it last created
+GENESIS_TASK_TTL = 3600
+
 @api_bp.route('/trmnl', methods=['GET'])
 @csrf.exempt
 def trmnl_feed():
@@ -98,111 +110,133 @@ def toggle_trmnl_pin(task_id):
 @api_bp.route('/log_session', methods=['POST'])
 @login_required
 def log_session():
-    data = request.json
-    minutes = data.get('minutes')
-    task_id = data.get('task_id')
-    room_id = data.get('room_id')
-    
-    try:
-        minutes = int(minutes)
-    except (TypeError, ValueError):
-        minutes = 0
-
-    # Validation: Check how much time actually passed on the server
-    if current_user.current_focus_start:
-        now = datetime.now(timezone.utc)
-        actual_elapsed_sec = (now - current_user.current_focus_start.replace(tzinfo=timezone.utc)).total_seconds()
-        actual_elapsed_min = int(actual_elapsed_sec / 60)
-        
-        # Buffer of 1 minute to account for network/logic lag
-        if minutes > actual_elapsed_min + 1:
-            minutes = actual_elapsed_min
-
-    if minutes > 0:
-        session = FocusSession(minutes=minutes, user_id=current_user.id, task_id=task_id)
-        
-        if room_id:
-            room = db.session.get(StudyRoom, room_id)
-            if room:
-                partner_id = None
-                if room.host_id == current_user.id:
-                    partner_id = room.guest_id
-                elif room.guest_id == current_user.id:
-                    partner_id = room.host_id
-                
-                session.partner_id = partner_id
-
-        db.session.add(session)
-        
-        if task_id:
-            task = db.session.get(Task, task_id)
-            if task and check_task_access(task):
-                task.completed_pomodoros += 1
-                if task.completed_pomodoros >= task.estimated_pomodoros:
-                    task.status = 'done'
-        
-        if current_user.notify_pomodoro:
-            create_notification(current_user.id, f"Focus session of {minutes} mins completed!", type='success')
-
-        current_user.last_focus_end = datetime.now(timezone.utc)
-        current_user.current_focus_start = None
-        current_user.current_focus_end = None
-        db.session.commit()
-        
-        # Check Achievements
-        check_achievements(current_user)
-        
-        return jsonify({'status': 'success', 'logged_minutes': minutes})
-    return jsonify({'status': 'error'}), 400
+    data = dict(request.json or {})
+    # Older clients send no client_id; each of their calls counts as a new session
+    data['client_id'] = data.get('client_id') or new_client_id()
+    result = ingest_sessions(current_user, [data]).get(data['client_id'])
+    if result is None or result.status == 'rejected':
+        return jsonify({'status': 'error'}), 400
+    return jsonify({'status': result.status, 'logged_minutes': result.minutes})
+
+@api_bp.route('/sessions', methods=['POST'])
+@login_required
+def ingest_session_batch():
+    """Log a batch of sessions, each identified by a client-generated client_id."""
+    sessions = (request.json or {}).get('sessions')
+    if not isinstance(sessions, list) or len(sessions) > BATCH_LIMIT:
+        return jsonify({'status': 'error'}), 400
+    results = ingest_sessions(current_user, sessions)
+    return jsonify({
+        'status': 'success',
+        'results': {cid: {'status': r.status, 'logged_minutes': r.minutes} for cid, r in results.items()},
+    })
 
 @api_bp.route('/sync_presence', methods=['POST'])
 @login_required
 @csrf.exempt
 def sync_presence():
-    data = request.json
+    result, status = _sync_presence(request.json or {})
+    return jsonify(result), status
+
+def _sync_presence(data):
     mode = data.get('mode')
     seconds_left = data.get('seconds_left')
     task_id = data.get('task_id')
     room_id = data.get('room_id')
     is_start = data.get('is_start', False)
     
-    current_user.last_seen = datetime.now(timezone.utc)
-    current_user.current_focus_mode = mode
-    current_user.current_task_id = task_id
+    now = utc_now()
+    prev = get_presence(current_user)
+    state = dict(prev, last_seen=now, current_focus_mode=mode, current_task_id=task_id)
     
     if mode == 'focus':
-        if is_start or not current_user.current_focus_start:
+        if is_start or not state['current_focus_start']:
             # If starting or we don't have a start time, set it now
             # If we already have one, we keep it unless is_start is true (reset)
-            current_user.current_focus_start = datetime.now(timezone.utc)
+            state['current_focus_start'] = now
         
         if seconds_left is not None:
-            current_user.current_focus_end = datetime.now(timezone.utc) + timedelta(seconds=int(seconds_left))
+            state['current_focus_end'] = now + timedelta(seconds=int(seconds_left))
     elif mode == 'break':
-        current_user.current_focus_start = None # Breaks aren't logged for leaderboard usually
+        state['current_focus_start'] = None # Breaks aren't logged for leaderboard usually
         if seconds_left is not None:
-            current_user.current_focus_end = datetime.now(timezone.utc) + timedelta(seconds=int(seconds_left))
+            state['current_focus_end'] = now + timedelta(seconds=int(seconds_left))
     else:
-        current_user.current_focus_end = None
-        current_user.current_focus_start = None
-
-    if room_id:
-        room = db.session.get(StudyRoom, room_id)
+        state['current_focus_end'] = None
+        state['current_focus_start'] = None
+
+    # Peers only care about mode/task transitions, not every heartbeat
+    state_changed = prev['current_focus_mode'] != mode or prev['current_task_id'] != task_id
+    room = db.session.get(StudyRoom, room_id) if room_id else None
+    if room and mode != 'none' and room.active_mode != mode:
+        state_changed = True
+    seconds_remaining = int(seconds_left) if seconds_left is not None else None
+
+    if state_changed or state['current_focus_start'] != prev['current_focus_start']:
+        # Transitions are written through; everything buffered so far goes with them
+        for field, value in state.items():
+            setattr(current_user, field, value)
         if room:
-            room.last_activity = datetime.now(timezone.utc)
+            room.last_activity = now
             if mode != 'none':
                 room.active_mode = mode
-                room.seconds_remaining = int(seconds_left) if seconds_left is not None else None
-    
-    db.session.commit()
-    
-    # Also check for event notifications
-    check_event_notifications(current_user.id)
+                room.seconds_remaining = seconds_remaining
+            if state_changed:
+                bump_state_version(room)
+        db.session.commit()
+        presence.write_through(current_user.id, state)
+        presence.flush()
+    else:
+        room_state = None
+        if room:
+            room_state = {
+                'last_activity': now,
+                'active_mode': room.active_mode,
+                'seconds_remaining': seconds_remaining if mode != 'none' else room.seconds_remaining,
+            }
+        presence.buffer_heartbeat(current_user.id, state, room.id if room else None, room_state)
+        presence.flush_if_due()
+
+    if room and state_changed:
+        publish_room_state(room)
     
-    return jsonify({
+    return {
         'status': 'success', 
         'server_time': datetime.now(timezone.utc).timestamp() * 1000
-    })
+    }, 200
+
+@api_bp.route('/outbox', methods=['POST'])
+@login_required
+def replay_outbox():
+    """Replay calls queued by static/js/outbox.js while offline, oldest first, in one request."""
+    items = (request.json or {}).get('items')
+    if not isinstance(items, list) or len(items) > BATCH_LIMIT:
+        return jsonify({'status': 'error'}), 400
+
+    results, sessions, heartbeats = {}, [], []
+    for item in items:
+        if not isinstance(item, dict) or item.get('id') is None:
+            continue
+        item_id, body = str(item['id']), item.get('body')
+        if item.get('kind') == 'log_session' and isinstance(body, dict) and body.get('client_id') == item_id:
+            sessions.append(body)
+        elif item.get('kind') == 'sync_presence' and isinstance(body, dict):
+            heartbeats.append((item_id, body))
+        else:
+            # Unknown or malformed entries would fail every replay; acknowledge and drop them
+            results[item_id] = 'rejected'
+
+    # Sessions first: a heartbeat replayed before them would restart the focus clock they are checked against
+    if sessions:
+        logged = ingest_sessions(current_user, sessions)
+        for body in sessions:
+            result = logged.get(body['client_id'])
+            results[body['client_id']] = result.status if result else 'rejected'
+    for item_id, body in heartbeats:
+        result, status = _sync_presence(body)
+        results[item_id] = result['status'] if status == 200 else 'rejected'
+    return jsonify({'status': 'success', 'results': results})
+
 
 @api_bp.route('/notifications', methods=['GET'])
 @login_required
@@ -220,6 +254,44 @@ def get_notifications():
         'created_at': n.created_at.isoformat()
     } for n in notifications])
 
+@api_bp.route('/events', methods=['GET'])
+@login_required
+def event_stream():
+    topics = [user_topic(current_user.id), BROADCAST_TOPIC]
+    room_id = request.args.get('room', type=int)
+    if room_id:
+        room = db.session.get(StudyRoom, room_id)
+        if room and current_user.id in [room.host_id, room.guest_id]:
+            topics.append(room_topic(room.id))
+
+    heartbeat = current_app.config['REALTIME_HEARTBEAT']
+    stream_timeout = current_app.config['REALTIME_STREAM_TIMEOUT']
+    subscription = realtime.subscribe(topics)
+    # Don't pin a pooled DB connection for the lifetime of the stream
+    db.session.remove()
+
+    def generate():
+        # Capped below proxy idle limits; EventSource reconnects on its own and room access is rechecked
+        deadline = time.monotonic() + stream_timeout
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = subscription.get(timeout=min(heartbeat, remaining))
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(message['event'], message['data'])
+        finally:
+            subscription.close()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_bp.route('/notifications/mark_read/<int:notif_id>', methods=['POST'])
 @login_required
 def mark_notification_read(notif_id):
@@ -262,12 +334,12 @@ def update_settings():
     if 'show_last_seen' in data: current_user.show_last_seen = data['show_last_seen']
     
     db.session.commit()
+    invalidate_user(current_user.id)
     return jsonify({'status': 'success'})
 
 @api_bp.route('/genesis', methods=['POST'])
 @login_required
 def genesis_command():
-    import google.generativeai as genai
     if not current_user.is_admin:
         abort(403)
         
@@ -314,7 +386,7 @@ def genesis_command():
 
     # Follow-up: Set Due Date
     if any(k in command.upper() for k in ["SET DUE DATE TO", "CHANGE DUE DATE TO", "UPDATE DUE DATE TO"]):
-        last_task_id = session.get('last_task_id')
+        last_task_id = cache.get(_genesis_task_key(current_user.id))
         if last_task_id:
             try:
                 date_str = command.upper().split(" TO ")[-1].strip()
@@ -345,14 +417,12 @@ def genesis_command():
                 if user: target_user = user; break
             
             if target_user:
-                from models import Friendship
+                from models import FriendLink
                 # Get friends
-                friends1 = db.session.query(User.username).join(Friendship, User.id == Friendship.friend_id).filter(Friendship.user_id == target_user.id, Friendship.status == 'accepted').all()
-                friends2 = db.session.query(User.username).join(Friendship, User.id == Friendship.user_id).filter(Friendship.friend_id == target_user.id, Friendship.status == 'accepted').all()
-                all_friends = [f[0] for f in (friends1 + friends2)]
+                all_friends = [name for name, in db.session.query(User.username).join(FriendLink, User.id == FriendLink.friend_id).filter(FriendLink.user_id == target_user.id)]
                 
                 if all_friends:
-                    res = f"SUBJECT_{target_user.username}_SOCIAL_CONNECTIONS:\n" + "\n".join([f"- {name}" for f in all_friends])
+                    res = f"SUBJECT_{target_user.username}_SOCIAL_CONNECTIONS:\n" + "\n".join([f"- {name}" for name in all_friends])
                     return jsonify({'response': res, 'is_admin': is_admin})
                 return jsonify({'response': f"SUBJECT_{target_user.username}_HAS_NO_SOCIAL_MAP_DATA.", 'is_admin': is_admin})
         except: pass
@@ -375,14 +445,12 @@ def genesis_command():
                 if not target_user.show_last_seen and not is_admin:
                     return jsonify({'response': f"PRIVACY_PROTOCOL_ACTIVE. SUBJECT_{target_user.username}_STATUS_ENCRYPTED.", 'is_admin': is_admin})
                 
+                live = presence_snapshot([target_user.id])[target_user.id]
                 status = "IDLING"
-                if target_user.current_focus_mode == 'focus':
-                    task_name = "DEEP_WORK"
-                    if target_user.current_task_id:
-                        task = db.session.get(Task, target_user.current_task_id)
-                        if task: task_name = task.title.upper()
+                if live.current_focus_mode == 'focus':
+                    task_name = live.task_title.upper() if live.task_title else "DEEP_WORK"
                     status = f"EXECUTING_TASK: {task_name}"
-                elif target_user.current_focus_mode == 'break':
+                elif live.current_focus_mode == 'break':
                     status = "RECOVERY_MODE (BREAK)"
                 
                 return jsonify({
@@ -411,7 +479,8 @@ def genesis_command():
             if user: target_user = user; break
         
         if target_user:
-            total_mins = db.session.query(func.sum(FocusSession.minutes)).filter(FocusSession.user_id == target_user.id).scalar() or 0
+            from services.focus_stats_service import get_focus_stats
+            total_mins = get_focus_stats(target_user.id)['total_minutes']
             tasks_done = Task.query.filter_by(user_id=target_user.id, status='done').count()
             return jsonify({
                 'response': f"SUBJECT_{target_user.username}_ARCHIVE:\n- TOTAL_FOCUS: {total_mins} MINS\n- COMPLETED_RECORDS: {tasks_done} TASKS\n- INTEGRITY: STABLE",
@@ -444,11 +513,11 @@ def genesis_command():
             msg = command[9:].strip() # After 'BROADCAST'
             
         if msg:
-            users = User.query.all()
-            for u in users:
-                create_notification(u.id, f"[SYSTEM_BROADCAST] {msg}", type='warning')
+            # One INSERT ... SELECT for every user at commit
+            queue_broadcast(f"[SYSTEM_BROADCAST] {msg}", type='warning')
             db.session.commit()
-            return jsonify({'response': f"SIGNAL_BROADCAST_COMPLETE. {len(users)} NODES REACHED.", 'is_admin': True})
+            reached = db.session.query(func.count(User.id)).scalar()
+            return jsonify({'response': f"SIGNAL_BROADCAST_COMPLETE. {reached} NODES REACHED.", 'is_admin': True})
 
     # Logic: Identify Bottlenecks
     if any(k in command.upper() for k in ["IDENTIFY BOTTLENECKS", "QUEUE ANALYSIS", "STAGNANT TASKS"]):
@@ -517,7 +586,7 @@ def genesis_command():
 
     # Follow-up: Set Pomodoros
     if any(k in command.upper() for k in ["SET POMODOROS TO", "CHANGE POMS TO", "UPDATE POMS TO"]):
-        last_task_id = session.get('last_task_id')
+        last_task_id = cache.get(_genesis_task_key(current_user.id))
         if last_task_id:
             try:
                 # Extract number
@@ -539,49 +608,60 @@ def genesis_command():
                 pass
         return jsonify({'response': "CONTEXT_ERROR. NO_ACTIVE_TASK_IN_BUFFER.", 'is_admin': is_admin})
 
-    # Real Gemini Integration
-    api_key = os.environ.get('GOOGLE_API_KEY')
-    if api_key:
+    genesis = current_app.extensions['genesis']
+    if genesis.client is None:
+        return jsonify({'response': "I am operational.", 'is_admin': is_admin})
+
+    prompt = f"{PERSONA}\nCommand: {command}"
+    user_id = current_user.id
+    # The model can take a while; don't hold a pooled connection meanwhile
+    db.session.close()
+    if request.accept_mimetypes.best == 'text/event-stream':
+        response = Response(stream_with_context(_stream_genesis(genesis, prompt, user_id)), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    try:
+        reply = ''.join(genesis.stream(prompt))
+    except Exception as e:
+        return jsonify({'response': _genesis_error(e), 'is_admin': is_admin})
+    return jsonify(_genesis_reply(reply, user_id))
+
+def _genesis_error(e):
+    if isinstance(e, Saturated):
+        return "AI_CORE_SATURATED. ALL_CHANNELS_BUSY. RETRY_SHORTLY."
+    return f"[CRITICAL_ERROR] AI_CORE_TIMEOUT: {str(e)}"
+
+def _genesis_task_key(user_id):
+    return f"genesis_last_task:{user_id}"
+
+def _genesis_reply(ai_response, user_id):
+    """The final terminal payload for a model reply, creating the task it extracted if any."""
+    if "TASK_EXTRACTION_COMPLETE" in ai_response.upper():
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-flash-latest')
-            persona_prefix = """You are Genesis, the core of the Modo ecosystem. 
-            Your tone is cold and technical. Keep responses extremely concise. 
-            If asked for status, reply ONLY with 'I am operational.'
-            Refer to the user as 'Lord Silver' or 'Lost'.
-            
-            IMPORTANT: If the user asks for user info, vitals, or logs, include exact trigger phrases:
-            - 'QUERY_SUCCESSFUL. USER_METRICS_FETCHED. OPENING_OVERLAY...'
-            - 'HEALTH_CHECK_COMPLETE. VITALS_STREAM_READY.'
-            - 'CORE_LOG_ACCESS_GRANTED. RETRIEVING_LAST_20_ENTRIES:'
-
-            TASK_CREATION:
-            If the user wants to create a task, extract:
-            - Title
-            - Estimated Pomodoros (integer, default 1)
-            If info missing, ask concisely.
-            If present, respond EXACTLY with: 'TASK_EXTRACTION_COMPLETE. [Title] | [Poms]'
-            """
-            prompt = f"{persona_prefix}\nCommand: {command}"
-            ai_response = model.generate_content(prompt).text
-
-            if "TASK_EXTRACTION_COMPLETE" in ai_response.upper():
-                try:
-                    data_part = ai_response.split('TASK_EXTRACTION_COMPLETE.')[-1].strip()
-                    parts = data_part.split('|')
-                    title = parts[0].strip(); poms = int(parts[1].strip())
-                    new_task = Task(title=title, estimated_pomodoros=poms, user_id=current_user.id)
-                    db.session.add(new_task); db.session.commit()
-                    session['last_task_id'] = new_task.id
-                    return jsonify({'response': f"TASK_ALLOCATED: {title}. {poms} POMS COMMITTED.", 'is_admin': is_admin, 'refresh_tasks': True})
-                except Exception as e:
-                    return jsonify({'response': f"EXTRACTION_ERROR: {str(e)}", 'is_admin': is_admin})
-
-            return jsonify({'response': ai_response, 'is_admin': is_admin})
+            data_part = ai_response.split('TASK_EXTRACTION_COMPLETE.')[-1].strip()
+            parts = data_part.split('|')
+            title = parts[0].strip(); poms = int(parts[1].strip())
+            new_task = Task(title=title, estimated_pomodoros=poms, user_id=user_id)
+            db.session.add(new_task); db.session.commit()
+            # Kept server-side for follow-ups; a streamed response can't update the session cookie
+            cache.set(_genesis_task_key(user_id), new_task.id, timeout=GENESIS_TASK_TTL)
+            return {'response': f"TASK_ALLOCATED: {title}. {poms} POMS COMMITTED.", 'is_admin': True, 'refresh_tasks': True}
         except Exception as e:
-            return jsonify({'response': f"[CRITICAL_ERROR] AI_CORE_TIMEOUT: {str(e)}", 'is_admin': is_admin})
+            return {'response': f"EXTRACTION_ERROR: {str(e)}", 'is_admin': True}
+    return {'response': ai_response, 'is_admin': True}
 
-    return jsonify({'response': "I am operational.", 'is_admin': is_admin})
+def _stream_genesis(genesis, prompt, user_id):
+    # 'chunk' events as the model writes, then 'done' with the same payload the JSON reply has
+    parts = []
+    try:
+        for text in genesis.stream(prompt):
+            parts.append(text)
+            yield format_sse('chunk', {'text': text})
+    except Exception as e:
+        yield format_sse('done', {'response': _genesis_error(e), 'is_admin': True})
+        return
+    yield format_sse('done', _genesis_reply(''.join(parts), user_id))
 
 @api_bp.route('/next_priority_task', methods=['GET'])
 @login_required
@@ -599,5 +679,5 @@ def get_task_subtasks(task_id):
 @api_bp.route('/timer_tasks', methods=['GET'])
 @login_required
 def get_timer_tasks():
-    tasks = [t for t in current_user.all_accessible_tasks if t.status != 'done']
+    tasks = accessible_tasks_query(current_user.id).all()
     return render_template('partials/task_options.html', tasks=tasks)
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, request, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User
+from services import presence_service as presence
 
 auth = Blueprint('auth', __name__)
 
@@ -44,6 +45,7 @@ def logout():
     current_user.current_focus_start = None
     current_user.current_focus_end = None
     db.session.commit()
+    presence.write_through(current_user.id, presence.state_from_user(current_user))
     
     logout_user()
     return redirect(url_for('auth.login'))
@@ -1,12 +1,17 @@
 import os
-from flask import render_template, request, jsonify, abort, redirect, url_for, make_response
+from flask import render_template, request, jsonify, abort, redirect, url_for, make_response, send_from_directory, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import func
 from datetime import datetime, timedelta, timezone
 from . import main_bp
-from models import db, Task, Subtask, Tag, task_tags, Event, Habit, HabitCompletion, EventCompletion, FocusSession, User, Achievement, UserAchievement
+from models import db, Task, Subtask, Tag, task_tags, Event, Habit, HabitCompletion, EventCompletion, FocusSession, User, Achievement, UserAchievement, UserFocusStats, FocusDaily
 from utils import expand_events, EventOccurrence, log_project_action, check_task_access
-from extensions import cache
+from services.search_service import apply_search
+from services.task_service import task_list_query, get_task, accessible_tasks_query
+from services.focus_stats_service import get_focus_stats, get_daily_minutes, get_minutes_between
+from services.presence_service import presence_snapshot
+from services.cache_service import get_or_set, invalidate_user, user_tag, leaderboard_tag
+from collections import namedtuple
 
 from functools import wraps
 
@@ -24,7 +29,8 @@ def admin_required(f):
 def admin():
     users = User.query.all()
     now = datetime.now(timezone.utc)
-    online_count = User.query.filter(User.last_seen >= now - timedelta(minutes=5)).count()
+    presence = presence_snapshot([u.id for u in users])
+    online_count = sum(1 for state in presence.values() if state.is_online)
     total_users = len(users)
     total_focus_minutes = db.session.query(func.sum(FocusSession.minutes)).scalar() or 0
     total_tasks_completed = Task.query.filter_by(status='done').count()
@@ -32,6 +38,7 @@ def admin():
     
     return render_template('admin.html', 
                            users=users, 
+                           presence=presence,
                            online_count=online_count, 
                            total_users=total_users,
                            total_focus_hours=round(total_focus_minutes / 60, 1),
@@ -85,6 +92,8 @@ def admin_rename_user(user_id):
     if new_username:
         user.username = new_username
         db.session.commit()
+        # Usernames are denormalized into cached leaderboard rows
+        invalidate_user(user.id, leaderboards=('focus', 'habits', 'sync'))
     return redirect(url_for('main.admin'))
 
 @main_bp.route('/admin/user/<int:user_id>/edit_timer', methods=['POST'])
@@ -107,12 +116,20 @@ def badges():
     earned_map = {ua.achievement_id: ua.earned_at for ua in current_user.achievements}
     return render_template('badges.html', achievements=all_achievements, earned_map=earned_map)
 
+@main_bp.route('/sw.js')
+def service_worker():
+    # Served from the root so its scope covers every page, not just /static/
+    response = send_from_directory(os.path.join(current_app.static_folder, 'js'), 'sw.js', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @main_bp.route('/')
 @login_required
 def index():
-    query = Task.query.filter_by(user_id=current_user.id)
+    query = task_list_query().filter(Task.user_id == current_user.id)
     q = request.args.get('q')
-    if q: query = query.filter(Task.title.ilike(f'%{q}%'))
+    search_rank = None
+    if q: query, search_rank = apply_search(query, q)
     
     tag_filter = request.args.get('tag')
     if tag_filter:
@@ -139,6 +156,7 @@ def index():
     if sort_by == 'priority': active_query = active_query.order_by(Task.priority.desc(), Task.created_at.desc())
     elif sort_by == 'due_date': active_query = active_query.order_by(Task.due_date.asc(), Task.created_at.desc())
     elif sort_by == 'tag': active_query = active_query.outerjoin(Task.tags).order_by(Tag.name.asc(), Task.created_at.desc())
+    elif search_rank is not None: active_query = active_query.order_by(search_rank, Task.created_at.desc())
     else: active_query = active_query.order_by(Task.created_at.desc())
     active_tasks = active_query.all()
     
@@ -174,8 +192,8 @@ def index():
     today_events = expand_events(user_events, today, today)
     today_events.sort(key=lambda x: x.start_time)
 
-    # Stats Summary - Using optimized property
-    total_focus = db.session.query(func.sum(FocusSession.minutes)).filter_by(user_id=current_user.id).scalar() or 0
+    # Stats Summary - Materialized totals
+    total_focus = get_focus_stats(current_user.id)['total_minutes']
     if request.headers.get('HX-Request'):
         return render_template('partials/task_list.html', tasks=tasks, now=datetime.now(timezone.utc).replace(tzinfo=None).replace(tzinfo=None), has_more_completed=has_more_completed)
     return render_template('index.html', tasks=tasks, user_tags=user_tags, habit_items=habit_items, today_events=today_events, total_focus=total_focus, now=datetime.now(timezone.utc).replace(tzinfo=None).replace(tzinfo=None), has_more_completed=has_more_completed)
@@ -183,7 +201,7 @@ def index():
 @main_bp.route('/timer')
 @login_required
 def timer():
-    tasks = [t for t in current_user.all_accessible_tasks if t.status != 'done']
+    tasks = accessible_tasks_query(current_user.id).all()
     return render_template('timer.html', tasks=tasks)
 
 @main_bp.route('/add_task', methods=['POST'])
@@ -229,7 +247,7 @@ def delete_task(task_id):
 @main_bp.route('/toggle_task/<int:task_id>', methods=['POST'])
 @login_required
 def toggle_task(task_id):
-    task = db.session.get(Task, task_id)
+    task = get_task(task_id)
     if not task: abort(404)
     if not check_task_access(task): abort(403)
     task.status = 'todo' if task.status == 'done' else 'done'
@@ -249,7 +267,7 @@ def get_edit_task(task_id):
 @main_bp.route('/task/<int:task_id>', methods=['PUT', 'POST'])
 @login_required
 def update_task(task_id):
-    task = db.session.get(Task, task_id)
+    task = get_task(task_id)
     if not task: abort(404)
     if not check_task_access(task): abort(403)
     title = request.form.get('title')
@@ -281,7 +299,7 @@ def update_task(task_id):
 @main_bp.route('/task/<int:task_id>/subtask', methods=['POST'])
 @login_required
 def add_subtask(task_id):
-    task = db.session.get(Task, task_id)
+    task = get_task(task_id)
     if not task: abort(404)
     if not check_task_access(task): abort(403)
     title = request.form.get('title')
@@ -334,84 +352,72 @@ def update_subtask(subtask_id):
 @main_bp.route('/task/<int:task_id>/item', methods=['GET'])
 @login_required
 def get_task_item(task_id):
-    task = db.session.get(Task, task_id)
+    task = get_task(task_id)
     if not task: abort(404)
     if not check_task_access(task): abort(403)
     return render_template('partials/task_item.html', task=task, now=datetime.now(timezone.utc).replace(tzinfo=None))
 
+LeaderRow = namedtuple('LeaderRow', 'id username is_verified')
+LEADERBOARD_TIMEOUT = 600
+STATS_TIMEOUT = 900
+
+def _leaderboard_rows(category, filter_type, start_of_week, end_of_week):
+    if category == 'habits':
+        query = db.session.query(User, func.count(HabitCompletion.id).label('score')).select_from(User).join(Habit, User.id == Habit.user_id).join(HabitCompletion, Habit.id == HabitCompletion.habit_id).group_by(User.id).order_by(func.count(HabitCompletion.id).desc())
+        if filter_type == 'weekly': query = query.filter(HabitCompletion.date >= start_of_week.date(), HabitCompletion.date <= end_of_week.date())
+    elif category == 'sync':
+        if filter_type == 'weekly':
+            score = func.sum(FocusDaily.partner_minutes)
+            query = db.session.query(User, score.label('score')).join(FocusDaily, User.id == FocusDaily.user_id).filter(FocusDaily.day >= start_of_week.date(), FocusDaily.day <= end_of_week.date()).group_by(User.id).having(score > 0).order_by(score.desc())
+        else:
+            query = db.session.query(User, UserFocusStats.partner_minutes.label('score')).join(UserFocusStats, User.id == UserFocusStats.user_id).filter(UserFocusStats.partner_minutes > 0).order_by(UserFocusStats.partner_minutes.desc())
+    else:
+        if filter_type == 'weekly':
+            score = func.sum(FocusDaily.minutes)
+            query = db.session.query(User, score.label('score')).join(FocusDaily, User.id == FocusDaily.user_id).filter(FocusDaily.day >= start_of_week.date(), FocusDaily.day <= end_of_week.date()).group_by(User.id).having(score > 0).order_by(score.desc())
+        else:
+            query = db.session.query(User, UserFocusStats.total_minutes.label('score')).join(UserFocusStats, User.id == UserFocusStats.user_id).filter(UserFocusStats.total_minutes > 0).order_by(UserFocusStats.total_minutes.desc())
+    # Plain tuples so the entry can be shared between workers; the viewer is applied at render time
+    return [(u.id, u.username, u.is_verified, s) for u, s in query.limit(10).all()]
+
 @main_bp.route('/leaderboard')
 @login_required
-@cache.cached(timeout=60, query_string=True)
 def leaderboard():
     filter_type = request.args.get('filter', 'all'); category = request.args.get('category', 'focus')
+    if filter_type not in ('all', 'weekly'): filter_type = 'all'
+    if category not in ('focus', 'habits', 'sync'): category = 'focus'
     now = datetime.now(timezone.utc)
     start_of_week = now - timedelta(days=now.weekday())
     start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_week = start_of_week + timedelta(days=6, hours=23, minutes=59, seconds=59)
-    if category == 'habits':
-        query = db.session.query(User, func.count(HabitCompletion.id).label('score')).select_from(User).join(Habit, User.id == Habit.user_id).join(HabitCompletion, Habit.id == HabitCompletion.habit_id).group_by(User.id).order_by(func.count(HabitCompletion.id).desc())
-        if filter_type == 'weekly': query = query.filter(HabitCompletion.date >= start_of_week.date(), HabitCompletion.date <= end_of_week.date())
-    elif category == 'sync':
-        query = db.session.query(User, func.sum(FocusSession.minutes).label('score')).join(FocusSession, User.id == FocusSession.user_id).filter(FocusSession.partner_id.isnot(None)).group_by(User.id).order_by(func.sum(FocusSession.minutes).desc())
-        if filter_type == 'weekly': query = query.filter(FocusSession.date >= start_of_week, FocusSession.date <= end_of_week)
-    else:
-        query = db.session.query(User, func.sum(FocusSession.minutes).label('score')).join(FocusSession, User.id == FocusSession.user_id).group_by(User.id).order_by(func.sum(FocusSession.minutes).desc())
-        if filter_type == 'weekly': query = query.filter(FocusSession.date >= start_of_week, FocusSession.date <= end_of_week)
-    results = query.limit(10).all()
+    rows = get_or_set('leaderboard', (category, filter_type, start_of_week.date().isoformat()),
+                      lambda: _leaderboard_rows(category, filter_type, start_of_week, end_of_week),
+                      tags=(leaderboard_tag(category),), timeout=LEADERBOARD_TIMEOUT)
+    results = [(LeaderRow(uid, username, is_verified), score) for uid, username, is_verified, score in rows]
     return render_template('leaderboard.html', leaders=results, filter_type=filter_type, category=category)
 
-@main_bp.route('/stats')
-@login_required
-def personal_stats():
-    now = datetime.now(timezone.utc)
-    
+def _personal_stats_data(user_id, now):
     # Core Metrics
-    total_minutes = db.session.query(func.sum(FocusSession.minutes)).filter_by(user_id=current_user.id).scalar() or 0
-    total_sessions = FocusSession.query.filter_by(user_id=current_user.id).count()
+    focus_stats = get_focus_stats(user_id)
     
     # Weekly Logic
     start_of_week = now - timedelta(days=now.weekday())
     start_of_week = start_of_week.replace(hour=0, minute=0, second=0, microsecond=0)
-    weekly_minutes = db.session.query(func.sum(FocusSession.minutes)).filter(
-        FocusSession.user_id == current_user.id,
-        FocusSession.date >= start_of_week
-    ).scalar() or 0
-    
-    # Sync Logic
-    sync_sessions = FocusSession.query.filter(
-        FocusSession.user_id == current_user.id,
-        FocusSession.partner_id.isnot(None)
-    ).all()
-    sync_minutes = sum(s.minutes for s in sync_sessions)
-    sync_sessions_count = len(sync_sessions)
     
     # Top Partner
     top_partner_data = db.session.query(
         FocusSession.partner_id, 
         func.count(FocusSession.id)
     ).filter(
-        FocusSession.user_id == current_user.id,
+        FocusSession.user_id == user_id,
         FocusSession.partner_id.isnot(None)
     ).group_by(FocusSession.partner_id).order_by(func.count(FocusSession.id).desc()).first()
-    
-    top_partner = None
-    if top_partner_data:
-        top_partner = db.session.get(User, top_partner_data[0])
 
-    # Heatmap Data (Current Year)
+    # Heatmap Data (Current Year) - one rollup row per active day
     year_start = datetime(now.year, 1, 1, tzinfo=timezone.utc)
-    sessions_year = FocusSession.query.filter(
-        FocusSession.user_id == current_user.id, 
-        FocusSession.date >= year_start
-    ).all()
-    
-    heatmap_data = {}
-    for s in sessions_year:
-        d_str = s.date.strftime('%Y-%m-%d')
-        heatmap_data[d_str] = heatmap_data.get(d_str, 0) + s.minutes
         
     habit_completions = HabitCompletion.query.join(Habit).filter(
-        Habit.user_id == current_user.id, 
+        Habit.user_id == user_id, 
         HabitCompletion.date >= year_start.date()
     ).all()
     
@@ -419,17 +425,34 @@ def personal_stats():
     for c in habit_completions:
         d_str = c.date.strftime('%Y-%m-%d')
         habit_heatmap_data[d_str] = habit_heatmap_data.get(d_str, 0) + 1
+
+    return {
+        'total_minutes': focus_stats['total_minutes'],
+        'total_sessions': focus_stats['session_count'],
+        'weekly_minutes': get_minutes_between(user_id, start_of_week.date()),
+        'sync_minutes': focus_stats['partner_minutes'],
+        'sync_sessions_count': focus_stats['partner_session_count'],
+        'top_partner_id': top_partner_data[0] if top_partner_data else None,
+        'heatmap_data': get_daily_minutes(user_id, year_start.date()),
+        'habit_heatmap_data': habit_heatmap_data,
+    }
+
+@main_bp.route('/stats')
+@login_required
+def personal_stats():
+    now = datetime.now(timezone.utc)
+    # Keyed by day so weekly/yearly windows roll over without an explicit invalidation
+    data = get_or_set('stats', (current_user.id, now.date().isoformat()),
+                      lambda: _personal_stats_data(current_user.id, now),
+                      tags=(user_tag(current_user.id),), timeout=STATS_TIMEOUT)
+    data = dict(data)
+    top_partner_id = data.pop('top_partner_id')
+    top_partner = db.session.get(User, top_partner_id) if top_partner_id else None
         
     return render_template('stats.html', 
-                           total_minutes=total_minutes,
-                           total_sessions=total_sessions,
-                           weekly_minutes=weekly_minutes,
-                           sync_minutes=sync_minutes,
-                           sync_sessions_count=sync_sessions_count,
                            top_partner=top_partner,
-                           heatmap_data=heatmap_data, 
-                           habit_heatmap_data=habit_heatmap_data,
-                           current_year=now.year)
+                           current_year=now.year,
+                           **data)
 
 @main_bp.route('/habits')
 @login_required
@@ -472,6 +495,7 @@ def delete_habit(habit_id):
     habit = db.session.get(Habit, habit_id)
     if habit and habit.user_id == current_user.id:
         db.session.delete(habit); db.session.commit()
+        invalidate_user(current_user.id, leaderboards=('habits',))
     return habits() if request.headers.get('HX-Request') else redirect(url_for('main.habits'))
 
 @main_bp.route('/habits/<int:habit_id>/toggle', methods=['POST'])
@@ -486,6 +510,7 @@ def toggle_habit(habit_id):
     if comp: db.session.delete(comp)
     else: db.session.add(HabitCompletion(habit_id=habit_id, date=target_date))
     db.session.commit()
+    invalidate_user(current_user.id, leaderboards=('habits',))
     if request.headers.get('HX-Request'):
         target = request.headers.get('HX-Target', '')
         # Handle index.html toggle
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from datetime import datetime, timezone
 from . import projects_bp
 from models import db, Project, ProjectMember, ProjectSection, Task, ProjectInvite, User
+from services.task_service import get_project_board
 from utils import log_project_action, get_username_html, create_notification
 
 @projects_bp.route('/')
@@ -34,7 +35,8 @@ def create_project():
 @projects_bp.route('/<int:project_id>')
 @login_required
 def project_detail(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = get_project_board(project_id)
+    if not project: abort(404)
     member = ProjectMember.query.filter_by(project_id=project_id, user_id=current_user.id).first()
     if not member:
         abort(403)
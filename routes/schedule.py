@@ -5,6 +5,7 @@ import calendar
 from . import schedule_bp
 from models import db, Event, Notification
 from utils import create_notification
+from services.reminder_service import schedule_event
 
 @schedule_bp.route('/')
 @login_required
@@ -53,6 +54,7 @@ def add_event():
                 user_id=current_user.id
             )
             db.session.add(new_event)
+            schedule_event(new_event)
             db.session.commit()
         except ValueError:
             pass
@@ -97,6 +99,7 @@ def update_event(event_id):
         except ValueError:
             pass
 
+    schedule_event(event)
     db.session.commit()
     return render_template('partials/event_item.html', event=event)
 
@@ -1,10 +1,24 @@
 from flask import render_template, request, jsonify, abort, redirect, url_for
 from flask_login import login_required, current_user
-from sqlalchemy import or_, func
 from datetime import datetime, timezone
 from . import social_bp
-from models import db, User, Friendship, FocusSession, StudyRoom, Task
+from models import db, User, Friendship, FocusSession
 from utils import get_username_html, create_notification
+from services.focus_stats_service import get_focus_stats
+from services.presence_service import presence_snapshot
+from services.suggestion_service import get_suggestions
+from services.friend_service import (friend_ids as get_friend_ids, get_friendship,
+                                     friendship_status, friendship_statuses)
+from services.search_service import search_usernames
+from services.cache_service import get_or_set
+from services.job_service import enqueue
+from collections import namedtuple
+
+SearchHit = namedtuple('SearchHit', 'id username is_verified')
+SEARCH_LIMIT = 5
+# Long enough to absorb a burst of keystrokes, short enough that new signups show up quickly
+SEARCH_TIMEOUT = 30
+USERNAME_MAX = 150
 
 @social_bp.route('/u/<username>')
 @login_required
@@ -12,25 +26,12 @@ def profile(username):
     try:
         user = User.query.filter_by(username=username).first_or_404()
         
-        friendship = Friendship.query.filter(
-            or_(
-                (Friendship.user_id == current_user.id) & (Friendship.friend_id == user.id),
-                (Friendship.user_id == user.id) & (Friendship.friend_id == current_user.id)
-            )
-        ).first()
-        
-        status = 'none'
-        if friendship:
-            status = friendship.status
-            if status == 'pending':
-                if friendship.user_id == current_user.id:
-                    status = 'sent'
-                else:
-                    status = 'received'
+        status = friendship_status(current_user.id, user.id)
 
-        # Use efficient summing
-        total_minutes = db.session.query(func.sum(FocusSession.minutes)).filter_by(user_id=user.id).scalar() or 0
-        total_sessions = FocusSession.query.filter_by(user_id=user.id).count()
+        # Materialized totals
+        focus_stats = get_focus_stats(user.id)
+        total_minutes = focus_stats['total_minutes']
+        total_sessions = focus_stats['session_count']
 
         recent_sessions = FocusSession.query.filter_by(user_id=user.id).order_by(FocusSession.date.desc()).limit(5).all()
         
@@ -48,68 +49,24 @@ def profile(username):
 @social_bp.route('/friends')
 @login_required
 def friends_list():
-    friendships = Friendship.query.filter(
-        or_(
-            (Friendship.user_id == current_user.id),
-            (Friendship.friend_id == current_user.id)
-        ),
-        Friendship.status == 'accepted'
-    ).all()
-    
-    friend_ids = []
-    for f in friendships:
-        if f.user_id == current_user.id:
-            friend_ids.append(f.friend_id)
-        else:
-            friend_ids.append(f.user_id)
+    friend_ids = get_friend_ids(current_user.id)
             
-    friends = User.query.filter(User.id.in_(friend_ids)).all()
-    
-    active_rooms = StudyRoom.query.filter(
-        StudyRoom.status == 'active',
-        or_(StudyRoom.host_id.in_(friend_ids), StudyRoom.guest_id.in_(friend_ids))
-    ).all()
-    
-    sync_map = {}
-    for room in active_rooms:
-        if room.host_id in friend_ids:
-            sync_map[room.host_id] = True
-        if room.guest_id and room.guest_id in friend_ids:
-            sync_map[room.guest_id] = True
+    # One query for every friend's profile, presence, current task and sync status
+    snapshots = presence_snapshot(friend_ids)
+    friends = [snapshots[fid] for fid in friend_ids if fid in snapshots]
     
     pending_friendships = Friendship.query.filter_by(friend_id=current_user.id, status='pending').all()
     pending_ids = [f.user_id for f in pending_friendships]
     pending_requests = User.query.filter(User.id.in_(pending_ids)).all()
     
-    suggested_users = []
-    if not friends and not pending_requests:
-        all_related = Friendship.query.filter(
-            or_(Friendship.user_id == current_user.id, Friendship.friend_id == current_user.id)
-        ).all()
-        exclude_ids = {current_user.id}
-        for f in all_related:
-            exclude_ids.add(f.user_id)
-            exclude_ids.add(f.friend_id)
-            
-        suggested_users = (User.query.filter(~User.id.in_(exclude_ids))
-            .order_by(func.random())
-            .limit(3).all())
+    suggested_users = get_suggestions(current_user.id)
     
     friends_data = []
     now = datetime.now(timezone.utc)
     
     for friend in friends:
-        if not friend.last_seen:
-            is_online = False
-        else:
-            friend_last_seen = friend.last_seen.replace(tzinfo=timezone.utc) if friend.last_seen.tzinfo is None else friend.last_seen
-            is_online = (now - friend_last_seen).total_seconds() < 300 
-            
-        is_syncing = sync_map.get(friend.id, False)
-        
-        status_msg = "Offline"
-        if is_online:
-            status_msg = "Online"
+        is_online = friend.is_online
+        status_msg = "Online" if is_online else "Offline"
             
         timer_info = None
         # Handle current_focus_end (might be naive from DB)
@@ -125,12 +82,8 @@ def friends_list():
                 'mode': friend.current_focus_mode,
                 'minutes': minutes,
                 'seconds': seconds,
-                'task': None
+                'task': friend.task_title
             }
-            if friend.current_task_id:
-                task = db.session.get(Task, friend.current_task_id)
-                if task:
-                    timer_info['task'] = task.title
         elif is_online:
             # Idling logic
             # Idle since last_focus_end or last_seen (whichever is more relevant)
@@ -148,8 +101,9 @@ def friends_list():
         
         friends_data.append({
             'user': friend,
+            'last_seen': friend.last_seen,
             'is_online': is_online,
-            'is_syncing': is_syncing,
+            'is_syncing': friend.is_syncing,
             'status_msg': status_msg,
             'timer': timer_info
         })
@@ -163,24 +117,14 @@ def search_friends():
     if not query:
         return ''
         
-    users = User.query.filter(User.username.ilike(f'%{query}%'), User.id != current_user.id).limit(5).all()
-    
-    results = []
-    for u in users:
-        friendship = Friendship.query.filter(
-            or_(
-                (Friendship.user_id == current_user.id) & (Friendship.friend_id == u.id),
-                (Friendship.user_id == u.id) & (Friendship.friend_id == current_user.id)
-            )
-        ).first()
-        
-        status = 'none'
-        if friendship:
-            status = friendship.status
-            if status == 'pending':
-                status = 'sent' if friendship.user_id == current_user.id else 'received'
-                
-        results.append({'user': u, 'status': status})
+    # Matches are shared by everyone typing the same prefix; friendship status is per viewer
+    key = query.strip().lower()[:USERNAME_MAX]
+    hits = get_or_set('user_search', (key,), lambda: search_usernames(key, limit=SEARCH_LIMIT + 1),
+                      timeout=SEARCH_TIMEOUT)
+    users = [SearchHit(*hit) for hit in hits if hit[0] != current_user.id][:SEARCH_LIMIT]
+
+    statuses = friendship_statuses(current_user.id, [u.id for u in users])
+    results = [{'user': u, 'status': statuses.get(u.id, 'none')} for u in users]
         
     return render_template('partials/friend_search_results.html', results=results)
 
@@ -191,12 +135,7 @@ def send_friend_request(user_id):
     if target_user.id == current_user.id:
         return '', 400
         
-    existing = Friendship.query.filter(
-        or_(
-            (Friendship.user_id == current_user.id) & (Friendship.friend_id == target_user.id),
-            (Friendship.user_id == target_user.id) & (Friendship.friend_id == current_user.id)
-        )
-    ).first()
+    existing = get_friendship(current_user.id, target_user.id)
     
     if not existing:
         friendship = Friendship(user_id=current_user.id, friend_id=target_user.id, status='pending')
@@ -243,23 +182,17 @@ def respond_friend_request(user_id, action):
             f"{get_username_html(current_user)} accepted your friend request!",
             type='success'
         )
-        # Check achievements for both users
-        from services.achievement_service import check_achievements
-        check_achievements(current_user)
-        target_user = User.query.get(user_id)
-        if target_user:
-            check_achievements(target_user)
+        # Bump friend counters for both users
+        enqueue('achievements.record_friendship_progress', [current_user.id, user_id])
     elif action == 'reject':
         db.session.delete(friendship)
     elif action == 'remove':
-        friendship = Friendship.query.filter(
-            or_(
-                (Friendship.user_id == current_user.id) & (Friendship.friend_id == user_id),
-                (Friendship.user_id == user_id) & (Friendship.friend_id == current_user.id)
-            )
-        ).first()
+        friendship = get_friendship(current_user.id, user_id)
         if friendship:
+            was_accepted = friendship.status == 'accepted'
             db.session.delete(friendship)
+            if was_accepted:
+                enqueue('achievements.record_friendship_progress', [current_user.id, user_id], delta=-1)
             
     db.session.commit()
     
@@ -1,9 +1,31 @@
-from flask import render_template, request, jsonify, abort, redirect, url_for
+from flask import render_template, request, jsonify, abort, redirect, url_for, current_app
 from flask_login import login_required, current_user
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import joinedload
 from . import study_bp
 from models import db, StudyRoom, User, Task, ChatMessage
 from utils import get_username_html, create_notification
+from extensions import realtime
+from services.room_service import (is_expired as is_room_expired, bump_state_version, publish_room_state,
+                                   wait_for_change as wait_for_room_change)
+from services.presence_service import presence_snapshot
+
+CHAT_PAGE_SIZE = 50
+
+def render_chat(room, after_id=None, before_id=None):
+    # Cursors use the (room_id, id) index: ids are monotonic, so each poll is a range scan
+    query = ChatMessage.query.options(joinedload(ChatMessage.user)).filter(ChatMessage.room_id == room.id)
+    if after_id is not None:
+        messages = query.filter(ChatMessage.id > after_id).order_by(ChatMessage.id.asc()).limit(CHAT_PAGE_SIZE).all()
+        return render_template('partials/chat_messages.html', messages=messages, room_id=room.id, mode='append')
+
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+    page = query.order_by(ChatMessage.id.desc()).limit(CHAT_PAGE_SIZE + 1).all()
+    messages = list(reversed(page[:CHAT_PAGE_SIZE]))
+    return render_template('partials/chat_messages.html', messages=messages, room_id=room.id,
+                           has_older=len(page) > CHAT_PAGE_SIZE,
+                           mode='older' if before_id is not None else 'initial')
 
 @study_bp.route('/room/<int:room_id>/chat', methods=['GET', 'POST'])
 @login_required
@@ -11,6 +33,9 @@ def study_chat(room_id):
     room = StudyRoom.query.get_or_404(room_id)
     if current_user.id not in [room.host_id, room.guest_id]:
         abort(403)
+
+    after_id = request.values.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
         
     if request.method == 'POST':
         message = request.form.get('message')
@@ -18,15 +43,13 @@ def study_chat(room_id):
             msg = ChatMessage(room_id=room.id, user_id=current_user.id, message=message)
             db.session.add(msg)
             db.session.commit()
+            realtime.publish_to_room(room.id, 'chat', {'id': msg.id})
             
-            # If HTMX, return just the new message (or all)
-            # Returning all for simplicity in auto-scroll
-            messages = ChatMessage.query.filter_by(room_id=room.id).order_by(ChatMessage.timestamp.asc()).all()
-            return render_template('partials/chat_messages.html', messages=messages)
+        # With a cursor, return only what the sender hasn't seen yet (including their own message)
+        return render_chat(room, after_id=after_id)
 
-    # GET (Polling)
-    messages = ChatMessage.query.filter_by(room_id=room.id).order_by(ChatMessage.timestamp.asc()).all()
-    return render_template('partials/chat_messages.html', messages=messages)
+    # GET: initial page, incremental poll (after_id) or backward pagination (before_id)
+    return render_chat(room, after_id=after_id, before_id=before_id)
 
 @study_bp.route('/join/<int:room_id>')
 @login_required
@@ -37,7 +60,9 @@ def join_study_room(room_id):
         
     if room.status == 'waiting':
         room.status = 'active'
+        bump_state_version(room)
         db.session.commit()
+        publish_room_state(room, status=room.status)
         
     return redirect(url_for('study.study_room', room_id=room.id))
 
@@ -104,9 +129,11 @@ def study_control():
         room.active_mode = 'break' if room.active_mode == 'focus' else 'focus'
     
     room.last_activity = datetime.utcnow()
+    bump_state_version(room)
         
     db.session.commit()
-    return jsonify({'status': 'ok'})
+    publish_room_state(room)
+    return jsonify({'status': 'ok', 'version': room.state_version})
 
 @study_bp.route('/state/<int:room_id>')
 @login_required
@@ -114,56 +141,45 @@ def study_state(room_id):
     room = StudyRoom.query.get_or_404(room_id)
     if current_user.id not in [room.host_id, room.guest_id]:
         abort(403)
+
+    # Long-poll: with ?since=<state_version>, answer only once something changed (or on timeout)
+    since = request.args.get('since', type=int)
+    if since is not None and since == room.state_version:
+        room = wait_for_room_change(room_id, since, current_app.config['STUDY_STATE_LONGPOLL_TIMEOUT'])
+        if room is None:
+            return jsonify({'status': 'finished'})
+
+    # Idle rooms are deleted by the room sweeper; until it gets there, report them as over
+    if is_room_expired(room):
+        return jsonify({'status': 'finished'})
         
     duration = (room.focus_duration if room.active_mode == 'focus' else room.break_duration) * 60
+    start_rem = room.seconds_remaining if room.seconds_remaining is not None else duration
+    now = datetime.now(timezone.utc)
     
-    seconds_remaining = duration
-    is_running = False
-    
+    ends_at = None
     if room.active_start_time:
-        elapsed = (datetime.utcnow() - room.active_start_time).total_seconds()
-        start_rem = room.seconds_remaining if room.seconds_remaining is not None else duration
-        seconds_remaining = max(0, start_rem - elapsed)
-        is_running = True
-        
-        # While running, it's active. Update timestamp implicitly or we rely on 'running' state not timing out?
-        # Let's say if running, it is NOT inactive.
+        # Clients count down locally to this instant, corrected by server_time
+        end = room.active_start_time.replace(tzinfo=timezone.utc) + timedelta(seconds=start_rem)
+        seconds_remaining = max(0, (end - now).total_seconds())
+        ends_at = int(end.timestamp() * 1000)
     else:
-        # Check for inactivity timeout (30 mins)
-        last_active = room.last_activity or room.created_at
-        if (datetime.utcnow() - last_active).total_seconds() > 1800: # 30 mins * 60
-             # Delete room
-             from models import ChatMessage
-             ChatMessage.query.filter_by(room_id=room.id).delete()
-             db.session.delete(room)
-             db.session.commit()
-             return jsonify({'status': 'finished'})
-
-        if room.seconds_remaining is not None:
-            seconds_remaining = room.seconds_remaining
-        else:
-            seconds_remaining = duration
-            
-    host = User.query.get(room.host_id)
-    guest = User.query.get(room.guest_id) if room.guest_id else None
-    
-    my_task = "No Task"
-    other_task = "No Task"
-    
-    if current_user.id == room.host_id:
-        if host.current_task: my_task = host.current_task.title
-        if guest and guest.current_task: other_task = guest.current_task.title
-    else:
-        if guest and guest.current_task: my_task = guest.current_task.title
-        if host.current_task: other_task = host.current_task.title
+        seconds_remaining = start_rem
+
+    tasks = presence_snapshot([uid for uid in (room.host_id, room.guest_id) if uid])
+    other_id = room.guest_id if current_user.id == room.host_id else room.host_id
+    mine, other = tasks.get(current_user.id), tasks.get(other_id)
 
     return jsonify({
+        'version': room.state_version,
         'mode': room.active_mode,
-        'is_running': is_running,
+        'is_running': ends_at is not None,
         'seconds_remaining': int(seconds_remaining),
         'duration': duration,
-        'my_task': my_task,
-        'other_task': other_task
+        'ends_at': ends_at,
+        'server_time': int(now.timestamp() * 1000),
+        'my_task': (mine.task_title if mine else None) or "No Task",
+        'other_task': (other.task_title if other else None) or "No Task"
     })
 
 @study_bp.route('/leave/<int:room_id>', methods=['POST'])
@@ -176,6 +192,7 @@ def leave_study_room(room_id):
         ChatMessage.query.filter_by(room_id=room.id).delete()
         db.session.delete(room)
         db.session.commit()
+        realtime.publish_to_room(room_id, 'room_state', {'status': 'finished'})
     return redirect(url_for('main.index'))
 
 @study_bp.route('/sync/request/<int:user_id>', methods=['POST'])
@@ -196,7 +213,7 @@ def sync_request(user_id):
         sessions_count=sessions_count
     )
     db.session.add(room)
-    db.session.commit()
+    db.session.flush()
     
     accept_url = url_for('study.sync_accept', room_id=room.id)
     reject_url = url_for('study.sync_reject', room_id=room.id)
@@ -212,6 +229,7 @@ def sync_request(user_id):
     """
     
     create_notification(target_user.id, msg, type='info') 
+    db.session.commit()
     
     return '', 204
 
@@ -223,14 +241,15 @@ def sync_accept(room_id):
         abort(403)
         
     room.status = 'active'
-    db.session.commit()
-    
+    bump_state_version(room)
     join_url = url_for('study.study_room', room_id=room.id)
     create_notification(
         room.host_id,
         f"{get_username_html(current_user)} accepted your sync request! <a href='{join_url}' class='underline font-bold'>Join Now</a>",
         type='success'
     )
+    db.session.commit()
+    publish_room_state(room, status=room.status)
     
     response = jsonify({'status': 'success'})
     response.headers['HX-Redirect'] = join_url
@@ -243,8 +262,7 @@ def sync_reject(room_id):
     if room.guest_id != current_user.id:
         abort(403)
         
+    create_notification(room.host_id, f"{current_user.username} declined your sync request.", type='warning')
     db.session.delete(room)
     db.session.commit()
-    
-    create_notification(room.host_id, f"{current_user.username} declined your sync request.", type='warning')
     return '', 200
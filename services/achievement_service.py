@@ -1,59 +1,158 @@
-from models import db, Achievement, UserAchievement
+from sqlalchemy import func, update, case
+from sqlalchemy.exc import IntegrityError
+from models import db, Achievement, UserAchievement, AchievementProgress, FocusSession, User
 from utils import create_notification
+from services.focus_stats_service import get_focus_stats
+from services.friend_service import friend_count
+from services.job_service import job
+
+# Progress is stored in the unit the triggering events produce; `scale` converts
+# an Achievement.criteria_value into that unit (focus_hours thresholds are compared in minutes).
+def _focus_minutes(user_id):
+    return get_focus_stats(user_id)['total_minutes']
+
+def _pomodoro_count(user_id):
+    total = db.session.query(func.sum(FocusSession.minutes // 25)).filter(FocusSession.user_id == user_id).scalar()
+    return int(total or 0)
+
+def _friend_count(user_id):
+    return friend_count(user_id)
+
+def _partner_session_count(user_id):
+    return get_focus_stats(user_id)['partner_session_count']
+
+CRITERIA = {
+    'focus_hours': {'scale': 60, 'compute': _focus_minutes},
+    'pomodoro_count': {'scale': 1, 'compute': _pomodoro_count},
+    'friend_count': {'scale': 1, 'compute': _friend_count},
+    'partner_session_count': {'scale': 1, 'compute': _partner_session_count},
+}
+
+def _crossed_achievements(user_id, criteria_type, old_value, new_value):
+    # Only thresholds in (old_value, new_value] can unlock, and the composite
+    # (criteria_type, criteria_value) index turns this into a short range scan.
+    scale = CRITERIA[criteria_type]['scale']
+    earned = db.session.query(UserAchievement.achievement_id).filter(UserAchievement.user_id == user_id)
+    query = Achievement.query.filter(
+        Achievement.criteria_type == criteria_type,
+        Achievement.criteria_value * scale <= new_value,
+        ~Achievement.id.in_(earned)
+    )
+    if old_value is not None:
+        query = query.filter(Achievement.criteria_value * scale > old_value)
+    return query.order_by(Achievement.criteria_value.asc()).all()
+
+def _award(user_id, achievements):
+    for ach in achievements:
+        db.session.add(UserAchievement(user_id=user_id, achievement_id=ach.id))
+
+def _notify_unlocks(user_id, achievements):
+    for ach in achievements:
+        create_notification(user_id, f"🏆 Achievement Unlocked: {ach.name}", type='success')
+
+def _increment_progress(user_id, criteria_type, delta):
+    # One UPDATE ... RETURNING, so jobs for the same user on different workers can't lose increments
+    table = AchievementProgress.__table__
+    value = table.c.value + delta
+    stmt = (update(table)
+            .where(table.c.user_id == user_id, table.c.criteria_type == criteria_type)
+            .values(value=case((value < 0, 0), else_=value))
+            .returning(table.c.value))
+    return db.session.execute(stmt).scalar()
+
+def _create_progress(user_id, criteria_type, value):
+    """Insert a first counter; returns False if a concurrent job created it first."""
+    try:
+        with db.session.begin_nested():
+            db.session.add(AchievementProgress(user_id=user_id, criteria_type=criteria_type, value=value))
+    except IntegrityError:
+        return False
+    return True
+
+@job('achievements.record_progress')
+def record_progress(user_id, deltas):
+    """Apply counter increments for one user and unlock whatever thresholds they crossed.
+
+    `deltas` maps criteria_type -> increment. Increments are atomic, and the
+    thresholds checked are those between the value before and after this one, so
+    concurrent calls for the same user each see their own range. A counter seen for
+    the first time is computed from source instead, so users with history before
+    the engine existed start from the right value. Returns the newly unlocked
+    achievements.
+    """
+    unlocked = []
+    for criteria_type, delta in deltas.items():
+        if criteria_type not in CRITERIA or not delta:
+            continue
+        new_value = _increment_progress(user_id, criteria_type, delta)
+        if new_value is not None:
+            # Only positive deltas are evaluated, and those are never floored
+            old_value = new_value - delta
+        else:
+            old_value = None
+            new_value = CRITERIA[criteria_type]['compute'](user_id)
+            if not _create_progress(user_id, criteria_type, new_value):
+                new_value = _increment_progress(user_id, criteria_type, delta)
+                old_value = new_value - delta
+        if delta > 0:
+            unlocked.extend(_crossed_achievements(user_id, criteria_type, old_value, new_value))
+
+    _award(user_id, unlocked)
+    _notify_unlocks(user_id, unlocked)
+    db.session.commit()
+    return unlocked
+
+def record_session_progress(user_id, minutes, partner_id=None):
+    """Event hook for a logged FocusSession (call after the session is committed)."""
+    return record_progress(user_id, {
+        'focus_hours': minutes,
+        'pomodoro_count': minutes // 25,
+        'partner_session_count': 1 if partner_id else 0,
+    })
+
+@job('achievements.record_friendship_progress')
+def record_friendship_progress(user_ids, delta=1):
+    """Event hook for a friendship being accepted (delta=1) or removed (delta=-1)."""
+    unlocked = {}
+    for user_id in user_ids:
+        unlocked[user_id] = record_progress(user_id, {'friend_count': delta})
+    return unlocked
 
 def check_achievements(user):
-    # Get user's earned ids
-    earned_ids = {ua.achievement_id for ua in user.achievements}
-    
-    # Check all achievements
-    achievements = Achievement.query.all()
-    
-    unearned = [ach for ach in achievements if ach.id not in earned_ids]
-    if not unearned:
-        return
-
-    # Only calculate stats if we have unearned achievements of that type
-    total_hours = None
-    total_pomos = None
-    friend_count = None
-    partner_sessions = None
-    
-    new_unlocks = []
-    
-    for ach in unearned:
-        unlocked = False
-        if ach.criteria_type == 'focus_hours':
-            if total_hours is None: total_hours = user.total_focus_hours
-            if total_hours >= ach.criteria_value: unlocked = True
-        elif ach.criteria_type == 'pomodoro_count':
-            if total_pomos is None: total_pomos = sum(session.minutes // 25 for session in user.focus_sessions)
-            if total_pomos >= ach.criteria_value: unlocked = True
-        elif ach.criteria_type == 'friend_count':
-            if friend_count is None:
-                from models import Friendship
-                friend_count = Friendship.query.filter(
-                    ((Friendship.user_id == user.id) | (Friendship.friend_id == user.id)),
-                    Friendship.status == 'accepted'
-                ).count()
-            if friend_count >= ach.criteria_value: unlocked = True
-        elif ach.criteria_type == 'partner_session_count':
-            if partner_sessions is None:
-                from models import FocusSession
-                partner_sessions = FocusSession.query.filter(
-                    FocusSession.user_id == user.id,
-                    FocusSession.partner_id.isnot(None)
-                ).count()
-            if partner_sessions >= ach.criteria_value: unlocked = True
-            
-        if unlocked:
-            ua = UserAchievement(user_id=user.id, achievement_id=ach.id)
-            db.session.add(ua)
-            new_unlocks.append(ach)
-            
-    if new_unlocks:
-        db.session.commit()
-        for ach in new_unlocks:
-            create_notification(user.id, f"🏆 Achievement Unlocked: {ach.name}", type='success')
+    """Full reconcile for one user: recompute every counter from source and award anything missing.
+
+    This is the slow path used by maintenance scripts; request handlers use the
+    record_* event hooks instead.
+    """
+    user_id = user if isinstance(user, int) else user.id
+    unlocked = []
+    for criteria_type, spec in CRITERIA.items():
+        value = spec['compute'](user_id)
+        progress = db.session.get(AchievementProgress, (user_id, criteria_type))
+        if progress is None:
+            db.session.add(AchievementProgress(user_id=user_id, criteria_type=criteria_type, value=value))
+        else:
+            progress.value = value
+        unlocked.extend(_crossed_achievements(user_id, criteria_type, None, value))
+
+    _award(user_id, unlocked)
+    _notify_unlocks(user_id, unlocked)
+    db.session.commit()
+    return unlocked
+
+def reconcile_achievements(all_users=False):
+    """Reconcile users that have no progress counters yet (or everyone with all_users=True).
+
+    Returns a list of (user, unlocked) for every user processed.
+    """
+    query = User.query
+    if not all_users:
+        tracked = db.session.query(AchievementProgress.user_id).distinct()
+        query = query.filter(~User.id.in_(tracked))
+    results = []
+    for user in query.all():
+        results.append((user, check_achievements(user)))
+    return results
 
 def seed_achievements():
     # Define all achievements
@@ -0,0 +1,66 @@
+"""Fingerprinted static assets.
+
+`npm run build` (assets/build.js, run in the Docker asset stage) writes the purged
+Tailwind stylesheet, the vendored htmx/Alpine/Sortable bundles and copies of the
+app's own CSS/JS under content-hashed names in static/dist/, with a manifest
+mapping logical names to them. Templates ask for `asset_url('app.css')`; hashed
+files never change, so WhiteNoise serves them with far-future cache headers.
+Without a build (local development) base.html falls back to the CDN scripts.
+
+The service worker precaches everything in the manifest. It is registered with
+`asset_version` (a digest of the manifest) in its URL, so each new build
+installs a fresh worker with a fresh cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from flask import url_for
+
+logger = logging.getLogger(__name__)
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+def is_immutable(path, url):
+    """WhiteNoise immutable_file_test: content-hashed files can be cached forever."""
+    return bool(HASHED_NAME.search(url))
+
+class Assets:
+    """Flask extension resolving logical asset names through static/dist/manifest.json."""
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSET_MANIFEST', os.path.join(app.static_folder, 'dist', 'manifest.json'))
+        self.manifest = self._load(app.config['ASSET_MANIFEST'])
+        app.extensions['assets'] = self
+        app.context_processor(lambda: {'asset_url': self.url, 'assets_built': self.built, 'asset_version': self.version})
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.error("Ignoring unreadable asset manifest %s: %s", path, e)
+            return {}
+
+    @property
+    def built(self):
+        return bool(self.manifest)
+
+    @property
+    def version(self):
+        if not self.manifest:
+            return 'dev'
+        digest = hashlib.sha256(json.dumps(self.manifest, sort_keys=True).encode())
+        return digest.hexdigest()[:12]
+
+    def url(self, name):
+        return url_for('static', filename=self.manifest.get(name, name))
@@ -0,0 +1,66 @@
+"""Periodic in-process workers.
+
+Each worker runs in a daemon thread that a Flask before_request hook starts with
+the first request a process serves, so every gunicorn worker gets one without a
+separate scheduler process. The same loop can be run in the foreground from a
+CLI command instead. Work must be safe to run concurrently from several workers.
+"""
+import logging
+import threading
+from abc import ABC, abstractmethod
+from models import db
+
+logger = logging.getLogger(__name__)
+
+class BackgroundLoop(ABC):
+    """Calls tick() inside an app context forever, sleeping for whatever it returns."""
+
+    name = 'background-loop'
+    interval_key = None
+    # Config flag switching the in-process thread on; checked each time, so it can be turned off after init
+    enabled_key = None
+
+    def __init__(self, app):
+        self.app = app
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    @property
+    def interval(self):
+        return self.app.config[self.interval_key]
+
+    @abstractmethod
+    def tick(self):
+        """Do one pass; return the number of seconds until the next one is due."""
+
+    def ensure_started(self):
+        if self.enabled_key and not self.app.config[self.enabled_key]:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Cut the current sleep short (e.g. new work was just committed)."""
+        self._wake.set()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                return self.tick()
+            except Exception as e:
+                db.session.rollback()
+                logger.error("%s pass failed: %s", self.name, e)
+                return self.interval
+            finally:
+                db.session.remove()
+
+    def run(self):
+        while True:
+            # Never spin: work that keeps failing is retried on the next pass
+            self._wake.wait(max(self.run_once(), 1))
+            self._wake.clear()
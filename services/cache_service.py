@@ -0,0 +1,60 @@
+"""Namespaced cache entries with tag-based invalidation.
+
+Each tag owns a random version token stored in the shared cache. Entry keys embed
+the current tokens of their tags, so invalidating a tag swaps its token and every
+entry built under the old one simply stops being addressed (and ages out by TTL).
+Because tokens are random rather than counters, an evicted tag can never resurrect
+a stale entry. Works with any Flask-Caching backend all workers can see.
+"""
+from uuid import uuid4
+from extensions import cache
+
+KEY_PREFIX = 'modo'
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+def leaderboard_tag(category):
+    return f"leaderboard:{category}"
+
+LEADERBOARD_CATEGORIES = ('focus', 'habits', 'sync')
+
+def _tag_key(tag):
+    return f"{KEY_PREFIX}:tag:{tag}"
+
+def _new_token():
+    return uuid4().hex[:12]
+
+def _tag_versions(tags):
+    if not tags:
+        return []
+    keys = [_tag_key(t) for t in tags]
+    versions = list(cache.get_many(*keys))
+    for i, (key, version) in enumerate(zip(keys, versions)):
+        if version is None:
+            # add() keeps the token another worker may have just written
+            cache.add(key, _new_token(), timeout=0)
+            versions[i] = cache.get(key) or ''
+    return versions
+
+def make_key(namespace, *parts, tags=()):
+    return ':'.join([KEY_PREFIX, namespace, *map(str, parts), *_tag_versions(tags)])
+
+def get_or_set(namespace, parts, builder, tags=(), timeout=None):
+    """Return the cached value for namespace/parts, building and storing it on a miss."""
+    key = make_key(namespace, *parts, tags=tags)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout=timeout)
+    return value
+
+def invalidate(*tags):
+    if tags:
+        cache.set_many({_tag_key(t): _new_token() for t in tags}, timeout=0)
+
+def invalidate_user(*user_ids, leaderboards=()):
+    """Drop per-user views for the given users plus any leaderboard categories they affect."""
+    tags = [user_tag(uid) for uid in user_ids if uid]
+    tags += [leaderboard_tag(c) for c in leaderboards]
+    invalidate(*tags)
@@ -0,0 +1,194 @@
+from sqlalchemy import event, func, case
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from models import db, FocusSession, UserFocusStats, FocusDaily, utc_now
+
+STAT_FIELDS = ('total_minutes', 'session_count', 'partner_minutes', 'partner_session_count')
+DAILY_FIELDS = ('minutes', 'sessions', 'partner_minutes')
+
+def _session_deltas(sessions):
+    # Fold a batch of new FocusSession rows into per-user increments
+    deltas = {}
+    for s in sessions:
+        d = deltas.setdefault(s.user_id, dict.fromkeys(STAT_FIELDS, 0))
+        d['total_minutes'] += s.minutes or 0
+        d['session_count'] += 1
+        if s.partner_id is not None:
+            d['partner_minutes'] += s.minutes or 0
+            d['partner_session_count'] += 1
+    return deltas
+
+def _daily_deltas(sessions):
+    deltas = {}
+    for s in sessions:
+        day = (s.date or utc_now()).date()
+        d = deltas.setdefault((s.user_id, day), dict.fromkeys(DAILY_FIELDS, 0))
+        d['minutes'] += s.minutes or 0
+        d['sessions'] += 1
+        if s.partner_id is not None:
+            d['partner_minutes'] += s.minutes or 0
+    return deltas
+
+def upsert_increment(connection, table, key, deltas, extra=None):
+    """Add `deltas` to the row identified by `key`, creating it if missing.
+
+    Uses native ON CONFLICT upserts on SQLite/Postgres so concurrent writers
+    can't race on the first insert; other dialects fall back to UPDATE-then-INSERT.
+    """
+    extra = extra or {}
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**key, **deltas, **extra)
+        set_ = {col: table.c[col] + stmt.excluded[col] for col in deltas}
+        set_.update({col: stmt.excluded[col] for col in extra})
+        connection.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=set_))
+        return
+
+    where = [table.c[col] == val for col, val in key.items()]
+    values = {col: table.c[col] + val for col, val in deltas.items()}
+    values.update(extra)
+    result = connection.execute(table.update().where(*where).values(**values))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(**key, **deltas, **extra))
+
+def apply_focus_deltas(connection, deltas):
+    table = UserFocusStats.__table__
+    now = utc_now()
+    for user_id, d in deltas.items():
+        upsert_increment(connection, table, {'user_id': user_id}, d, extra={'updated_at': now})
+
+def apply_daily_deltas(connection, deltas):
+    table = FocusDaily.__table__
+    for (user_id, day), d in deltas.items():
+        upsert_increment(connection, table, {'user_id': user_id, 'day': day}, d)
+
+def _after_flush(session, flush_context):
+    # session.new still holds the pre-flush state here, but generated defaults
+    # (ids, dates) are populated, so the increments join the same transaction.
+    # Sessions are append-only in the app; edits/deletes are picked up by reconcile_focus_stats.
+    new_sessions = [o for o in session.new if isinstance(o, FocusSession)]
+    if not new_sessions:
+        return
+    connection = session.connection()
+    apply_focus_deltas(connection, _session_deltas(new_sessions))
+    apply_daily_deltas(connection, _daily_deltas(new_sessions))
+
+def register_focus_stats_listeners():
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+
+def get_focus_stats(user_id):
+    """Return the lifetime totals for a user as a dict (zeros if nothing logged yet)."""
+    row = db.session.query(
+        UserFocusStats.total_minutes, UserFocusStats.session_count,
+        UserFocusStats.partner_minutes, UserFocusStats.partner_session_count
+    ).filter(UserFocusStats.user_id == user_id).first()
+    if not row:
+        return dict.fromkeys(STAT_FIELDS, 0)
+    return dict(zip(STAT_FIELDS, (v or 0 for v in row)))
+
+def _computed_focus_stats(user_ids=None):
+    is_partner = FocusSession.partner_id.isnot(None)
+    query = db.session.query(
+        FocusSession.user_id,
+        func.coalesce(func.sum(FocusSession.minutes), 0),
+        func.count(FocusSession.id),
+        func.coalesce(func.sum(case((is_partner, FocusSession.minutes), else_=0)), 0),
+        func.coalesce(func.sum(case((is_partner, 1), else_=0)), 0),
+    ).group_by(FocusSession.user_id)
+    if user_ids is not None:
+        query = query.filter(FocusSession.user_id.in_(user_ids))
+    return {row[0]: dict(zip(STAT_FIELDS, (int(v) for v in row[1:]))) for row in query.all()}
+
+def _stored_focus_stats(user_ids=None):
+    # Column query rather than ORM objects: the flush hook updates rows behind the identity map
+    query = db.session.query(UserFocusStats.user_id, *(getattr(UserFocusStats, f) for f in STAT_FIELDS))
+    if user_ids is not None:
+        query = query.filter(UserFocusStats.user_id.in_(user_ids))
+    return {row[0]: dict(zip(STAT_FIELDS, (v or 0 for v in row[1:]))) for row in query.all()}
+
+def check_focus_stats(user_ids=None):
+    """Compare the materialized totals against FocusSession.
+
+    Returns a list of (user_id, stored, expected) tuples for every user that drifted.
+    """
+    expected = _computed_focus_stats(user_ids)
+    stored = _stored_focus_stats(user_ids)
+    zero = dict.fromkeys(STAT_FIELDS, 0)
+    mismatches = []
+    for user_id in sorted(set(expected) | set(stored)):
+        want = expected.get(user_id, zero)
+        have = stored.get(user_id, zero)
+        if want != have:
+            mismatches.append((user_id, have, want))
+    return mismatches
+
+def reconcile_focus_stats(user_ids=None):
+    """Rebuild drifted UserFocusStats rows from FocusSession. Returns the number of rows fixed."""
+    mismatches = check_focus_stats(user_ids)
+    now = utc_now()
+    for user_id, _, want in mismatches:
+        stats = db.session.get(UserFocusStats, user_id)
+        if not stats:
+            stats = UserFocusStats(user_id=user_id)
+            db.session.add(stats)
+        for field, value in want.items():
+            setattr(stats, field, value)
+        stats.updated_at = now
+    db.session.commit()
+    return len(mismatches)
+
+def get_daily_minutes(user_id, start_day, end_day=None):
+    """Return {'YYYY-MM-DD': minutes} for a user from the daily rollup (at most one row per day)."""
+    query = db.session.query(FocusDaily.day, FocusDaily.minutes).filter(
+        FocusDaily.user_id == user_id,
+        FocusDaily.day >= start_day
+    )
+    if end_day is not None:
+        query = query.filter(FocusDaily.day <= end_day)
+    return {d.strftime('%Y-%m-%d'): m for d, m in query.all()}
+
+def get_minutes_between(user_id, start_day, end_day=None):
+    query = db.session.query(func.sum(FocusDaily.minutes)).filter(
+        FocusDaily.user_id == user_id,
+        FocusDaily.day >= start_day
+    )
+    if end_day is not None:
+        query = query.filter(FocusDaily.day <= end_day)
+    return query.scalar() or 0
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite and a date on Postgres
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def rebuild_focus_daily(user_ids=None):
+    """Recompute FocusDaily rows from FocusSession. Returns the number of rows written."""
+    is_partner = FocusSession.partner_id.isnot(None)
+    day = func.date(FocusSession.date)
+    query = db.session.query(
+        FocusSession.user_id, day,
+        func.coalesce(func.sum(FocusSession.minutes), 0),
+        func.count(FocusSession.id),
+        func.coalesce(func.sum(case((is_partner, FocusSession.minutes), else_=0)), 0),
+    ).group_by(FocusSession.user_id, day)
+    delete = FocusDaily.query
+    if user_ids is not None:
+        query = query.filter(FocusSession.user_id.in_(user_ids))
+        delete = delete.filter(FocusDaily.user_id.in_(user_ids))
+    rows = query.all()
+
+    delete.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(FocusDaily, [
+        {'user_id': user_id, 'day': _as_date(d), 'minutes': int(m), 'sessions': int(n), 'partner_minutes': int(pm)}
+        for user_id, d, m, n, pm in rows if d is not None
+    ])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,77 @@
+"""Friendship lookups over a symmetric adjacency table.
+
+Friendship rows are directional (requester -> recipient) because pending requests
+are. Every accepted friendship is mirrored into FriendLink as two rows, one per
+direction, in the same flush that accepts or removes it. "Are A and B friends",
+"A's friends" and "how many friends does A have" are then primary-key lookups
+on (user_id, friend_id) instead of OR-queries over both columns.
+"""
+from sqlalchemy import event, delete, insert, select, tuple_, func
+from sqlalchemy.orm import Session
+from models import db, Friendship, FriendLink
+
+def friend_ids(user_id):
+    return [fid for fid, in db.session.query(FriendLink.friend_id).filter(FriendLink.user_id == user_id)]
+
+def friend_count(user_id):
+    return db.session.query(func.count()).select_from(FriendLink).filter(FriendLink.user_id == user_id).scalar()
+
+def are_friends(user_id, other_id):
+    return db.session.get(FriendLink, (user_id, other_id)) is not None
+
+def get_friendship(user_id, other_id):
+    """The Friendship row between two users in whichever direction it was requested, or None."""
+    pairs = [(user_id, other_id), (other_id, user_id)]
+    return Friendship.query.filter(tuple_(Friendship.user_id, Friendship.friend_id).in_(pairs)).first()
+
+def friendship_statuses(user_id, other_ids):
+    """Map each other user id to 'accepted', 'sent' or 'received' as seen by user_id (missing means none)."""
+    other_ids = list(other_ids)
+    if not other_ids:
+        return {}
+    pairs = [(user_id, oid) for oid in other_ids] + [(oid, user_id) for oid in other_ids]
+    statuses = {}
+    for f in Friendship.query.filter(tuple_(Friendship.user_id, Friendship.friend_id).in_(pairs)):
+        outgoing = f.user_id == user_id
+        status = f.status
+        if status == 'pending':
+            status = 'sent' if outgoing else 'received'
+        statuses[f.friend_id if outgoing else f.user_id] = status
+    return statuses
+
+def friendship_status(user_id, other_id):
+    return friendship_statuses(user_id, [other_id]).get(other_id, 'none')
+
+def rebuild_friend_links():
+    """Recreate the adjacency table from Friendship; returns the number of links."""
+    table = FriendLink.__table__
+    accepted = Friendship.__table__
+    db.session.execute(delete(table))
+    for src, dst in (('user_id', 'friend_id'), ('friend_id', 'user_id')):
+        db.session.execute(insert(table).from_select(
+            ['user_id', 'friend_id'],
+            select(accepted.c[src], accepted.c[dst]).where(accepted.c.status == 'accepted')))
+    db.session.commit()
+    return db.session.query(FriendLink).count()
+
+def _after_flush(session, flush_context):
+    pairs, links = set(), []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Friendship) or obj.user_id is None or obj.friend_id is None:
+            continue
+        pair = (obj.user_id, obj.friend_id)
+        pairs.update((pair, pair[::-1]))
+        if obj not in session.deleted and obj.status == 'accepted':
+            links += [{'user_id': pair[0], 'friend_id': pair[1]}, {'user_id': pair[1], 'friend_id': pair[0]}]
+    if not pairs:
+        return
+
+    table = FriendLink.__table__
+    connection = session.connection()
+    connection.execute(delete(table).where(tuple_(table.c.user_id, table.c.friend_id).in_(sorted(pairs))))
+    if links:
+        connection.execute(insert(table), links)
+
+def register_friend_listeners():
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
@@ -0,0 +1,137 @@
+"""Genesis model calls off the request thread.
+
+Free-form terminal commands go to a language model. The call itself runs in a
+small thread pool sized by GENESIS_MAX_CONCURRENCY and pushes reply chunks onto a
+queue that the response streams from. A request waits at most GENESIS_TIMEOUT
+seconds for the reply to finish. When every slot is busy, new requests are
+turned away at once instead of queueing, so slow model calls can't pile up
+behind the web workers.
+
+The model client is pluggable through GENESIS_CLIENT: 'gemini' (google-generativeai
+with GOOGLE_API_KEY, the default when a key is set), 'fake' (canned local replies
+for tests and development), or a dotted path to a class with the same stream()
+interface. Without a client Genesis just reports itself operational.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+PERSONA = """You are Genesis, the core of the Modo ecosystem.
+            Your tone is cold and technical. Keep responses extremely concise.
+            If asked for status, reply ONLY with 'I am operational.'
+            Refer to the user as 'Lord Silver' or 'Lost'.
+
+            IMPORTANT: If the user asks for user info, vitals, or logs, include exact trigger phrases:
+            - 'QUERY_SUCCESSFUL. USER_METRICS_FETCHED. OPENING_OVERLAY...'
+            - 'HEALTH_CHECK_COMPLETE. VITALS_STREAM_READY.'
+            - 'CORE_LOG_ACCESS_GRANTED. RETRIEVING_LAST_20_ENTRIES:'
+
+            TASK_CREATION:
+            If the user wants to create a task, extract:
+            - Title
+            - Estimated Pomodoros (integer, default 1)
+            If info missing, ask concisely.
+            If present, respond EXACTLY with: 'TASK_EXTRACTION_COMPLETE. [Title] | [Poms]'
+            """
+
+class Saturated(Exception):
+    """Every model slot is busy."""
+
+class GeminiClient:
+    def __init__(self, app):
+        self.api_key = os.environ.get('GOOGLE_API_KEY')
+        self.model = app.config.get('GENESIS_MODEL', 'gemini-flash-latest')
+
+    def stream(self, prompt, timeout):
+        import google.generativeai as genai
+        # REST rather than gRPC: gRPC's own threads don't yield under gevent workers
+        genai.configure(api_key=self.api_key, transport='rest')
+        model = genai.GenerativeModel(self.model)
+        for chunk in model.generate_content(prompt, stream=True, request_options={'timeout': timeout}):
+            if chunk.text:
+                yield chunk.text
+
+class FakeClient:
+    """Replies with `reply` in small chunks, optionally pausing between them."""
+
+    def __init__(self, app=None, reply="I am operational.", chunk_size=8, delay=0):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def stream(self, prompt, timeout):
+        for start in range(0, len(self.reply), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield self.reply[start:start + self.chunk_size]
+
+CLIENTS = {'gemini': GeminiClient, 'fake': FakeClient}
+
+class Genesis:
+    """Flask extension running model calls on a bounded executor."""
+
+    def __init__(self, app=None):
+        self.client = None
+        self.timeout = None
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GENESIS_CLIENT', 'gemini' if os.environ.get('GOOGLE_API_KEY') else None)
+        app.config.setdefault('GENESIS_MAX_CONCURRENCY', 4)
+        app.config.setdefault('GENESIS_TIMEOUT', 30)
+        name = app.config['GENESIS_CLIENT']
+        if name:
+            cls = CLIENTS.get(name)
+            if cls is None:
+                module_name, _, attr = name.rpartition('.')
+                cls = getattr(import_module(module_name), attr)
+            self.client = cls(app)
+        self.timeout = app.config['GENESIS_TIMEOUT']
+        limit = app.config['GENESIS_MAX_CONCURRENCY']
+        self._executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix='genesis')
+        self._slots = threading.BoundedSemaphore(limit)
+        app.extensions['genesis'] = self
+
+    def stream(self, prompt):
+        """Yield reply chunks. Raises Saturated when no slot is free and TimeoutError past the deadline."""
+        if not self._slots.acquire(blocking=False):
+            raise Saturated()
+        client, timeout = self.client, self.timeout
+        chunks = queue.Queue()
+
+        def call():
+            # The slot stays taken until the model call really returns, even if the reader gave up
+            try:
+                for text in client.stream(prompt, timeout):
+                    chunks.put(('chunk', text))
+                chunks.put(('end', None))
+            except Exception as e:
+                chunks.put(('error', e))
+            finally:
+                self._slots.release()
+
+        try:
+            self._executor.submit(call)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise queue.Empty
+                kind, value = chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError(f"no reply within {timeout}s")
+            if kind == 'end':
+                return
+            if kind == 'error':
+                raise value
+            yield value
@@ -0,0 +1,254 @@
+"""Durable background jobs.
+
+Request handlers enqueue() work instead of doing it inline: the Job row is added
+to the caller's session, so a job exists exactly when the transaction that asked
+for it commits. Workers pop due jobs in run_at order. On Postgres a job is
+claimed with SELECT ... FOR UPDATE SKIP LOCKED, so workers never wait on each
+other. SQLite has no row locks, so a worker first takes a short lease on the
+job_lock row and claims under it.
+
+A job whose handler raises is retried with exponential backoff until
+max_attempts, then left as failed with its last error. While a handler runs, its
+worker renews the job's heartbeat every JOB_HEARTBEAT_SECONDS, so only a job whose
+worker died mid-run goes JOB_LEASE_SECONDS without one and is reclaimed. Every row keeps its attempts,
+timings and last error as per-job metrics (`flask jobs stats`).
+
+Handlers are plain functions registered with @job('name'). They run in their
+own app context and commit their own work.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, or_, and_, func, delete
+from sqlalchemy.exc import IntegrityError
+from models import db, Job, JobLock
+from services.background import BackgroundLoop
+from services.post_commit import after_commit
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+CLAIM_LOCK = 'claim'
+# Jobs a worker runs back to back before sleeping again
+BATCH_SIZE = 20
+MAX_BACKOFF = 3600
+
+def job(name):
+    """Register the decorated function as the handler for jobs called `name`."""
+    def register(fn):
+        JOBS[name] = fn
+        return fn
+    return register
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def enqueue(name, *args, delay=0, max_attempts=None, **kwargs):
+    """Queue name(*args, **kwargs) to run once the current transaction commits; the caller commits."""
+    from flask import current_app
+    if name not in JOBS:
+        raise KeyError(f"Unknown job {name!r}")
+    config = current_app.config
+    row = Job(name=name, payload={'args': list(args), 'kwargs': kwargs},
+              run_at=_now() + timedelta(seconds=delay),
+              max_attempts=max_attempts or config['JOB_MAX_ATTEMPTS'])
+    db.session.add(row)
+    if config['JOB_EAGER']:
+        # Tests: run it right after the commit instead of waiting for a worker
+        after_commit(run_due_jobs)
+    elif config['JOB_WORKER']:
+        after_commit(current_app.extensions['job_worker'].wake)
+    return row
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def _due(now, lease):
+    stale = now - timedelta(seconds=lease)
+    return or_(and_(Job.status == 'queued', Job.run_at <= now),
+               and_(Job.status == 'running', func.coalesce(Job.heartbeat_at, Job.started_at) < stale))
+
+def _acquire_claim_lock(holder, now, lease):
+    table = JobLock.__table__
+    taken = db.session.execute(update(table)
+        .where(table.c.name == CLAIM_LOCK, or_(table.c.holder.is_(None), table.c.expires_at < now))
+        .values(holder=holder, expires_at=now + timedelta(seconds=lease))).rowcount
+    if not taken:
+        if db.session.get(JobLock, CLAIM_LOCK) is not None:
+            db.session.rollback()
+            return False
+        try:
+            db.session.add(JobLock(name=CLAIM_LOCK, holder=holder, expires_at=now + timedelta(seconds=lease)))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+    db.session.commit()
+    return True
+
+def _release_claim_lock(holder):
+    table = JobLock.__table__
+    db.session.execute(update(table).where(table.c.name == CLAIM_LOCK, table.c.holder == holder)
+                       .values(holder=None, expires_at=None))
+
+def claim_next(holder=None, now=None):
+    """Mark the next due job as running for this worker; returns (id, name, payload) or None."""
+    from flask import current_app
+    holder = holder or worker_id()
+    now = now or _now()
+    lease = current_app.config['JOB_LEASE_SECONDS']
+    query = db.session.query(Job).filter(_due(now, lease)).order_by(Job.run_at, Job.id)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        row = query.with_for_update(skip_locked=True).first()
+    else:
+        if not _acquire_claim_lock(holder, now, lease):
+            return None
+        row = query.first()
+        _release_claim_lock(holder)
+    if row is None:
+        db.session.commit()
+        return None
+    claimed = (row.id, row.name, row.payload or {})
+    row.status, row.locked_by, row.started_at, row.heartbeat_at = 'running', holder, now, now
+    db.session.commit()
+    return claimed
+
+def _backoff(attempts, base):
+    return min(base * 2 ** (attempts - 1), MAX_BACKOFF)
+
+def _keep_lease(app, job_id, holder, stop):
+    # Runs beside the handler with its own session, so the handler's transaction is untouched
+    table = Job.__table__
+    while not stop.wait(app.config['JOB_HEARTBEAT_SECONDS']):
+        with app.app_context():
+            try:
+                db.session.execute(update(table)
+                    .where(table.c.id == job_id, table.c.status == 'running', table.c.locked_by == holder)
+                    .values(heartbeat_at=_now()))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Job %s heartbeat failed: %s", job_id, e)
+            finally:
+                db.session.remove()
+
+def run_job(job_id, name, payload, holder=None):
+    """Run one claimed job and record the outcome; returns True if it succeeded."""
+    from flask import current_app
+    handler = JOBS.get(name)
+    started = time.monotonic()
+    error = None
+    stop = threading.Event()
+    threading.Thread(target=_keep_lease, args=(current_app._get_current_object(), job_id, holder or worker_id(), stop),
+                     name=f'job-{job_id}-heartbeat', daemon=True).start()
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for job {name!r}")
+        handler(*payload.get('args', ()), **payload.get('kwargs', {}))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"
+        logger.warning("Job %s (%s) failed: %s", job_id, name, error)
+    finally:
+        stop.set()
+
+    row = db.session.get(Job, job_id)
+    if row is None:
+        return error is None
+    row.attempts += 1
+    row.duration_ms = int((time.monotonic() - started) * 1000)
+    row.finished_at = _now()
+    row.locked_by = None
+    if error is None:
+        row.status, row.last_error = 'done', None
+    elif handler is not None and row.attempts < row.max_attempts:
+        row.status, row.last_error = 'queued', error
+        row.run_at = row.finished_at + timedelta(seconds=_backoff(row.attempts, current_app.config['JOB_RETRY_BASE']))
+    else:
+        row.status, row.last_error = 'failed', error
+    db.session.commit()
+    return error is None
+
+def run_due_jobs(limit=BATCH_SIZE):
+    """Claim and run due jobs until none are left or `limit` ran; returns how many ran."""
+    holder = worker_id()
+    ran = 0
+    while ran < limit:
+        claimed = claim_next(holder)
+        if claimed is None:
+            break
+        run_job(*claimed, holder=holder)
+        ran += 1
+    return ran
+
+def purge_jobs(days):
+    """Delete finished jobs older than `days`; failed ones stay until handled."""
+    cutoff = _now() - timedelta(days=days)
+    table = Job.__table__
+    removed = db.session.execute(delete(table).where(table.c.status == 'done', table.c.finished_at < cutoff)).rowcount
+    db.session.commit()
+    return removed
+
+def job_stats(since=None):
+    """Per job name: counts by status and run time of finished jobs, as dicts."""
+    query = db.session.query(Job.name, Job.status, func.count(), func.avg(Job.duration_ms),
+                             func.max(Job.duration_ms), func.sum(Job.attempts))
+    if since is not None:
+        query = query.filter(Job.created_at >= since)
+    stats = {}
+    for name, status, count, avg_ms, max_ms, attempts in query.group_by(Job.name, Job.status):
+        entry = stats.setdefault(name, {'counts': {}, 'attempts': 0, 'avg_ms': None, 'max_ms': None})
+        entry['counts'][status] = count
+        entry['attempts'] += int(attempts or 0)
+        if status == 'done':
+            entry['avg_ms'], entry['max_ms'] = (round(float(avg_ms)) if avg_ms is not None else None), max_ms
+    return stats
+
+class JobWorker(BackgroundLoop):
+    """Background thread draining the job queue; enqueue() in the same process wakes it early."""
+
+    name = 'job-worker'
+    interval_key = 'JOB_POLL_INTERVAL'
+    enabled_key = 'JOB_WORKER'
+
+    def tick(self):
+        if run_due_jobs() == BATCH_SIZE:
+            return 0  # More may be waiting
+        if time.monotonic() - getattr(self, '_last_purge', 0) > 3600:
+            self._last_purge = time.monotonic()
+            purge_jobs(self.app.config['JOB_RETENTION_DAYS'])
+        return self.interval
+
+@job('maintenance.startup')
+def startup_maintenance():
+    """Deploy-time repairs and rebuilds, run by a worker instead of beside gunicorn."""
+    import repair_migrations
+    from services.achievement_service import reconcile_achievements, seed_achievements
+    from services.reminder_service import rebuild_reminders
+    from services.suggestion_service import rebuild_suggestions
+    repair_migrations.repair()
+    seed_achievements()
+    reconcile_achievements()
+    rebuild_reminders()
+    rebuild_suggestions()
+
+def init_jobs(app):
+    app.config.setdefault('JOB_WORKER', True)
+    app.config.setdefault('JOB_EAGER', False)
+    app.config.setdefault('JOB_POLL_INTERVAL', 5)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_RETRY_BASE', 30)
+    # A running job whose heartbeat is older than this is presumed dead and handed out again
+    app.config.setdefault('JOB_LEASE_SECONDS', 600)
+    app.config.setdefault('JOB_HEARTBEAT_SECONDS', 60)
+    app.config.setdefault('JOB_RETENTION_DAYS', 7)
+    worker = JobWorker(app)
+    app.extensions['job_worker'] = worker
+    if app.config['JOB_WORKER']:
+        app.before_request(worker.ensure_started)
+    return worker
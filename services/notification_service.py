@@ -0,0 +1,68 @@
+"""Transactional notification outbox.
+
+queue_notification() only records the notification on the current session. When
+that session commits, everything queued is written with one bulk INSERT inside
+the same transaction, and realtime pushes go out once the commit has succeeded;
+a rollback discards the queue. Broadcasts are a single INSERT ... SELECT over the
+user table rather than a row-by-row loop.
+"""
+from sqlalchemy import event, insert, select, literal, false
+from sqlalchemy.orm import Session
+from models import db, Notification, User, utc_now
+
+OUTBOX_KEY = 'notification_outbox'
+BROADCASTS_KEY = 'notification_broadcasts'
+PUBLISH_KEY = 'notification_publish'
+
+def queue_notification(user_id, message, type='info', event_id=None, project_id=None, session=None):
+    session = session or db.session()
+    session.info.setdefault(OUTBOX_KEY, []).append({
+        'user_id': user_id, 'message': message, 'type': type,
+        'event_id': event_id, 'project_id': project_id,
+        'created_at': utc_now(), 'is_read': False,
+    })
+
+def queue_broadcast(message, type='warning', session=None):
+    """Notify every user when the current transaction commits."""
+    session = session or db.session()
+    session.info.setdefault(BROADCASTS_KEY, []).append({'message': message, 'type': type})
+
+def _before_commit(session):
+    rows = session.info.pop(OUTBOX_KEY, None)
+    broadcasts = session.info.pop(BROADCASTS_KEY, None)
+    if not rows and not broadcasts:
+        return
+
+    # Rows may point at objects added in this transaction
+    session.flush()
+    publish = session.info.setdefault(PUBLISH_KEY, {'users': set(), 'broadcast': False})
+    if rows:
+        session.execute(insert(Notification.__table__), rows)
+        publish['users'].update(r['user_id'] for r in rows)
+    for b in broadcasts or ():
+        table = Notification.__table__
+        source = select(User.id, literal(b['message']), literal(b['type']), literal(utc_now()), false())
+        session.execute(table.insert().from_select(
+            ['user_id', 'message', 'type', 'created_at', 'is_read'], source))
+        publish['broadcast'] = True
+
+def _after_commit(session):
+    publish = session.info.pop(PUBLISH_KEY, None)
+    if not publish:
+        return
+    from extensions import realtime
+    from services.realtime import BROADCAST_TOPIC
+    if publish['broadcast']:
+        realtime.publish(BROADCAST_TOPIC, 'notification')
+    for user_id in publish['users']:
+        realtime.publish_to_user(user_id, 'notification')
+
+def _after_rollback(session, previous_transaction=None):
+    for key in (OUTBOX_KEY, BROADCASTS_KEY, PUBLISH_KEY):
+        session.info.pop(key, None)
+
+def register_notification_listeners():
+    if not event.contains(Session, 'before_commit', _before_commit):
+        event.listen(Session, 'before_commit', _before_commit)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
@@ -0,0 +1,67 @@
+"""Post-commit hooks.
+
+Follow-up work that must only happen once a transaction has committed, and that
+the caller shouldn't wait for (achievement evaluation and its unlock
+notifications), is queued with after_commit(fn, *args). Hooks queued in a
+transaction that rolls back are dropped with it.
+
+Committed hooks run inside a request once the response has been sent
+(response.call_on_close), and outside requests (CLI commands, background loops)
+when the app context ends. Each runs in a fresh app context, so it gets its own
+session and commits on its own; a failing hook is logged and doesn't affect the
+others. With POST_COMMIT_DEFERRED off (tests) they run as soon as the view returns.
+"""
+from flask import g, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+
+QUEUE_KEY = 'post_commit'
+
+def after_commit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) after the current transaction commits."""
+    session = db.session()
+    if not session.in_transaction():
+        # Make sure the hook is tied to a transaction a rollback will end
+        session.begin()
+    session.info.setdefault(QUEUE_KEY, []).append((fn, args, kwargs))
+
+def _after_commit(session):
+    hooks = session.info.pop(QUEUE_KEY, None)
+    if hooks and has_app_context():
+        g.setdefault('_post_commit', []).extend(hooks)
+
+def _after_rollback(session, previous_transaction=None):
+    session.info.pop(QUEUE_KEY, None)
+
+def run_hooks(app, hooks):
+    for fn, args, kwargs in hooks:
+        with app.app_context():
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Post-commit hook %s failed", getattr(fn, '__name__', fn))
+
+def _after_request(response):
+    hooks = g.pop('_post_commit', None)
+    if hooks:
+        app = current_app._get_current_object()
+        if app.config['POST_COMMIT_DEFERRED']:
+            response.call_on_close(lambda: run_hooks(app, hooks))
+        else:
+            run_hooks(app, hooks)
+    return response
+
+def _teardown_appcontext(exc=None):
+    hooks = g.pop('_post_commit', None)
+    if hooks and exc is None:
+        run_hooks(current_app._get_current_object(), hooks)
+
+def init_post_commit(app):
+    app.config.setdefault('POST_COMMIT_DEFERRED', True)
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_rollback)
+    app.after_request(_after_request)
+    app.teardown_appcontext(_teardown_appcontext)
@@ -0,0 +1,189 @@
+"""Write-behind buffer for timer heartbeats.
+
+Live presence (mode, focus start/end, current task, last_seen) is kept in the shared
+cache so every worker reads the same state. Plain heartbeats only touch that store
+and a per-process dirty buffer which a background loop writes to the database in
+one batch every PRESENCE_FLUSH_INTERVAL seconds, so rows stay fresh after the live
+entries expire even when no further heartbeat arrives. Transitions (mode/task changes, timer restarts)
+are written through by the caller and flush the buffer along with them.
+
+presence_snapshot() is the read side for lists of people (friends, admin, Genesis):
+one joined query for the profile and presence columns, current task title and
+sync status, with the live store overlaid on top.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import update, bindparam, or_, exists
+from extensions import cache
+from models import db, User, StudyRoom, Task
+from services.background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('last_seen', 'current_focus_mode', 'current_focus_start', 'current_focus_end', 'current_task_id')
+ONLINE_SECONDS = 300
+# Comfortably longer than the online window; once gone, readers fall back to the flushed row
+PRESENCE_TTL = 900
+
+_lock = threading.Lock()
+_dirty_users = {}
+_dirty_rooms = {}
+_last_flush = time.monotonic()
+
+def _key(user_id):
+    return f"modo:presence:{user_id}"
+
+def utc_now():
+    # Presence columns hold naive UTC, matching what the database hands back
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def state_from_user(user):
+    return {f: getattr(user, f) for f in FIELDS}
+
+PROFILE_FIELDS = ('id', 'username', 'is_verified', 'profile_pic_url', 'profile_pic_position',
+                  'show_last_seen', 'last_focus_end')
+PresenceSnapshot = namedtuple('PresenceSnapshot', PROFILE_FIELDS + FIELDS + ('task_title', 'is_syncing', 'is_online'))
+
+def _live_states(user_ids):
+    return cache.get_many(*[_key(uid) for uid in user_ids]) if user_ids else []
+
+def get_presence_many(users):
+    """Live presence for each user, keyed by id; falls back to the User row when not in the store."""
+    users = list(users)
+    if not users:
+        return {}
+    live = _live_states([u.id for u in users])
+    return {u.id: state or state_from_user(u) for u, state in zip(users, live)}
+
+def presence_snapshot(user_ids, now=None):
+    """PresenceSnapshot per user id, without loading full User rows."""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    syncing = exists().where(StudyRoom.status == 'active',
+                             or_(StudyRoom.host_id == User.id, StudyRoom.guest_id == User.id))
+    rows = (db.session.query(*[getattr(User, f) for f in PROFILE_FIELDS + FIELDS],
+                             Task.title, syncing.label('is_syncing'))
+            .outerjoin(Task, Task.id == User.current_task_id)
+            .filter(User.id.in_(user_ids))
+            .all())
+
+    now = now or utc_now()
+    by_id = {row.id: row for row in rows}
+    live = dict(zip(user_ids, _live_states(user_ids)))
+    snapshots = {}
+    for uid, row in by_id.items():
+        values = dict(zip(PROFILE_FIELDS + FIELDS, row))
+        values.update(live.get(uid) or {})
+        values['task_title'] = row.title
+        values['is_syncing'] = bool(row.is_syncing)
+        values['is_online'] = is_online(values, now)
+        snapshots[uid] = PresenceSnapshot(**values)
+
+    # Task switches are written through before the store sees them, so these are rare
+    stale = {uid: s.current_task_id for uid, s in snapshots.items()
+             if s.current_task_id != by_id[uid].current_task_id}
+    if stale:
+        titles = dict(db.session.query(Task.id, Task.title).filter(Task.id.in_(set(stale.values()) - {None})))
+        for uid, task_id in stale.items():
+            snapshots[uid] = snapshots[uid]._replace(task_title=titles.get(task_id))
+    return snapshots
+
+def get_presence(user):
+    return get_presence_many([user])[user.id]
+
+def is_online(state, now=None):
+    last_seen = state.get('last_seen')
+    if not last_seen:
+        return False
+    if last_seen.tzinfo is not None:
+        last_seen = last_seen.astimezone(timezone.utc).replace(tzinfo=None)
+    return ((now or utc_now()) - last_seen).total_seconds() < ONLINE_SECONDS
+
+def write_through(user_id, state):
+    """Record a state that the caller has just committed to the User row."""
+    cache.set(_key(user_id), state, timeout=PRESENCE_TTL)
+    with _lock:
+        _dirty_users.pop(user_id, None)
+
+def buffer_heartbeat(user_id, state, room_id=None, room_state=None):
+    cache.set(_key(user_id), state, timeout=PRESENCE_TTL)
+    with _lock:
+        _dirty_users[user_id] = state
+        if room_id and room_state:
+            _dirty_rooms[room_id] = room_state
+
+def flush_if_due():
+    interval = current_app.config.get('PRESENCE_FLUSH_INTERVAL', 30)
+    if time.monotonic() - _last_flush >= interval:
+        flush()
+
+def flush():
+    """Write buffered heartbeats in one executemany per table; returns the number of users written."""
+    global _last_flush
+    with _lock:
+        users, rooms = dict(_dirty_users), dict(_dirty_rooms)
+        _dirty_users.clear()
+        _dirty_rooms.clear()
+        _last_flush = time.monotonic()
+    if not users and not rooms:
+        return 0
+
+    try:
+        if users:
+            table = User.__table__
+            # Never move a row backwards past a newer write from another worker
+            stmt = (update(table)
+                    .where(table.c.id == bindparam('b_id'),
+                           or_(table.c.last_seen.is_(None), table.c.last_seen <= bindparam('b_last_seen')))
+                    .values(last_seen=bindparam('b_last_seen'), current_focus_end=bindparam('b_focus_end')))
+            db.session.execute(stmt, [
+                {'b_id': uid, 'b_last_seen': s['last_seen'], 'b_focus_end': s['current_focus_end']}
+                for uid, s in users.items()
+            ])
+        if rooms:
+            table = StudyRoom.__table__
+            # Countdown only applies while the room is still in the mode it was reported for
+            stmt = (update(table)
+                    .where(table.c.id == bindparam('b_id'), table.c.active_mode == bindparam('b_mode'))
+                    .values(last_activity=bindparam('b_last_activity'), seconds_remaining=bindparam('b_seconds')))
+            db.session.execute(stmt, [
+                {'b_id': rid, 'b_mode': r['active_mode'], 'b_last_activity': r['last_activity'], 'b_seconds': r['seconds_remaining']}
+                for rid, r in rooms.items()
+            ])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Presence flush failed for %d user(s): %s", len(users), e)
+        return 0
+    return len(users)
+
+class PresenceFlusher(BackgroundLoop):
+    """Background thread writing this worker's buffered heartbeats; the buffer is per-process."""
+
+    name = 'presence-flusher'
+    interval_key = 'PRESENCE_FLUSH_INTERVAL'
+    enabled_key = 'PRESENCE_FLUSHER'
+
+    def tick(self):
+        flush()
+        return self.interval
+
+def init_presence(app):
+    app.config.setdefault('PRESENCE_FLUSHER', True)
+    app.config.setdefault('PRESENCE_FLUSH_INTERVAL', 30)
+    flusher = PresenceFlusher(app)
+    app.extensions['presence_flusher'] = flusher
+    if app.config['PRESENCE_FLUSHER']:
+        app.before_request(flusher.ensure_started)
+
+    def _flush_on_exit():
+        with app.app_context():
+            flush()
+    atexit.register(_flush_on_exit)
+    return flusher
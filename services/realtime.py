@@ -0,0 +1,192 @@
+import json
+import queue
+import select
+import threading
+import logging
+from importlib import import_module
+
+logger = logging.getLogger(__name__)
+
+# Every event stream listens here, e.g. for system-wide notifications
+BROADCAST_TOPIC = 'broadcast'
+
+def user_topic(user_id):
+    return f"user:{user_id}"
+
+def room_topic(room_id):
+    return f"room:{room_id}"
+
+class Subscription:
+    def __init__(self, broker, topics, maxsize=100):
+        self.broker = broker
+        self.topics = set(topics)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # A stalled client only loses its own backlog; the next event resyncs it
+            logger.warning("Realtime subscriber queue full for %s, dropping event", self.topics)
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class InProcessBroker:
+    """Fan-out to subscribers living in this process. Enough for a single worker."""
+
+    # Whether events published by other processes reach this broker's subscribers
+    cross_process = False
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, topics):
+        sub = Subscription(self, topics)
+        with self._lock:
+            for topic in sub.topics:
+                self._subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._subscribers.get(topic)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[topic]
+
+    def publish(self, topic, event, data=None):
+        self._dispatch(topic, event, data)
+
+    def _dispatch(self, topic, event, data):
+        with self._lock:
+            subs = list(self._subscribers.get(topic, ()))
+        for sub in subs:
+            sub.put({'topic': topic, 'event': event, 'data': data})
+
+class PostgresBroker(InProcessBroker):
+    """Relays events between workers with LISTEN/NOTIFY; local delivery is the in-process fan-out."""
+
+    cross_process = True
+
+    CHANNEL = 'modo_realtime'
+
+    def __init__(self, app=None):
+        super().__init__(app)
+        self._app = app
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def _engine(self):
+        from models import db
+        with self._app.app_context():
+            return db.engine
+
+    def subscribe(self, topics):
+        self._ensure_listener()
+        return super().subscribe(topics)
+
+    def publish(self, topic, event, data=None):
+        payload = json.dumps({'topic': topic, 'event': event, 'data': data})
+        try:
+            with self._engine().connect() as conn:
+                conn.exec_driver_sql("SELECT pg_notify(%s, %s)", (self.CHANNEL, payload))
+                conn.commit()
+        except Exception as e:
+            logger.error("Realtime NOTIFY failed: %s", e)
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen_forever, name='realtime-listener', daemon=True)
+            self._listener.start()
+
+    def _listen_forever(self):
+        import time
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error("Realtime listener crashed, reconnecting: %s", e)
+                time.sleep(2)
+
+    def _listen(self):
+        raw = self._engine().raw_connection()
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.CHANNEL}")
+        while True:
+            if select.select([conn], [], [], 30) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    msg = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                self._dispatch(msg.get('topic'), msg.get('event'), msg.get('data'))
+
+BACKENDS = {
+    'memory': InProcessBroker,
+    'postgres': PostgresBroker,
+}
+
+class Realtime:
+    """Flask extension holding the pub/sub backend selected by REALTIME_BACKEND.
+
+    REALTIME_BACKEND is 'memory' (default, single worker), 'postgres' (multi-worker
+    via LISTEN/NOTIFY) or a dotted path to a class with the InProcessBroker interface.
+    """
+
+    def __init__(self, app=None):
+        self.broker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REALTIME_BACKEND', 'memory')
+        app.config.setdefault('REALTIME_HEARTBEAT', 15)
+        app.config.setdefault('REALTIME_STREAM_TIMEOUT', 55)
+        backend = app.config['REALTIME_BACKEND']
+        cls = BACKENDS.get(backend)
+        if cls is None:
+            module_name, _, attr = backend.rpartition('.')
+            cls = getattr(import_module(module_name), attr)
+        self.broker = cls(app)
+        app.extensions['realtime'] = self
+
+    @property
+    def cross_process(self):
+        return getattr(self.broker, 'cross_process', False)
+
+    def subscribe(self, topics):
+        return self.broker.subscribe(topics)
+
+    def publish(self, topic, event, data=None):
+        try:
+            self.broker.publish(topic, event, data)
+        except Exception as e:
+            # Push is best-effort; clients fall back to polling
+            logger.error("Realtime publish failed: %s", e)
+
+    def publish_to_user(self, user_id, event, data=None):
+        self.publish(user_topic(user_id), event, data)
+
+    def publish_to_room(self, room_id, event, data=None):
+        self.publish(room_topic(room_id), event, data)
+
+def format_sse(event, data=None):
+    return f"event: {event}\ndata: {json.dumps(data if data is not None else {})}\n\n"
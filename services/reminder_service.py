@@ -0,0 +1,127 @@
+"""Event reminders as a durable priority queue.
+
+Every event with an upcoming occurrence owns one EventReminder row holding the
+fire time of its next reminder (occurrence start minus the owner's lead time).
+The scheduler pops due rows in fire_at order, creates their notifications in a
+single transaction and moves each row on to the event's following occurrence.
+Rows are claimed with a conditional UPDATE on fire_at, so every worker can run
+the loop without notifying twice.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, delete, func
+from models import db, Event, EventReminder, User
+from services.notification_service import queue_notification
+from services.background import BackgroundLoop
+from utils import occurrence_starts
+
+# How far ahead to look for the next occurrence of a recurring event
+LOOKAHEAD_DAYS = 400
+
+def _utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+def _naive(dt):
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _lead_time(user):
+    return timedelta(minutes=(user.event_notify_minutes if user else None) or 30)
+
+def next_occurrence(event, after):
+    """First occurrence start strictly after `after` (aware UTC), or None."""
+    after = _utc(after)
+    end = (after + timedelta(days=LOOKAHEAD_DAYS)).date()
+    for start in occurrence_starts(event, after.date(), end):
+        if start > after:
+            return start
+    return None
+
+def schedule_event(event, now=None):
+    """(Re)compute the event's pending reminder after it is added or edited. The caller commits."""
+    if event.id is None:
+        db.session.flush()
+    now = now or datetime.now(timezone.utc)
+    start = next_occurrence(event, now)
+    reminder = event.reminder
+    if start is None:
+        if reminder is not None:
+            db.session.delete(reminder)
+        return None
+
+    if reminder is None:
+        reminder = EventReminder(event_id=event.id, user_id=event.user_id)
+        db.session.add(reminder)
+    reminder.occurrence_start = _naive(start)
+    reminder.fire_at = _naive(start - _lead_time(db.session.get(User, event.user_id)))
+    return reminder
+
+def rebuild_reminders():
+    """Schedule every event from scratch; returns the number of pending reminders."""
+    now = datetime.now(timezone.utc)
+    count = 0
+    for event in Event.query.all():
+        if schedule_event(event, now) is not None:
+            count += 1
+    db.session.commit()
+    return count
+
+def fire_due_reminders(now=None, limit=500):
+    """Create notifications for due reminders in one transaction; returns (user_id, event) per notification."""
+    now = now or datetime.now(timezone.utc)
+    naive_now = _naive(now)
+    due = (db.session.query(EventReminder.id, EventReminder.fire_at, EventReminder.occurrence_start, Event, User)
+           .join(Event, Event.id == EventReminder.event_id)
+           .join(User, User.id == EventReminder.user_id)
+           .filter(EventReminder.fire_at <= naive_now)
+           .order_by(EventReminder.fire_at)
+           .limit(limit).all())
+    if not due:
+        return []
+
+    table = EventReminder.__table__
+    notifications = []
+    for reminder_id, fire_at, occurrence_start, event, user in due:
+        following = next_occurrence(event, occurrence_start)
+        if following is None:
+            stmt = delete(table).where(table.c.id == reminder_id, table.c.fire_at == fire_at)
+        else:
+            stmt = (update(table)
+                    .where(table.c.id == reminder_id, table.c.fire_at == fire_at)
+                    .values(occurrence_start=_naive(following), fire_at=_naive(following - _lead_time(user))))
+        if db.session.execute(stmt).rowcount != 1:
+            continue  # Another worker got there first
+
+        # Occurrences that already started while nobody was running the loop are skipped
+        if user.notify_event_start and _utc(occurrence_start) > now:
+            notifications.append((user.id, event))
+            queue_notification(user.id, f"EVENT_STARTING: {event.title}", type='info', event_id=event.id)
+
+    # The outbox writes every queued notification with one INSERT in this commit
+    db.session.commit()
+    return notifications
+
+def seconds_until_next(default):
+    next_fire = db.session.query(func.min(EventReminder.fire_at)).scalar()
+    if next_fire is None:
+        return default
+    wait = (_utc(next_fire) - datetime.now(timezone.utc)).total_seconds()
+    return min(max(wait, 0), default)
+
+class ReminderScheduler(BackgroundLoop):
+    """Background thread firing reminders, started with the first request a worker serves."""
+
+    name = 'reminder-scheduler'
+    interval_key = 'REMINDER_POLL_INTERVAL'
+    enabled_key = 'REMINDER_SCHEDULER'
+
+    def tick(self):
+        fire_due_reminders()
+        return seconds_until_next(self.interval)
+
+def init_reminders(app):
+    app.config.setdefault('REMINDER_SCHEDULER', True)
+    app.config.setdefault('REMINDER_POLL_INTERVAL', 30)
+    scheduler = ReminderScheduler(app)
+    app.extensions['reminder_scheduler'] = scheduler
+    if app.config['REMINDER_SCHEDULER']:
+        app.before_request(scheduler.ensure_started)
+    return scheduler
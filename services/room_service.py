@@ -0,0 +1,127 @@
+"""Study room lifecycle.
+
+Rooms nobody has touched for a while are expired by a sweeper instead of by
+whoever happens to poll them: waiting, pending_sync and paused rooms after
+ROOM_IDLE_SECONDS without activity, rooms with a running timer (whose heartbeats
+keep last_activity fresh) after ROOM_ABANDONED_SECONDS. Each pass deletes a
+batch of rooms and their chat with set-based DELETEs, re-checking staleness so
+a heartbeat that lands mid-sweep keeps its room alive.
+
+Room state is versioned: every change clients must react to bumps
+state_version, and GET /study/state?since=<version> parks until the version
+moves on (or the room goes away) instead of being polled on a fixed interval.
+The wait wakes on the room's realtime topic; when the broker can't see other
+workers' events, it also re-reads the row every STUDY_STATE_RECHECK_INTERVAL.
+"""
+import time
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import func, and_, or_, delete, select
+from extensions import realtime
+from models import db, StudyRoom, ChatMessage
+from services.background import BackgroundLoop
+from services.realtime import room_topic
+from services.presence_service import utc_now
+
+ROOM_IDLE_SECONDS = 1800
+ROOM_ABANDONED_SECONDS = 4 * 3600
+SWEEP_BATCH_SIZE = 200
+
+def _last_active():
+    return func.coalesce(StudyRoom.last_activity, StudyRoom.created_at)
+
+def expired_clause(now):
+    idle_cutoff = now - timedelta(seconds=ROOM_IDLE_SECONDS)
+    abandoned_cutoff = now - timedelta(seconds=ROOM_ABANDONED_SECONDS)
+    return or_(
+        and_(StudyRoom.active_start_time.is_(None), _last_active() < idle_cutoff),
+        _last_active() < abandoned_cutoff,
+    )
+
+def is_expired(room, now=None):
+    """Whether the sweeper will remove this room (readers can treat it as finished already)."""
+    now = now or utc_now()
+    last_active = room.last_activity or room.created_at
+    if last_active is None:
+        return False
+    limit = ROOM_IDLE_SECONDS if room.active_start_time is None else ROOM_ABANDONED_SECONDS
+    return (now - last_active).total_seconds() > limit
+
+def bump_state_version(room):
+    """Record a client-visible change; the caller commits, then calls publish_room_state()."""
+    room.state_version = StudyRoom.state_version + 1
+
+def publish_room_state(room, **data):
+    realtime.publish_to_room(room.id, 'room_state', dict(data, version=room.state_version))
+
+def wait_for_change(room_id, since, timeout):
+    """Block until the room's state_version differs from `since`, it expires or is deleted, or
+    `timeout` seconds pass. Returns the freshly loaded room, or None once it is gone."""
+    subscription = realtime.subscribe([room_topic(room_id)])
+    # Changes made in another worker only arrive through a cross-process broker
+    recheck = None if realtime.cross_process else current_app.config['STUDY_STATE_RECHECK_INTERVAL']
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            room = db.session.get(StudyRoom, room_id, populate_existing=True)
+            remaining = deadline - time.monotonic()
+            if room is None or room.state_version != since or is_expired(room) or remaining <= 0:
+                return room
+            # Don't hold a pooled connection while parked
+            db.session.close()
+            subscription.get(timeout=min(remaining, recheck) if recheck else remaining)
+    finally:
+        subscription.close()
+
+def sweep_rooms(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Delete one batch of expired rooms and their chat; returns the ids removed."""
+    now = now or utc_now()
+    stale = expired_clause(now)
+    ids = [rid for rid, in db.session.query(StudyRoom.id).filter(stale).order_by(StudyRoom.id).limit(batch_size)]
+    if not ids:
+        return []
+
+    table = StudyRoom.__table__
+    # Only rooms still stale at delete time go, and their chat goes with them
+    doomed = select(table.c.id).where(table.c.id.in_(ids), stale)
+    db.session.execute(delete(ChatMessage.__table__).where(ChatMessage.__table__.c.room_id.in_(doomed)))
+    db.session.execute(delete(table).where(table.c.id.in_(ids), stale))
+    remaining = {rid for rid, in db.session.query(StudyRoom.id).filter(StudyRoom.id.in_(ids))}
+    db.session.commit()
+
+    removed = [rid for rid in ids if rid not in remaining]
+    for room_id in removed:
+        realtime.publish_to_room(room_id, 'room_state', {'status': 'finished'})
+    return removed
+
+def sweep_all_rooms(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Sweep batch after batch until nothing is expired; returns the number of rooms removed."""
+    total = 0
+    while True:
+        removed = sweep_rooms(now, batch_size)
+        total += len(removed)
+        if len(removed) < batch_size:
+            return total
+
+class RoomSweeper(BackgroundLoop):
+    """Background thread expiring idle study rooms."""
+
+    name = 'room-sweeper'
+    interval_key = 'ROOM_SWEEP_INTERVAL'
+    enabled_key = 'ROOM_SWEEPER'
+
+    def tick(self):
+        sweep_all_rooms()
+        return self.interval
+
+def init_rooms(app):
+    app.config.setdefault('ROOM_SWEEPER', True)
+    app.config.setdefault('ROOM_SWEEP_INTERVAL', 60)
+    # Below gunicorn's worker timeout and typical proxy idle timeouts
+    app.config.setdefault('STUDY_STATE_LONGPOLL_TIMEOUT', 25)
+    app.config.setdefault('STUDY_STATE_RECHECK_INTERVAL', 2)
+    sweeper = RoomSweeper(app)
+    app.extensions['room_sweeper'] = sweeper
+    if app.config['ROOM_SWEEPER']:
+        app.before_request(sweeper.ensure_started)
+    return sweeper
@@ -0,0 +1,216 @@
+"""Full-text search over tasks, and substring search over usernames.
+
+Each task has one search document built from its title, tag names, subtask titles
+and description. On SQLite it lives in an FTS5 table keyed by the task id (with
+prefix indexes for type-ahead); on Postgres in a weighted tsvector column with a
+GIN index. Documents are rebuilt for every task touched in a flush, inside the
+same transaction, so search never lags behind writes. Other dialects fall back
+to ILIKE on the title.
+
+Usernames are matched by substring for the friend type-ahead. SQLite keeps them
+in an FTS5 trigram table (also keyed by user id) whose LIKE is index-backed;
+Postgres uses a pg_trgm GIN index on user.username directly. Queries too short
+for trigrams are prefix matches, served by a range scan on the lower(username)
+B-tree index instead.
+"""
+import re
+from sqlalchemy import event, text, bindparam, literal_column, inspect, select, func, case
+from sqlalchemy.orm import Session
+from models import db, Task, Subtask, Tag, User, task_tags
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+    "title, tags, subtasks, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(username, tokenize='trigram')",
+]
+SQLITE_DROP = ["DROP TABLE IF EXISTS task_search", "DROP TABLE IF EXISTS user_search"]
+
+POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS task_search ("
+    "task_id INTEGER PRIMARY KEY REFERENCES task(id) ON DELETE CASCADE, document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_document ON task_search USING GIN (document)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS ix_user_username_trgm ON "user" USING GIN (username gin_trgm_ops)',
+]
+POSTGRES_DROP = ["DROP TABLE IF EXISTS task_search", "DROP INDEX IF EXISTS ix_user_username_trgm"]
+
+_SUBTASKS = "(SELECT {agg} FROM subtask s WHERE s.task_id = t.id)"
+_TAGS = "(SELECT {agg} FROM tag JOIN task_tags tt ON tt.tag_id = tag.id WHERE tt.task_id = t.id)"
+
+SQLITE_INDEX = (
+    "INSERT INTO task_search (rowid, title, tags, subtasks, description) "
+    "SELECT t.id, t.title, COALESCE(" + _TAGS.format(agg="group_concat(tag.name, ' ')") + ", ''), "
+    "COALESCE(" + _SUBTASKS.format(agg="group_concat(s.title, ' ')") + ", ''), COALESCE(t.description, '') "
+    "FROM task t"
+)
+POSTGRES_INDEX = (
+    "INSERT INTO task_search (task_id, document) "
+    "SELECT t.id, "
+    "setweight(to_tsvector('simple', t.title), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(" + _TAGS.format(agg="string_agg(tag.name, ' ')") + ", '')), 'B') || "
+    "setweight(to_tsvector('simple', COALESCE(" + _SUBTASKS.format(agg="string_agg(s.title, ' ')") + ", '')), 'C') || "
+    "setweight(to_tsvector('simple', COALESCE(t.description, '')), 'D') "
+    "FROM task t"
+)
+DELETE_DOCS = {'sqlite': "DELETE FROM task_search WHERE rowid IN :ids", 'postgresql': "DELETE FROM task_search WHERE task_id IN :ids"}
+INDEX_DOCS = {'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}
+
+# bm25 column weights for title, tags, subtasks, description
+SQLITE_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+SQLITE_USER_DELETE = "DELETE FROM user_search WHERE rowid IN :ids"
+SQLITE_USER_INDEX = 'INSERT INTO user_search (rowid, username) SELECT u.id, u.username FROM "user" u'
+
+# The trigram index only narrows matches of three characters or more
+TRIGRAM_MIN = 3
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+def _dialect(bind):
+    name = bind.dialect.name
+    return name if name in INDEX_DOCS else None
+
+def search_terms(q):
+    return _WORD.findall(q or '')[:10]
+
+def refresh_documents(connection, task_ids):
+    """Rebuild the search documents of the given tasks (deleted tasks just lose theirs)."""
+    dialect = _dialect(connection)
+    if not dialect or not task_ids:
+        return
+    ids = sorted(task_ids)
+    connection.execute(text(DELETE_DOCS[dialect]).bindparams(bindparam('ids', expanding=True)), {'ids': ids})
+    connection.execute(text(INDEX_DOCS[dialect] + " WHERE t.id IN :ids").bindparams(bindparam('ids', expanding=True)), {'ids': ids})
+
+def refresh_usernames(connection, user_ids):
+    """Re-index the usernames of the given users (Postgres indexes the column itself)."""
+    if _dialect(connection) != 'sqlite' or not user_ids:
+        return
+    ids = sorted(user_ids)
+    connection.execute(text(SQLITE_USER_DELETE).bindparams(bindparam('ids', expanding=True)), {'ids': ids})
+    connection.execute(text(SQLITE_USER_INDEX + " WHERE u.id IN :ids").bindparams(bindparam('ids', expanding=True)), {'ids': ids})
+
+def rebuild_search_index():
+    """Recreate every document from scratch; returns the number of tasks indexed."""
+    connection = db.session.connection()
+    dialect = _dialect(connection)
+    if not dialect:
+        return 0
+    connection.execute(text("DELETE FROM task_search"))
+    connection.execute(text(INDEX_DOCS[dialect]))
+    if dialect == 'sqlite':
+        connection.execute(text("DELETE FROM user_search"))
+        connection.execute(text(SQLITE_USER_INDEX))
+    db.session.commit()
+    return db.session.query(Task.id).count()
+
+def apply_search(query, q):
+    """Restrict a Task query to matches for q. Returns (query, rank) where ordering by rank puts best matches first."""
+    terms = search_terms(q)
+    if not terms:
+        return query, None
+    dialect = _dialect(db.session.get_bind())
+
+    if dialect == 'sqlite':
+        # Each term is quoted (no FTS syntax injection) and prefix-matched; terms are ANDed
+        match = ' '.join('"{}"*'.format(t.replace('"', '')) for t in terms)
+        hits = (text(f"SELECT rowid AS task_id, bm25(task_search, {', '.join(map(str, SQLITE_WEIGHTS))}) AS rank "
+                     "FROM task_search WHERE task_search MATCH :match")
+                .bindparams(match=match)
+                .columns(literal_column('task_id'), literal_column('rank'))
+                .subquery('search_hits'))
+        return query.join(hits, hits.c.task_id == Task.id), hits.c.rank.asc()
+
+    if dialect == 'postgresql':
+        tsquery = ' & '.join(f"{t}:*" for t in terms)
+        hits = (text("SELECT task_id, ts_rank(document, to_tsquery('simple', :tsquery)) AS rank "
+                     "FROM task_search WHERE document @@ to_tsquery('simple', :tsquery)")
+                .bindparams(tsquery=tsquery)
+                .columns(literal_column('task_id'), literal_column('rank'))
+                .subquery('search_hits'))
+        return query.join(hits, hits.c.task_id == Task.id), hits.c.rank.desc()
+
+    for term in terms:
+        query = query.filter(Task.title.ilike(f'%{term}%'))
+    return query, None
+
+def search_usernames(q, limit=5):
+    """Users whose name contains q as (id, username, is_verified), exact and prefix matches first."""
+    q = (q or '').strip()
+    if not q:
+        return []
+    query = db.session.query(User.id, User.username, User.is_verified)
+    name = func.lower(User.username)
+    if len(q) < TRIGRAM_MIN:
+        # A range on lower(username) uses ix_user_username_lower; the prefix check confirms
+        # the literal match (wildcards included) on the rows in range
+        low = q.lower()
+        high = low[:-1] + chr(ord(low[-1]) + 1)
+        query = query.filter(name >= low, name < high, User.username.istartswith(q, autoescape=True))
+    elif _dialect(db.session.get_bind()) == 'sqlite':
+        # An ESCAPE clause would stop FTS5 from using the trigram index, so match the raw
+        # pattern there and confirm the literal substring on the few candidates it returns
+        hits = (text("SELECT rowid AS user_id FROM user_search WHERE username LIKE :pattern")
+                .bindparams(pattern=f"%{q.replace('%', '')}%")
+                .columns(literal_column('user_id'))
+                .subquery('user_hits'))
+        query = query.join(hits, hits.c.user_id == User.id).filter(func.instr(name, q.lower()) > 0)
+    else:
+        query = query.filter(User.username.icontains(q, autoescape=True))
+
+    closeness = case((name == q.lower(), 0), (User.username.istartswith(q, autoescape=True), 1), else_=2)
+    return [tuple(row) for row in query.order_by(closeness, func.length(User.username), User.username).limit(limit)]
+
+def _touched_task_ids(session):
+    ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Task) and obj.id is not None:
+            ids.add(obj.id)
+        elif isinstance(obj, Subtask) and obj.task_id is not None:
+            ids.add(obj.task_id)
+        elif isinstance(obj, Tag) and obj in session.dirty and inspect(obj).attrs.name.history.has_changes():
+            # A renamed tag changes the document of every task carrying it
+            rows = session.connection().execute(select(task_tags.c.task_id).where(task_tags.c.tag_id == obj.id))
+            ids.update(task_id for task_id, in rows)
+    return ids
+
+def _touched_user_ids(session):
+    ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            if obj in session.dirty and not inspect(obj).attrs.username.history.has_changes():
+                continue  # Heartbeats and settings saves don't touch the index
+            ids.add(obj.id)
+    return ids
+
+def _after_flush(session, flush_context):
+    ids = _touched_task_ids(session)
+    if ids:
+        refresh_documents(session.connection(), ids)
+    user_ids = _touched_user_ids(session)
+    if user_ids:
+        refresh_usernames(session.connection(), user_ids)
+
+def _create_index(target, connection, **kw):
+    dialect = _dialect(connection)
+    for statement in {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(dialect, []):
+        connection.execute(text(statement))
+
+def _drop_index(target, connection, **kw):
+    dialect = _dialect(connection)
+    for statement in {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(dialect, []):
+        connection.execute(text(statement))
+
+def alembic_include_object(obj, name, type_, reflected, compare_to):
+    # Keep autogenerate from dropping the index (and FTS5's shadow tables), which live outside the models
+    if type_ == 'table':
+        return not name.startswith(('task_search', 'user_search'))
+    return not (type_ == 'index' and name == 'ix_user_username_trgm')
+
+def register_search_listeners():
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+    # db.create_all()/drop_all() (tests, fresh installs) manage the index table too
+    if not event.contains(db.metadata, 'after_create', _create_index):
+        event.listen(db.metadata, 'after_create', _create_index)
+        event.listen(db.metadata, 'before_drop', _drop_index)
@@ -0,0 +1,194 @@
+"""Focus session ingest.
+
+Sessions arrive one at a time from /api/log_session or in batches from
+/api/sessions and the offline outbox. Every session carries a client-generated
+UUID (log_session makes one up for older clients). A unique index on
+focus_session.client_id makes ingest idempotent: sessions already stored are
+answered as duplicates, so a retried or replayed request never counts twice.
+
+A batch is one transaction and one commit: the new rows (inserted in a single
+flush), task progress (one UPDATE across every task touched), the user's focus
+state, the completion notification, and a job that advances achievement
+counters once with the batch totals, off the request's critical path.
+"""
+import uuid
+from collections import namedtuple, Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, case, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, FocusSession, StudyRoom, Task, ProjectSection, ProjectMember
+from utils import create_notification
+from services import presence_service as presence
+from services.job_service import enqueue
+from services.cache_service import invalidate_user
+
+BATCH_LIMIT = 100
+# Replayed sessions claiming to be older than this are dated MAX_BACKDATE ago
+MAX_BACKDATE = timedelta(days=7)
+CLIENT_ID_MAX = 36
+
+SessionResult = namedtuple('SessionResult', 'status minutes')
+
+def new_client_id():
+    return str(uuid.uuid4())
+
+def _ended_at(value, now):
+    # Sessions queued offline keep the time they ended on the client
+    try:
+        ended = datetime.fromtimestamp(float(value) / 1000, timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return now
+    return min(max(ended, now - MAX_BACKDATE), now)
+
+def _as_id(value):
+    # Timer state comes back from localStorage, so ids may arrive as strings (or 'null')
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse(item, now):
+    client_id = item.get('client_id') if isinstance(item, dict) else None
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= CLIENT_ID_MAX:
+        return None
+    try:
+        minutes = int(item.get('minutes'))
+    except (TypeError, ValueError):
+        minutes = 0
+    return {
+        'client_id': client_id,
+        'minutes': minutes,
+        'task_id': _as_id(item.get('task_id')),
+        'room_id': _as_id(item.get('room_id')),
+        'date': _ended_at(item.get('ended_at'), now),
+    }
+
+def _clamp_to_elapsed(user, minutes, now):
+    # The server knows when the running focus started; claims beyond that are cut down
+    if not user.current_focus_start:
+        return minutes
+    elapsed_min = int((now - user.current_focus_start.replace(tzinfo=timezone.utc)).total_seconds() / 60)
+    # Buffer of 1 minute to account for network/logic lag
+    return elapsed_min if minutes > elapsed_min + 1 else minutes
+
+def _partners(user_id, room_ids):
+    if not room_ids:
+        return {}
+    rooms = db.session.query(StudyRoom.id, StudyRoom.host_id, StudyRoom.guest_id).filter(StudyRoom.id.in_(room_ids))
+    partners = {}
+    for room_id, host_id, guest_id in rooms:
+        if host_id == user_id:
+            partners[room_id] = guest_id
+        elif guest_id == user_id:
+            partners[room_id] = host_id
+    return partners
+
+def _accessible_task_ids(user_id, task_ids):
+    if not task_ids:
+        return set()
+    member_sections = (db.session.query(ProjectSection.id)
+                       .join(ProjectMember, ProjectMember.project_id == ProjectSection.project_id)
+                       .filter(ProjectMember.user_id == user_id))
+    rows = db.session.query(Task.id).filter(
+        Task.id.in_(task_ids), or_(Task.user_id == user_id, Task.section_id.in_(member_sections)))
+    return {task_id for task_id, in rows}
+
+def _advance_tasks(pomodoros):
+    """Add each task's share of the batch in one UPDATE, finishing tasks that reach their estimate."""
+    table = Task.__table__
+    increment = case(pomodoros, value=table.c.id, else_=0)
+    done = table.c.completed_pomodoros + increment >= table.c.estimated_pomodoros
+    db.session.execute(update(table).where(table.c.id.in_(list(pomodoros))).values(
+        completed_pomodoros=table.c.completed_pomodoros + increment,
+        status=case((done, 'done'), else_=table.c.status),
+    ))
+
+def _ingest(user, items, now):
+    results, sessions = {}, []
+    for item in items:
+        parsed = _parse(item, now)
+        # Unusable items and repeats within the batch are dropped
+        if parsed is None or parsed['client_id'] in results:
+            continue
+        results[parsed['client_id']] = None
+        sessions.append(parsed)
+
+    stored = {}
+    if sessions:
+        rows = (db.session.query(FocusSession.client_id, FocusSession.user_id, FocusSession.minutes)
+                .filter(FocusSession.client_id.in_([s['client_id'] for s in sessions])))
+        stored = {client_id: (user_id, minutes) for client_id, user_id, minutes in rows}
+    fresh = []
+    for s in sessions:
+        if s['client_id'] in stored:
+            owner, minutes = stored[s['client_id']]
+            results[s['client_id']] = SessionResult('duplicate', minutes) if owner == user.id else SessionResult('rejected', 0)
+        else:
+            fresh.append(s)
+
+    # Only the newest session can be the focus the server saw start
+    if fresh:
+        fresh[-1]['minutes'] = _clamp_to_elapsed(user, fresh[-1]['minutes'], now)
+    for s in fresh:
+        if s['minutes'] <= 0:
+            results[s['client_id']] = SessionResult('rejected', 0)
+    fresh = [s for s in fresh if s['minutes'] > 0]
+    if not fresh:
+        return results, []
+
+    partners = _partners(user.id, {s['room_id'] for s in fresh if s['room_id']})
+    db.session.add_all([FocusSession(user_id=user.id, minutes=s['minutes'], task_id=s['task_id'], client_id=s['client_id'],
+                                     date=s['date'], partner_id=partners.get(s['room_id']))
+                        for s in fresh])
+    # Plain tuples: the committed rows are expired and would reload one by one
+    logged = [(s['client_id'], s['minutes'], partners.get(s['room_id'])) for s in fresh]
+
+    pomodoros = Counter(s['task_id'] for s in fresh if s['task_id'])
+    accessible = _accessible_task_ids(user.id, list(pomodoros))
+    pomodoros = {task_id: n for task_id, n in pomodoros.items() if task_id in accessible}
+    if pomodoros:
+        _advance_tasks(pomodoros)
+
+    if user.notify_pomodoro:
+        total = sum(minutes for _, minutes, _ in logged)
+        if len(logged) == 1:
+            create_notification(user.id, f"Focus session of {total} mins completed!", type='success')
+        else:
+            create_notification(user.id, f"{len(logged)} focus sessions ({total} mins) synced!", type='success')
+
+    user.last_focus_end = now
+    user.current_focus_start = None
+    user.current_focus_end = None
+    enqueue('achievements.record_progress', user.id, {
+        'focus_hours': sum(minutes for _, minutes, _ in logged),
+        'pomodoro_count': sum(minutes // 25 for _, minutes, _ in logged),
+        'partner_session_count': sum(1 for _, _, partner_id in logged if partner_id),
+    })
+    db.session.commit()
+    for client_id, minutes, _ in logged:
+        results[client_id] = SessionResult('success', minutes)
+    return results, logged
+
+def ingest_sessions(user, items, now=None):
+    """Store a batch of sessions for `user` in one transaction.
+
+    Each item has client_id, minutes and optionally task_id, room_id and ended_at
+    (epoch ms). Returns {client_id: SessionResult} with status 'success',
+    'duplicate' or 'rejected'; items without a usable client_id are left out.
+    """
+    now = now or datetime.now(timezone.utc)
+    try:
+        results, logged = _ingest(user, items, now)
+    except IntegrityError:
+        # A concurrent request stored some of these first; a second pass reports them as duplicates
+        db.session.rollback()
+        results, logged = _ingest(user, items, now)
+    if not logged:
+        return results
+
+    presence.write_through(user.id, presence.state_from_user(user))
+    partners = {partner_id for _, _, partner_id in logged if partner_id}
+    invalidate_user(user.id, *partners, leaderboards=('focus', 'sync'))
+    return results
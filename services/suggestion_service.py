@@ -0,0 +1,143 @@
+"""Friend suggestions ("people you may know").
+
+Candidates are scored in set-based queries over a batch of users at a time:
+mutual friends (via the symmetric friend_link table), shared projects and past
+sync sessions, with a small boost for anyone active in the last week. The top
+few per user are stored in FriendSuggestion by a periodic job
+(`flask suggestions rebuild`), so the friends page only reads a handful of rows.
+Users with no social signal at all get a random sample drawn by primary-key
+range rather than ORDER BY random() over the whole user table.
+"""
+import random
+from datetime import timedelta
+from sqlalchemy import func, delete, insert
+from sqlalchemy.orm import aliased
+from models import db, User, FriendLink, Friendship, FriendSuggestion, ProjectMember, FocusSession, FocusDaily, utc_now
+from services.friend_service import friendship_statuses
+
+WEIGHTS = {'mutual_friends': 3.0, 'shared_projects': 2.0, 'shared_sessions': 2.0}
+ACTIVITY_WEIGHT = 1.0
+ACTIVE_DAYS = 7
+# Stored per user; the page shows the best few that are still unrelated
+SUGGESTION_LIMIT = 10
+BATCH_SIZE = 500
+
+def _signal_counts(user_ids):
+    """Yield (user_id, candidate_id, signal, count) for every user in the batch."""
+    a, b = aliased(FriendLink), aliased(FriendLink)
+    mutual = (db.session.query(a.user_id, b.friend_id, func.count())
+              .join(b, b.user_id == a.friend_id)
+              .filter(a.user_id.in_(user_ids), b.friend_id != a.user_id)
+              .group_by(a.user_id, b.friend_id))
+    m1, m2 = aliased(ProjectMember), aliased(ProjectMember)
+    projects = (db.session.query(m1.user_id, m2.user_id, func.count(func.distinct(m1.project_id)))
+                .join(m2, m2.project_id == m1.project_id)
+                .filter(m1.user_id.in_(user_ids), m2.user_id != m1.user_id)
+                .group_by(m1.user_id, m2.user_id))
+    sessions = (db.session.query(FocusSession.user_id, FocusSession.partner_id, func.count())
+                .filter(FocusSession.user_id.in_(user_ids), FocusSession.partner_id.isnot(None),
+                        FocusSession.partner_id != FocusSession.user_id)
+                .group_by(FocusSession.user_id, FocusSession.partner_id))
+    for signal, query in (('mutual_friends', mutual), ('shared_projects', projects), ('shared_sessions', sessions)):
+        for user_id, candidate_id, count in query:
+            yield user_id, candidate_id, signal, count
+
+def _related_pairs(user_ids):
+    # Anyone already a friend or with a request pending either way is not a suggestion
+    pairs = set()
+    rows = Friendship.query.with_entities(Friendship.user_id, Friendship.friend_id)
+    for user_id, friend_id in rows.filter(Friendship.user_id.in_(user_ids)).union(rows.filter(Friendship.friend_id.in_(user_ids))):
+        pairs.update(((user_id, friend_id), (friend_id, user_id)))
+    return pairs
+
+def _random_candidates(exclude, count):
+    """Up to `count` random users, each found by a primary-key range probe."""
+    low, high = db.session.query(func.min(User.id), func.max(User.id)).one()
+    if low is None:
+        return []
+    picked = []
+    for _ in range(count * 4):
+        if len(picked) == count:
+            break
+        candidate = (db.session.query(User.id)
+                     .filter(User.id >= random.randint(low, high), User.is_banned.isnot(True))
+                     .order_by(User.id).limit(1).scalar())
+        if candidate is not None and candidate not in exclude and candidate not in picked:
+            picked.append(candidate)
+    return picked
+
+def compute_suggestions(user_ids, limit=SUGGESTION_LIMIT, fallback=3):
+    """Ranked [(candidate_id, score)] per user id; isolated users get `fallback` random picks."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    scores = {}
+    for user_id, candidate_id, signal, count in _signal_counts(user_ids):
+        key = (user_id, candidate_id)
+        scores[key] = scores.get(key, 0.0) + WEIGHTS[signal] * count
+    related = _related_pairs(user_ids)
+    scores = {key: score for key, score in scores.items() if key not in related}
+
+    candidates = {candidate_id for _, candidate_id in scores}
+    if candidates:
+        banned = {uid for uid, in db.session.query(User.id).filter(User.id.in_(candidates), User.is_banned.is_(True))}
+        cutoff = (utc_now() - timedelta(days=ACTIVE_DAYS)).date()
+        active = {uid for uid, in db.session.query(FocusDaily.user_id).distinct()
+                  .filter(FocusDaily.user_id.in_(candidates), FocusDaily.day >= cutoff)}
+        scores = {key: score + (ACTIVITY_WEIGHT if key[1] in active else 0.0)
+                  for key, score in scores.items() if key[1] not in banned}
+
+    ranked = {user_id: [] for user_id in user_ids}
+    for (user_id, candidate_id), score in sorted(scores.items(), key=lambda item: (-item[1], item[0][1])):
+        if len(ranked[user_id]) < limit:
+            ranked[user_id].append((candidate_id, score))
+    for user_id, rows in ranked.items():
+        if not rows and fallback:
+            exclude = {user_id} | {other for mine, other in related if mine == user_id}
+            rows.extend((candidate_id, 0.0) for candidate_id in _random_candidates(exclude, fallback))
+    return ranked
+
+def refresh_suggestions(user_ids):
+    """Replace the stored suggestions of the given users; the caller commits. Returns rows written."""
+    ranked = compute_suggestions(user_ids)
+    if not ranked:
+        return 0
+    now = utc_now()
+    table = FriendSuggestion.__table__
+    db.session.execute(delete(table).where(table.c.user_id.in_(list(ranked))))
+    rows = [{'user_id': user_id, 'suggested_id': candidate_id, 'score': score, 'computed_at': now}
+            for user_id, candidates in ranked.items() for candidate_id, score in candidates]
+    if rows:
+        db.session.execute(insert(table), rows)
+    return len(rows)
+
+def rebuild_suggestions(batch_size=BATCH_SIZE):
+    """Recompute suggestions for every user, one committed batch at a time; returns rows written."""
+    written, last_id = 0, 0
+    while True:
+        ids = [uid for uid, in db.session.query(User.id).filter(User.id > last_id)
+               .order_by(User.id).limit(batch_size)]
+        if not ids:
+            return written
+        written += refresh_suggestions(ids)
+        db.session.commit()
+        last_id = ids[-1]
+
+def get_suggestions(user_id, limit=3):
+    """The best stored suggestions still unrelated to user_id, as User rows (computed live until the job has run)."""
+    stored = (db.session.query(FriendSuggestion.suggested_id)
+              .filter(FriendSuggestion.user_id == user_id)
+              .order_by(FriendSuggestion.score.desc(), FriendSuggestion.suggested_id)
+              .all())
+    if stored:
+        ids = [sid for sid, in stored]
+    else:
+        ids = [cid for cid, _ in compute_suggestions([user_id]).get(user_id, [])]
+    if not ids:
+        return []
+
+    # Requests sent since the last run drop out immediately
+    related = friendship_statuses(user_id, ids)
+    ids = [sid for sid in ids if sid not in related][:limit]
+    users = {u.id: u for u in User.query.filter(User.id.in_(ids), User.is_banned.isnot(True))}
+    return [users[sid] for sid in ids if sid in users]
@@ -0,0 +1,44 @@
+"""Task queries shared by every view that renders task rows.
+
+partials/task_item.html touches task.tags and task.subtasks for each row, and
+check_task_access walks task.section -> project. Loading those lazily costs a
+query or two per task; the options here batch each relationship into a single
+SELECT ... IN for the whole list, so a rendered list is a fixed number of queries.
+"""
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+from models import db, Task, ProjectSection, Project, ProjectMember, ProjectActivity
+
+def task_list_options():
+    return (
+        selectinload(Task.tags),
+        selectinload(Task.subtasks),
+        selectinload(Task.section).selectinload(ProjectSection.project),
+    )
+
+def task_list_query():
+    """Task.query with everything a task row renders preloaded; filter/order it like any query."""
+    return Task.query.options(*task_list_options())
+
+def get_task(task_id):
+    return db.session.get(Task, task_id, options=task_list_options())
+
+def accessible_tasks_query(user_id):
+    """Open (todo) tasks a user can work on: their personal tasks plus tasks in their projects' sections."""
+    member_sections = (db.session.query(ProjectSection.id)
+                       .join(ProjectMember, ProjectMember.project_id == ProjectSection.project_id)
+                       .filter(ProjectMember.user_id == user_id))
+    return task_list_query().filter(
+        Task.status == 'todo',
+        or_((Task.user_id == user_id) & Task.section_id.is_(None), Task.section_id.in_(member_sections))
+    ).order_by(Task.priority.desc(), Task.created_at.desc())
+
+def get_project_board(project_id):
+    """A project with sections, their tasks (with task-row relationships), members and activity preloaded."""
+    section_tasks = selectinload(Project.sections).selectinload(ProjectSection.tasks)
+    return db.session.get(Project, project_id, options=(
+        section_tasks.selectinload(Task.tags),
+        section_tasks.selectinload(Task.subtasks),
+        selectinload(Project.members).selectinload(ProjectMember.user),
+        selectinload(Project.activities).selectinload(ProjectActivity.user),
+    ))
@@ -0,0 +1,43 @@
+// Server-Sent Events client: one stream per tab, re-dispatched as window events
+// ('modo-notification', 'modo-chat', 'modo-room-state'). Pollers check
+// window.modoEvents.connected and only fall back to polling while it is false.
+// Every reconnect dispatches all three events with { resync: true } so listeners
+// refetch whatever was published while the stream was down.
+(function () {
+    const config = window.modoRealtime || {};
+    const state = { connected: false, source: null };
+    window.modoEvents = state;
+
+    if (!('EventSource' in window)) return;
+
+    const EVENTS = ['notification', 'chat', 'room_state'];
+
+    let url = '/api/events';
+    if (config.roomId) url += '?room=' + config.roomId;
+
+    const source = new EventSource(url);
+    state.source = source;
+
+    // The server caps each stream; EventSource reconnects by itself using the retry hint
+    let opened = false;
+    source.onopen = () => {
+        state.connected = true;
+        if (opened) {
+            EVENTS.forEach(name => {
+                window.dispatchEvent(new CustomEvent('modo-' + name.replace('_', '-'), { detail: { resync: true } }));
+            });
+        }
+        opened = true;
+    };
+    source.onerror = () => { state.connected = false; };
+
+    EVENTS.forEach(name => {
+        source.addEventListener(name, (e) => {
+            let detail = {};
+            try { detail = JSON.parse(e.data); } catch (err) {}
+            window.dispatchEvent(new CustomEvent('modo-' + name.replace('_', '-'), { detail }));
+        });
+    });
+
+    window.addEventListener('beforeunload', () => source.close());
+})();
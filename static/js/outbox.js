@@ -0,0 +1,104 @@
+// Offline outbox: log_session/sync_presence calls that cannot reach the server are kept in
+// IndexedDB and replayed in one POST /api/outbox when the connection comes back.
+// Sessions carry a client_id so a replay (or a retry that did get through) is logged once;
+// queued heartbeats collapse into the latest one.
+(function () {
+    const DB_NAME = 'modo';
+    const STORE = 'outbox';
+    const state = { flushing: null };
+
+    function csrfToken() {
+        const el = document.querySelector('meta[name="csrf-token"]');
+        return el ? el.content : '';
+    }
+
+    function uuid() {
+        if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+        return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, c => {
+            const r = Math.random() * 16 | 0;
+            return (c === 'x' ? r : (r & 0x3 | 0x8)).toString(16);
+        });
+    }
+
+    let dbPromise = null;
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const req = indexedDB.open(DB_NAME, 1);
+                req.onupgradeneeded = () => req.result.createObjectStore(STORE, { keyPath: 'id' });
+                req.onsuccess = () => resolve(req.result);
+                req.onerror = () => reject(req.error);
+            });
+        }
+        return dbPromise;
+    }
+
+    function tx(mode, fn) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const t = db.transaction(STORE, mode);
+            const result = fn(t.objectStore(STORE));
+            t.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+            t.onerror = () => reject(t.error);
+        }));
+    }
+
+    const all = () => tx('readonly', store => store.getAll());
+    const put = (entry) => tx('readwrite', store => store.put(entry));
+    const remove = (ids) => tx('readwrite', store => ids.forEach(id => store.delete(id)));
+
+    function post(kind, body) {
+        return fetch('/api/' + kind, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify(body)
+        });
+    }
+
+    function enqueue(kind, body) {
+        // One pending heartbeat is enough: only the latest presence matters
+        const id = kind === 'sync_presence' ? kind : body.client_id;
+        return put({ id, kind, body, queued_at: Date.now() }).then(() => null);
+    }
+
+    function replayBody(entry) {
+        const body = Object.assign({}, entry.body);
+        if (entry.kind === 'sync_presence' && typeof body.seconds_left === 'number') {
+            // The countdown kept running while the heartbeat sat in the queue
+            const waited = Math.floor((Date.now() - entry.queued_at) / 1000);
+            body.seconds_left = Math.max(0, body.seconds_left - waited);
+        }
+        return body;
+    }
+
+    function flush() {
+        if (!('indexedDB' in window) || !navigator.onLine) return Promise.resolve();
+        if (state.flushing) return state.flushing;
+        state.flushing = all().then(entries => {
+            if (!entries || !entries.length) return;
+            entries.sort((a, b) => a.queued_at - b.queued_at);
+            const items = entries.map(e => ({ id: e.id, kind: e.kind, body: replayBody(e) }));
+            return post('outbox', { items }).then(r => r.ok ? r.json() : null).then(data => {
+                // Everything the server answered for is settled; the rest waits for the next flush
+                if (data && data.results) return remove(Object.keys(data.results));
+            });
+        }).catch(() => {}).then(() => { state.flushing = null; });
+        return state.flushing;
+    }
+
+    // POST to /api/<kind>; resolves with the JSON reply, or null if the call was queued instead
+    function send(kind, body) {
+        if (kind === 'log_session') body = Object.assign({ client_id: uuid(), ended_at: Date.now() }, body);
+        if (!('indexedDB' in window)) return post(kind, body).then(r => r.json());
+        if (!navigator.onLine) return enqueue(kind, body);
+        return all().then(entries => {
+            // Keep order behind anything still queued
+            if (entries && entries.length) return enqueue(kind, body).then(flush).then(() => null);
+            return post(kind, body).then(r => r.json(), () => enqueue(kind, body));
+        }, () => post(kind, body).then(r => r.json()));
+    }
+
+    window.modoOutbox = { send, flush };
+    window.addEventListener('online', flush);
+    if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', flush);
+    else flush();
+})();
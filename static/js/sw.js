@@ -1,9 +1,74 @@
+// Registered as /sw.js?v=<asset version>; a new build means a new worker and a new cache
+const VERSION = new URL(self.location).searchParams.get('v') || 'dev';
+const ASSET_CACHE = 'modo-assets-' + VERSION;
+// Pages are per-user and carry a CSRF token, so they are never cached; this one holds no user data
+const OFFLINE_PAGE = '/static/offline.html';
+
 self.addEventListener('install', (event) => {
-    self.skipWaiting();
+    // Precache every fingerprinted asset of this build (nothing to do without one)
+    event.waitUntil(
+        fetch('/static/dist/manifest.json', { cache: 'no-store' })
+            .then(r => r.ok ? r.json() : {})
+            .then(manifest => caches.open(ASSET_CACHE).then(cache =>
+                cache.addAll(Object.values(manifest).map(name => '/static/' + name))))
+            .catch(() => {})
+            .then(() => caches.open(ASSET_CACHE).then(cache => cache.add(OFFLINE_PAGE)))
+            .catch(() => {})
+            .then(() => self.skipWaiting())
+    );
 });
 
 self.addEventListener('activate', (event) => {
-    event.waitUntil(clients.claim());
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                // 'modo-pages' held per-user pages from older builds
+                .filter(key => (key.startsWith('modo-assets-') && key !== ASSET_CACHE) || key === 'modo-pages')
+                .map(key => caches.delete(key))))
+            .then(() => clients.claim())
+    );
+});
+
+function cacheFirst(request) {
+    return caches.open(ASSET_CACHE).then(cache => cache.match(request).then(hit => hit || fetch(request).then(response => {
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+    })));
+}
+
+function staleWhileRevalidate(request) {
+    return caches.open(ASSET_CACHE).then(cache => cache.match(request).then(hit => {
+        const refresh = fetch(request).then(response => {
+            if (response.ok) cache.put(request, response.clone());
+            return response;
+        });
+        if (hit) {
+            refresh.catch(() => {});
+            return hit;
+        }
+        return refresh;
+    }));
+}
+
+function networkOrOfflinePage(request) {
+    return fetch(request).catch(() => caches.open(ASSET_CACHE)
+        .then(cache => cache.match(OFFLINE_PAGE))
+        .then(hit => hit || Response.error()));
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.mode === 'navigate') {
+        event.respondWith(networkOrOfflinePage(request));
+    } else if (url.pathname.startsWith('/static/dist/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (url.pathname.startsWith('/static/')) {
+        event.respondWith(staleWhileRevalidate(request));
+    }
 });
 
 self.addEventListener('notificationclick', (event) => {
@@ -181,18 +181,51 @@ document.addEventListener('DOMContentLoaded', () => {
         const now = Date.now();
         if (!lastSync || now - lastSync > 5000) syncPresence();
         if (settings.syncMode && settings.activeRoomId) {
-             if (!lastRoomSync || now - lastRoomSync > 2000) syncWithRoom(settings.activeRoomId);
+             // Room changes are pushed over SSE; long-poll only while the stream is down
+             const pushed = window.modoEvents && window.modoEvents.connected;
+             if (!lastRoomSync) syncWithRoom(settings.activeRoomId);
+             else if (!pushed) watchRoom(settings.activeRoomId);
         }
     }
+
+    window.addEventListener('modo-room-state', (e) => {
+        if (!(isMaster && settings.syncMode && settings.activeRoomId)) return;
+        if (e.detail && e.detail.version !== undefined && e.detail.version === roomVersion) return;
+        syncWithRoom(settings.activeRoomId);
+    });
     
     let lastSync = 0;
     let lastRoomSync = 0;
+    let roomVersion = null;
+    let roomWatching = false;
+
+    // One outstanding ?since= request at a time; the server answers when the room's version moves
+    function watchRoom(roomId) {
+        if (roomWatching) return;
+        roomWatching = true;
+        const next = () => {
+            const pushed = window.modoEvents && window.modoEvents.connected;
+            if (!settings.syncMode || !isMaster || pushed) {
+                roomWatching = false;
+                return;
+            }
+            syncWithRoom(roomId, roomVersion).then(next, () => setTimeout(next, 5000));
+        };
+        next();
+    }
     
-    function syncWithRoom(roomId) {
-        fetch("/api/study/state/" + roomId)
+    function syncWithRoom(roomId, since = null) {
+        const url = "/study/state/" + roomId + (since !== null ? "?since=" + since : "");
+        return fetch(url)
             .then(r => r.json())
             .then(data => {
                 lastRoomSync = Date.now();
+                if (data.status === 'finished') {
+                    settings.syncMode = false;
+                    return;
+                }
+                roomVersion = data.version;
+                if (data.server_time) clockOffset = Date.now() - data.server_time;
                 if (data.mode !== currentMode) {
                     currentMode = data.mode;
                     localStorage.setItem('timerMode', currentMode);
@@ -207,10 +240,12 @@ document.addEventListener('DOMContentLoaded', () => {
                         localStorage.setItem('timerStatus', 'running');
                         startInterval(); 
                     }
-                    if (Math.abs(secondsLeft - data.seconds_remaining) > 2) {
-                        secondsLeft = data.seconds_remaining;
-                        const nowAdjusted = Date.now() - clockOffset;
-                        localStorage.setItem('timerEnd', nowAdjusted + (secondsLeft * 1000));
+                    // Count down locally against the server's end instant
+                    const nowAdjusted = Date.now() - clockOffset;
+                    const remaining = Math.max(0, Math.round((data.ends_at - nowAdjusted) / 1000));
+                    if (Math.abs(secondsLeft - remaining) > 2) {
+                        secondsLeft = remaining;
+                        localStorage.setItem('timerEnd', data.ends_at);
                     }
                 } else {
                     if (isRunning) pauseTimer(false);
@@ -226,20 +261,14 @@ document.addEventListener('DOMContentLoaded', () => {
     
     function syncPresence(isStart = false) {
         const status = isRunning ? 'running' : 'paused'; 
-        const csrfEl = document.querySelector('meta[name="csrf-token"]');
-        const csrfToken = csrfEl ? csrfEl.content : '';
-        fetch('/api/sync_presence', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken},
-            body: JSON.stringify({
-                status: status,
-                mode: currentMode,
-                seconds_left: secondsLeft,
-                task_id: currentTaskId,
-                is_start: isStart
-            })
-        }).then(res => res.json()).then(data => {
-            if (data.server_time) {
+        window.modoOutbox.send('sync_presence', {
+            status: status,
+            mode: currentMode,
+            seconds_left: secondsLeft,
+            task_id: currentTaskId,
+            is_start: isStart
+        }).then(data => {
+            if (data && data.server_time) {
                 // Calibrate clock offset
                 clockOffset = Date.now() - data.server_time;
             }
@@ -515,14 +544,13 @@ document.addEventListener('DOMContentLoaded', () => {
         bData.endSessionModal.open = false;
         if (confirm) {
              pauseTimer(); 
-             const csrfEl = document.querySelector('meta[name="csrf-token"]');
-             fetch('/api/log_session', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfEl ? csrfEl.content : ''},
-                body: JSON.stringify({ minutes: parseInt(minutesLogged), task_id: taskId, room_id: settings.activeRoomId })
-            }).then(r => r.json()).then(data => {
-                const actual = data.logged_minutes !== undefined ? data.logged_minutes : minutesLogged;
-                window.modoNotify(`Session logged: ${actual} mins`, 'success');
+             window.modoOutbox.send('log_session', { minutes: parseInt(minutesLogged), task_id: taskId, room_id: settings.activeRoomId }).then(data => {
+                if (!data) {
+                    window.modoNotify(`Offline: ${minutesLogged} mins will sync on reconnect`, 'warning');
+                } else {
+                    const actual = data.logged_minutes !== undefined ? data.logged_minutes : minutesLogged;
+                    window.modoNotify(`Session logged: ${actual} mins`, 'success');
+                }
                 resetTimer();
             });
         }
@@ -573,12 +601,8 @@ document.addEventListener('DOMContentLoaded', () => {
         if (currentMode === 'focus') {
             sendNotification('Focus Complete!', 'Time for a break.');
             pauseTimer();
-            const csrfEl = document.querySelector('meta[name="csrf-token"]');
-            fetch('/api/log_session', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfEl ? csrfEl.content : ''},
-                body: JSON.stringify({ minutes: parseInt(settings.focusDuration || 25), task_id: currentTaskId, room_id: settings.activeRoomId })
-            }).then(r => r.json()).then(data => {
+            // Queued in the outbox when offline; the break starts either way
+            window.modoOutbox.send('log_session', { minutes: parseInt(settings.focusDuration || 25), task_id: currentTaskId, room_id: settings.activeRoomId }).then(data => {
                 document.body.dispatchEvent(new CustomEvent('tasksChanged'));
                 currentMode = 'break';
                 secondsLeft = (settings.breakDuration || 5) * 60;
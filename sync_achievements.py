@@ -1,28 +1,20 @@
+import sys
 from app import app
-from models import User, db
-from services.achievement_service import check_achievements, seed_achievements
-from datetime import datetime, timedelta
+from services.achievement_service import reconcile_achievements, seed_achievements
 
-def sync():
+def sync(all_users=False):
     with app.app_context():
         print("Seeding achievements if missing...")
         seed_achievements()
-        
-        print("Checking achievements for active users (last 24h)...")
-        now = datetime.utcnow()
-        yesterday = now - timedelta(days=1)
-        users = User.query.filter(User.last_seen >= yesterday).all()
-        for user in users:
-            old_count = len(user.achievements)
-            check_achievements(user)
-            new_count = len(user.achievements)
-            if new_count > old_count:
-                print(f"User {user.username}: Unlocked {new_count - old_count} new achievements (Total: {new_count})")
-            else:
-                print(f"User {user.username}: Checked (Total: {new_count})")
-        
-        db.session.commit()
-        print(f"Sync complete for {len(users)} users.")
+
+        # Counters are maintained incrementally by log_session / friend accept,
+        # so only users without progress rows need a full pass here.
+        print("Reconciling achievement progress...")
+        results = reconcile_achievements(all_users=all_users)
+        for user, unlocked in results:
+            if unlocked:
+                print(f"User {user.username}: Unlocked {len(unlocked)} new achievements")
+        print(f"Reconcile complete for {len(results)} users.")
 
 if __name__ == "__main__":
-    sync()
+    sync(all_users='--all' in sys.argv)
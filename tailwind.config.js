@@ -0,0 +1,20 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  // Everything that can emit a class name: templates, front-end scripts, and the
+  // Python that builds notification/Genesis HTML
+  content: [
+    './templates/**/*.html',
+    './static/js/**/*.js',
+    './routes/**/*.py',
+    './services/**/*.py',
+    './utils.py',
+  ],
+  // settings.html renders accent swatches as bg-{{ color }}-600
+  safelist: [
+    { pattern: /^bg-(indigo|blue|green|red|purple|pink|orange)-600$/ },
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
@@ -1,5 +1,13 @@
+import os
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Read by app.py at import: in-memory database, no background threads, inline hooks and jobs
+os.environ.setdefault('MODO_TESTING', '1')
+
 from app import app
+from extensions import cache
 from models import db, User, Task, Project, StudyRoom, Event
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
@@ -9,9 +17,16 @@ def client():
     app.config['TESTING'] = True
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['WTF_CSRF_ENABLED'] = False # Disable CSRF for easier testing
+    app.config['POST_COMMIT_DEFERRED'] = False
+    app.config['JOB_EAGER'] = True
+    app.config['JOB_WORKER'] = False
+    app.config['REMINDER_SCHEDULER'] = False
+    app.config['ROOM_SWEEPER'] = False
+    app.config['PRESENCE_FLUSHER'] = False
 
     with app.test_client() as client:
         with app.app_context():
+            cache.clear()
             db.create_all()
             yield client
             db.session.remove()
@@ -29,3 +44,19 @@ def auth_client(client):
 @pytest.fixture
 def runner(client):
     return app.test_cli_runner()
+
+@contextmanager
+def _count_queries():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+@pytest.fixture
+def count_queries(client):
+    """`with count_queries() as statements:` records every SQL statement run inside the block."""
+    return _count_queries
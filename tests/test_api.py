@@ -22,6 +22,50 @@ def test_log_session_invalid(auth_client):
     response = client.post('/api/log_session', json={})
     assert response.status_code == 400
 
+def test_outbox_replay_logs_each_session_once(auth_client):
+    client, user = auth_client
+    task = Task(title="Offline Task", user_id=user.id, estimated_pomodoros=5)
+    from app import db
+    db.session.add(task)
+    db.session.commit()
+
+    session = {'minutes': 25, 'task_id': task.id, 'client_id': 'c0ffee00-0000-4000-8000-000000000001'}
+    # The original request got through before the connection dropped
+    assert client.post('/api/log_session', json=session).json['status'] == 'success'
+
+    response = client.post('/api/outbox', json={'items': [
+        {'id': session['client_id'], 'kind': 'log_session', 'body': session},
+        {'id': 'sync_presence', 'kind': 'sync_presence', 'body': {'mode': 'none'}},
+        {'id': 'x', 'kind': 'delete_everything', 'body': {}},
+    ]})
+    assert response.status_code == 200
+    assert response.json['results'] == {session['client_id']: 'duplicate', 'sync_presence': 'success', 'x': 'rejected'}
+    assert FocusSession.query.filter_by(user_id=user.id).count() == 1
+    assert db.session.get(Task, task.id).completed_pomodoros == 1
+
+def test_session_batch_is_idempotent(auth_client):
+    client, user = auth_client
+    from app import db
+    task = Task(title="Batch Task", user_id=user.id, estimated_pomodoros=3)
+    db.session.add(task)
+    db.session.commit()
+
+    sessions = [{'client_id': f'b0000000-0000-4000-8000-00000000000{i}', 'minutes': 25, 'task_id': str(task.id)}
+                for i in range(3)]
+    response = client.post('/api/sessions', json={'sessions': sessions + [{'minutes': 25}]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [results[s['client_id']]['status'] for s in sessions] == ['success'] * 3
+    assert len(results) == 3
+
+    # A retry of the whole batch changes nothing
+    retry = client.post('/api/sessions', json={'sessions': sessions}).json['results']
+    assert {r['status'] for r in retry.values()} == {'duplicate'}
+    assert FocusSession.query.filter_by(user_id=user.id).count() == 3
+    task = db.session.get(Task, task.id)
+    assert task.completed_pomodoros == 3 and task.status == 'done'
+    assert Notification.query.filter_by(user_id=user.id).count() == 1
+
 def test_next_priority_task(auth_client):
     client, user = auth_client
     from app import db
@@ -49,6 +93,34 @@ def test_sync_presence(auth_client):
     assert u.current_focus_mode == 'focus'
     assert u.current_focus_end is not None
 
+def test_sync_presence_buffers_heartbeats(auth_client, monkeypatch):
+    client, user = auth_client
+    from app import app, db
+    from services import presence_service
+    monkeypatch.setitem(app.config, 'PRESENCE_FLUSH_INTERVAL', 3600)
+
+    client.post('/api/sync_presence', json={'mode': 'focus', 'seconds_left': 600})
+    stored_end = db.session.get(User, user.id).current_focus_end
+
+    # Same mode, new countdown: only the live store moves
+    client.post('/api/sync_presence', json={'mode': 'focus', 'seconds_left': 60})
+    db.session.expire_all()
+    u = db.session.get(User, user.id)
+    assert u.current_focus_end == stored_end
+    live = presence_service.get_presence(u)
+    assert live['current_focus_end'] < stored_end
+
+    # Written by the worker's flusher without waiting for another heartbeat
+    app.extensions['presence_flusher'].run_once()
+    db.session.expire_all()
+    assert db.session.get(User, user.id).current_focus_end == live['current_focus_end']
+    assert presence_service.flush() == 0
+
+    # A transition is written through immediately
+    client.post('/api/sync_presence', json={'mode': 'break', 'seconds_left': 300})
+    db.session.expire_all()
+    assert db.session.get(User, user.id).current_focus_mode == 'break'
+
 def test_notifications(auth_client):
     client, user = auth_client
     from app import db
@@ -87,3 +159,73 @@ def test_update_settings(auth_client):
     assert u.theme_preference == 'dark'
     assert u.focus_duration == 50
     assert u.enable_vim_mode is True
+
+def test_notification_outbox_is_transactional(auth_client):
+    client, user = auth_client
+    from app import db
+    from utils import create_notification
+    create_notification(user.id, 'discarded')
+    db.session.rollback()
+    create_notification(user.id, 'kept')
+    create_notification(user.id, 'kept too')
+    assert Notification.query.filter_by(user_id=user.id).count() == 0
+    db.session.commit()
+    assert [n.message for n in Notification.query.order_by(Notification.id)] == ['kept', 'kept too']
+
+def test_genesis_broadcast_inserts_for_every_user(auth_client):
+    client, user = auth_client
+    from app import db
+    user.is_admin = True
+    db.session.add_all([User(username=f'node{i}', password_hash='x') for i in range(3)])
+    db.session.commit()
+
+    response = client.post('/api/genesis', json={'command': 'BROADCAST: maintenance at noon'})
+    assert b'4 NODES REACHED' in response.data
+    notes = Notification.query.filter_by(message='[SYSTEM_BROADCAST] maintenance at noon').all()
+    assert len(notes) == 4
+    assert all(n.created_at is not None and n.is_read is False for n in notes)
+
+def test_genesis_streams_model_reply(auth_client):
+    client, user = auth_client
+    from app import app, db
+    from extensions import genesis
+    from services.genesis_service import FakeClient
+    user.is_admin = True
+    db.session.commit()
+
+    original = genesis.client
+    try:
+        genesis.client = FakeClient(reply="TASK_EXTRACTION_COMPLETE. Write report | 2")
+        response = client.post('/api/genesis', json={'command': 'make a todo write report with 2 poms'},
+                               headers={'Accept': 'text/event-stream'})
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert body.count('event: chunk') > 1
+        assert 'TASK_ALLOCATED: Write report. 2 POMS COMMITTED.' in body.split('event: done')[1]
+        task = Task.query.filter_by(title='Write report').one()
+
+        # Follow-ups find the task even though the streamed reply couldn't touch the session
+        response = client.post('/api/genesis', json={'command': 'SET POMODOROS TO 4'})
+        assert 'POMS REALLOCATED' in response.json['response']
+        assert db.session.get(Task, task.id).estimated_pomodoros == 4
+
+        # Every slot busy: turned away instead of waiting
+        genesis.client = FakeClient(reply="I am operational.")
+        limit = genesis._executor._max_workers
+        for _ in range(limit):
+            genesis._slots.acquire()
+        try:
+            response = client.post('/api/genesis', json={'command': 'hello'})
+            assert response.json['response'].startswith('AI_CORE_SATURATED')
+        finally:
+            for _ in range(limit):
+                genesis._slots.release()
+        assert client.post('/api/genesis', json={'command': 'hello'}).json['response'] == 'I am operational.'
+
+        # A slow model call is cut off at the deadline
+        genesis.client = FakeClient(reply="too slow", delay=0.2)
+        genesis.timeout = 0.05
+        assert 'AI_CORE_TIMEOUT' in client.post('/api/genesis', json={'command': 'hello'}).json['response']
+    finally:
+        genesis.client = original
+        genesis.timeout = app.config['GENESIS_TIMEOUT']
@@ -0,0 +1,23 @@
+from services.cache_service import get_or_set, invalidate, invalidate_user, user_tag, leaderboard_tag
+
+def test_tag_invalidation(client):
+    calls = []
+    def build():
+        calls.append(1)
+        return len(calls)
+
+    assert get_or_set('demo', (1,), build, tags=(user_tag(1),)) == 1
+    assert get_or_set('demo', (1,), build, tags=(user_tag(1),)) == 1
+
+    # Other users' tags leave the entry alone
+    invalidate(user_tag(2))
+    assert get_or_set('demo', (1,), build, tags=(user_tag(1),)) == 1
+
+    invalidate_user(1)
+    assert get_or_set('demo', (1,), build, tags=(user_tag(1),)) == 2
+
+def test_multiple_tags(client):
+    tags = (user_tag(1), leaderboard_tag('habits'))
+    assert get_or_set('demo', ('x',), lambda: 'first', tags=tags) == 'first'
+    invalidate_user(leaderboards=('habits',))
+    assert get_or_set('demo', ('x',), lambda: 'second', tags=tags) == 'second'
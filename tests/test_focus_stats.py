@@ -0,0 +1,98 @@
+from models import User, FocusSession, UserFocusStats
+from services.focus_stats_service import get_focus_stats, check_focus_stats, reconcile_focus_stats
+from datetime import datetime
+
+def test_log_session_updates_focus_stats(auth_client):
+    client, user = auth_client
+    response = client.post('/api/log_session', json={'minutes': 25})
+    assert response.status_code == 200
+
+    stats = get_focus_stats(user.id)
+    assert stats['total_minutes'] == 25
+    assert stats['session_count'] == 1
+    assert stats['partner_minutes'] == 0
+    assert check_focus_stats() == []
+
+def test_direct_insert_updates_focus_stats(auth_client):
+    client, user = auth_client
+    from app import db
+    other = User(username='partner', password_hash='hash')
+    db.session.add(other)
+    db.session.commit()
+
+    db.session.add_all([
+        FocusSession(minutes=30, user_id=user.id, date=datetime.now()),
+        FocusSession(minutes=45, user_id=user.id, partner_id=other.id, date=datetime.now()),
+    ])
+    db.session.commit()
+
+    stats = get_focus_stats(user.id)
+    assert stats == {'total_minutes': 75, 'session_count': 2, 'partner_minutes': 45, 'partner_session_count': 1}
+    assert user.total_focus_hours == 75 / 60
+
+def test_reconcile_focus_stats(auth_client):
+    client, user = auth_client
+    from app import db
+    db.session.add(FocusSession(minutes=50, user_id=user.id))
+    db.session.commit()
+
+    # Simulate drift
+    UserFocusStats.query.filter_by(user_id=user.id).update({'total_minutes': 5})
+    db.session.commit()
+    assert len(check_focus_stats()) == 1
+
+    assert reconcile_focus_stats() == 1
+    assert check_focus_stats() == []
+    assert get_focus_stats(user.id)['total_minutes'] == 50
+
+def test_focus_stats_cli(runner, auth_client):
+    client, user = auth_client
+    from app import db
+    db.session.add(FocusSession(minutes=20, user_id=user.id))
+    db.session.commit()
+    db.session.query(UserFocusStats).delete()
+    db.session.commit()
+
+    result = runner.invoke(args=['focus-stats', 'check'])
+    assert result.exit_code == 1
+
+    result = runner.invoke(args=['focus-stats', 'reconcile'])
+    assert 'Reconciled focus stats for 1 user(s).' in result.output
+
+    result = runner.invoke(args=['focus-stats', 'check'])
+    assert result.exit_code == 0
+
+def test_daily_rollup_and_heatmap(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import FocusDaily
+    now = datetime.now()
+    db.session.add_all([
+        FocusSession(minutes=25, user_id=user.id, date=now),
+        FocusSession(minutes=35, user_id=user.id, date=now),
+    ])
+    db.session.commit()
+
+    rows = FocusDaily.query.filter_by(user_id=user.id).all()
+    assert len(rows) == 1
+    assert rows[0].minutes == 60
+    assert rows[0].sessions == 2
+
+    response = client.get('/stats')
+    assert response.status_code == 200
+    assert f'"{now.strftime("%Y-%m-%d")}": 60'.encode() in response.data
+
+def test_rebuild_focus_daily(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import FocusDaily
+    from services.focus_stats_service import rebuild_focus_daily
+    db.session.add(FocusSession(minutes=40, user_id=user.id, date=datetime(2026, 3, 1, 12, 0)))
+    db.session.commit()
+    FocusDaily.query.delete()
+    db.session.commit()
+
+    assert rebuild_focus_daily() == 1
+    row = FocusDaily.query.filter_by(user_id=user.id).one()
+    assert row.day.isoformat() == '2026-03-01'
+    assert row.minutes == 40
@@ -46,3 +46,29 @@ def test_index_page_noir_elements(auth_client):
     assert b'Command_Center' in response.data
     assert b'Initial_Task_Input_Protocol' in response.data
     assert b'ADD_TO_QUEUE' in response.data
+
+def test_built_assets_are_fingerprinted(auth_client):
+    client, user = auth_client
+    from app import app
+    from extensions import assets
+    from services.assets import is_immutable
+    original = assets.manifest
+    assets.manifest = {'app.css': 'dist/app.0123456789ab.css', 'vendor/htmx.min.js': 'dist/vendor/htmx.min.0123456789ab.js'}
+    try:
+        html = client.get('/').data.decode()
+        assert '/static/dist/app.0123456789ab.css' in html
+        assert '/static/dist/vendor/htmx.min.0123456789ab.js' in html
+        assert 'cdn.tailwindcss.com' not in html
+        # A new build registers a new service worker
+        assert f'/sw.js?v={assets.version}' in html
+    finally:
+        assets.manifest = original
+    assert 'cdn.tailwindcss.com' in client.get('/').data.decode()
+    assert is_immutable(None, '/static/dist/app.0123456789ab.css')
+    assert not is_immutable(None, '/static/js/sw.js')
+
+def test_service_worker_served_from_root(client):
+    response = client.get('/sw.js')
+    assert response.status_code == 200
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert b'modo-assets-' in response.data
@@ -0,0 +1,88 @@
+from datetime import timedelta
+import time
+import pytest
+from models import db, Job, JobLock
+from services.job_service import job, enqueue, claim_next, run_due_jobs, job_stats, _now
+
+calls = []
+
+@job('tests.flaky')
+def flaky(value, fail_times=0):
+    calls.append(value)
+    if len(calls) <= fail_times:
+        raise RuntimeError('boom')
+
+@pytest.fixture
+def queue(client, monkeypatch):
+    from app import app
+    calls.clear()
+    monkeypatch.setitem(app.config, 'JOB_EAGER', False)
+    return app
+
+def test_failed_job_retries_with_backoff(queue):
+    enqueue('tests.flaky', 'a', fail_times=1)
+    db.session.commit()
+
+    assert run_due_jobs() == 1
+    row = Job.query.one()
+    assert (row.status, row.attempts) == ('queued', 1)
+    assert 'RuntimeError: boom' in row.last_error
+    assert row.run_at >= row.finished_at + timedelta(seconds=queue.config['JOB_RETRY_BASE'])
+    # Not due again until the backoff has passed
+    assert run_due_jobs() == 0
+
+    row.run_at = _now()
+    db.session.commit()
+    assert run_due_jobs() == 1
+    row = Job.query.one()
+    assert (row.status, row.attempts, row.last_error) == ('done', 2, None)
+    assert calls == ['a', 'a']
+    stats = job_stats()['tests.flaky']
+    assert stats['counts'] == {'done': 1} and stats['attempts'] == 2
+
+def test_claim_lock_and_stale_lease(queue):
+    enqueue('tests.flaky', 'b')
+    db.session.commit()
+
+    # Another worker holds the SQLite claim lease
+    db.session.add(JobLock(name='claim', holder='other', expires_at=_now() + timedelta(seconds=60)))
+    db.session.commit()
+    assert claim_next('me') is None
+
+    JobLock.query.delete()
+    db.session.commit()
+    job_id, name, payload = claim_next('me')
+    assert name == 'tests.flaky' and payload['args'] == ['b']
+    assert claim_next('me') is None
+
+    # Its worker died: the job is handed out again once the lease runs out
+    row = db.session.get(Job, job_id)
+    row.heartbeat_at = _now() - timedelta(seconds=queue.config['JOB_LEASE_SECONDS'] + 1)
+    db.session.commit()
+    assert claim_next('me')[0] == job_id
+
+seen_by_other_worker = []
+
+@job('tests.slow')
+def slow(seconds):
+    time.sleep(seconds)
+    # Still running past the lease, but the heartbeat keeps it from being handed out again
+    seen_by_other_worker.append(claim_next('other'))
+
+def test_running_job_keeps_its_lease(queue, monkeypatch):
+    monkeypatch.setitem(queue.config, 'JOB_LEASE_SECONDS', 0.4)
+    monkeypatch.setitem(queue.config, 'JOB_HEARTBEAT_SECONDS', 0.1)
+    seen_by_other_worker.clear()
+    enqueue('tests.slow', 0.8)
+    db.session.commit()
+
+    assert run_due_jobs() == 1
+    assert seen_by_other_worker == [None]
+    assert Job.query.one().status == 'done'
+
+def test_enqueued_job_is_dropped_with_its_transaction(queue):
+    enqueue('tests.flaky', 'c')
+    db.session.rollback()
+    assert Job.query.count() == 0
+    with pytest.raises(KeyError):
+        enqueue('tests.missing')
@@ -48,3 +48,24 @@ def test_leaderboard_sync(auth_client):
     assert response.status_code == 200
     assert user.username.encode() in response.data
     assert b'45m' in response.data
+
+def test_leaderboard_weekly_focus(auth_client):
+    client, user = auth_client
+    from app import db
+    db.session.add(FocusSession(minutes=55, user_id=user.id, date=datetime.utcnow()))
+    db.session.add(FocusSession(minutes=500, user_id=user.id, date=datetime.utcnow() - timedelta(days=30)))
+    db.session.commit()
+
+    response = client.get('/leaderboard?category=focus&filter=weekly')
+    assert response.status_code == 200
+    assert b'55m' in response.data
+
+def test_leaderboard_cache_invalidated_by_log_session(auth_client):
+    client, user = auth_client
+    response = client.get('/leaderboard?category=focus')
+    assert b'25m' not in response.data
+
+    # Cached until a focus session for this category is logged through the API
+    client.post('/api/log_session', json={'minutes': 25})
+    response = client.get('/leaderboard?category=focus')
+    assert b'25m' in response.data
@@ -57,3 +57,69 @@ def test_habit_delete(auth_client):
     
     client.post(f'/habits/delete/{habit.id}')
     assert Habit.query.get(habit.id) is None
+
+def _render_task_list(client, user, extra):
+    from app import db
+    from models import Tag, Subtask
+    tag = Tag.query.filter_by(name='deep').first() or Tag(name='deep')
+    for i in range(extra):
+        task = Task(title=f'Task {i}', user_id=user.id, tags=[tag])
+        task.subtasks.append(Subtask(title='step'))
+        db.session.add(task)
+    db.session.commit()
+    db.session.expire_all()
+
+def test_task_list_query_count_is_constant(auth_client, count_queries):
+    client, user = auth_client
+    headers = {'HX-Request': 'true'}
+
+    _render_task_list(client, user, 3)
+    with count_queries() as small:
+        assert client.get('/', headers=headers).status_code == 200
+
+    _render_task_list(client, user, 30)
+    with count_queries() as large:
+        response = client.get('/', headers=headers)
+    assert response.data.count(b'Task ') >= 33
+    assert len(large) == len(small)
+
+    _render_task_list(client, user, 0)
+    with count_queries() as timer_small:
+        client.get('/api/timer_tasks')
+    _render_task_list(client, user, 10)
+    with count_queries() as timer_large:
+        client.get('/api/timer_tasks')
+    assert len(timer_large) == len(timer_small)
+
+def test_task_search_index(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import Tag, Subtask
+    headers = {'HX-Request': 'true'}
+    plain = Task(title='Buy groceries', user_id=user.id)
+    deep = Task(title='Quarterly report', description='numbers for the board', user_id=user.id, tags=[Tag(name='finance')])
+    deep.subtasks.append(Subtask(title='Collect invoices'))
+    db.session.add_all([plain, deep])
+    db.session.commit()
+
+    # Descriptions, subtasks, tags and prefixes all match
+    for q in ['board', 'invoices', 'financ', 'quart rep']:
+        response = client.get(f'/?q={q}', headers=headers)
+        assert b'Quarterly report' in response.data, q
+        assert b'Buy groceries' not in response.data, q
+
+    # Title hits outrank description hits
+    Task.query.filter_by(title='Buy groceries').one().title = 'Board meeting'
+    db.session.commit()
+    response = client.get('/?q=board', headers=headers)
+    assert response.data.index(b'Board meeting') < response.data.index(b'Quarterly report')
+
+    # Edits and deletes keep the index in sync
+    deep.subtasks[0].title = 'Chase receipts'
+    db.session.commit()
+    assert b'Quarterly report' not in client.get('/?q=invoices', headers=headers).data
+    db.session.delete(deep)
+    db.session.commit()
+    assert b'Quarterly report' not in client.get('/?q=board', headers=headers).data
+    # Query syntax is treated as plain words
+    assert client.get('/?q=%22OR%20*', headers=headers).status_code == 200
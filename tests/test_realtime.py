@@ -0,0 +1,58 @@
+from app import app
+from models import StudyRoom
+from services.realtime import InProcessBroker, user_topic, room_topic
+
+def test_in_process_broker_fan_out():
+    broker = InProcessBroker()
+    sub_a = broker.subscribe([user_topic(1)])
+    sub_b = broker.subscribe([user_topic(2), room_topic(7)])
+
+    broker.publish(user_topic(1), 'notification', {'id': 3})
+    broker.publish(room_topic(7), 'chat', {'id': 9})
+
+    assert sub_a.get(timeout=0.1) == {'topic': 'user:1', 'event': 'notification', 'data': {'id': 3}}
+    assert sub_a.get(timeout=0.01) is None
+    assert sub_b.get(timeout=0.1)['event'] == 'chat'
+
+    sub_a.close()
+    broker.publish(user_topic(1), 'notification')
+    assert sub_a.get(timeout=0.01) is None
+
+def test_event_stream_pushes_notification(auth_client):
+    client, user = auth_client
+    user_id = user.id
+    app.config['REALTIME_HEARTBEAT'] = 0.05
+    app.config['REALTIME_STREAM_TIMEOUT'] = 0.3
+    try:
+        response = client.get('/api/events', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+        from app import db
+        from utils import create_notification
+        # Queued in the outbox; pushed once the transaction commits
+        create_notification(user_id, 'Pushed')
+        db.session.commit()
+
+        body = b''.join(response.response).decode()
+        assert body.startswith('retry:')
+        assert 'event: notification' in body
+    finally:
+        app.config['REALTIME_HEARTBEAT'] = 15
+        app.config['REALTIME_STREAM_TIMEOUT'] = 55
+
+def test_chat_post_publishes_to_room(auth_client):
+    client, user = auth_client
+    from app import db
+    from extensions import realtime
+    room = StudyRoom(host_id=user.id, guest_id=user.id, status='active')
+    db.session.add(room)
+    db.session.commit()
+
+    sub = realtime.subscribe([room_topic(room.id)])
+    try:
+        client.post(f'/study/room/{room.id}/chat', data={'message': 'Hi'})
+        message = sub.get(timeout=0.5)
+        assert message['event'] == 'chat'
+    finally:
+        sub.close()
@@ -44,3 +44,87 @@ def test_delete_event(auth_client):
     
     client.post(f'/schedule/delete/{event.id}')
     assert db.session.get(Event, event.id) is None
+
+def test_event_reminders_fire_once_and_recur(auth_client):
+    client, user = auth_client
+    from app import db
+    from datetime import timedelta, timezone
+    from models import EventReminder, Notification
+    from services.reminder_service import fire_due_reminders
+
+    start = datetime.now(timezone.utc) + timedelta(minutes=10)
+    client.post('/schedule/add', data={
+        'title': 'Standup',
+        'start_time': start.strftime('%Y-%m-%dT%H:%M'),
+        'end_time': (start + timedelta(minutes=15)).strftime('%Y-%m-%dT%H:%M'),
+        'recurrence': 'daily'
+    })
+    reminder = EventReminder.query.one()
+    assert reminder.fire_at <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # Heartbeats no longer scan the calendar
+    client.post('/api/sync_presence', json={'mode': 'focus', 'seconds_left': 60})
+    assert Notification.query.filter(Notification.message.like('EVENT_STARTING%')).count() == 0
+
+    assert len(fire_due_reminders()) == 1
+    assert fire_due_reminders() == []
+    assert Notification.query.filter_by(message='EVENT_STARTING: Standup').count() == 1
+
+    # Daily events move on to tomorrow's occurrence
+    db.session.expire_all()
+    reminder = EventReminder.query.one()
+    assert reminder.occurrence_start.date() == (start + timedelta(days=1)).date()
+
+def test_delete_event_drops_reminder(auth_client):
+    client, user = auth_client
+    from app import db
+    from datetime import timedelta
+    from models import EventReminder
+    start = datetime.now() + timedelta(days=2)
+    client.post('/schedule/add', data={
+        'title': 'Once',
+        'start_time': start.strftime('%Y-%m-%dT%H:%M'),
+        'end_time': (start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+    })
+    event = Event.query.filter_by(title='Once').one()
+    assert EventReminder.query.count() == 1
+
+    client.post(f'/schedule/delete/{event.id}')
+    assert EventReminder.query.count() == 0
+
+def test_recurrence_rule_expansion():
+    from datetime import date
+    from utils import RecurrenceRule
+
+    def days(rule, start, end):
+        return [d.date() for d in rule.between(start, end)]
+
+    # Wednesday 2026-01-07 09:00
+    start = datetime(2026, 1, 7, 9, 0)
+    weekly = RecurrenceRule(start, 'weekly')
+    assert days(weekly, date(2030, 1, 1), date(2030, 1, 14)) == [date(2030, 1, 2), date(2030, 1, 9)]
+
+    custom = RecurrenceRule(start, 'custom', [0, 4])
+    assert days(custom, date(2026, 1, 1), date(2026, 1, 12)) == [date(2026, 1, 9), date(2026, 1, 12)]
+
+    # The 31st only exists in some months
+    monthly = RecurrenceRule(datetime(2026, 1, 31, 8, 0), 'monthly')
+    assert days(monthly, date(2026, 1, 1), date(2026, 5, 31)) == [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)]
+
+    once = RecurrenceRule(start, 'none')
+    assert days(once, date(2026, 1, 8), date(2026, 2, 1)) == []
+    assert next(weekly.between(date(2026, 1, 1), date(2026, 1, 31))).hour == 9
+
+def test_expand_events_custom_days(auth_client):
+    client, user = auth_client
+    from app import db
+    from datetime import date
+    from utils import expand_events
+    event = Event(title='Gym', start_time=datetime(2026, 1, 5, 18, 0), end_time=datetime(2026, 1, 5, 19, 0),
+                  recurrence='custom', recurrence_days='1,3', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+
+    occurrences = expand_events([event], date(2026, 1, 5), date(2026, 1, 11))
+    assert [o.start_time.date() for o in occurrences] == [date(2026, 1, 6), date(2026, 1, 8)]
+    assert occurrences[0].end_time - occurrences[0].start_time == (event.end_time - event.start_time)
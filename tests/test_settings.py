@@ -2,3 +2,24 @@ def test_settings_view(auth_client):
     client, user = auth_client
     response = client.get('/settings/')
     assert response.status_code == 200
+
+def test_request_memo_computes_once(client):
+    from app import app
+    from utils import request_memo
+    calls = []
+    with app.test_request_context('/'):
+        for _ in range(3):
+            assert request_memo('answer', lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 1
+
+def test_amoled_unlock_and_unread_count_rendered(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import FocusSession, Notification
+    db.session.add(FocusSession(minutes=600, user_id=user.id))
+    db.session.add(Notification(user_id=user.id, message='ping'))
+    db.session.commit()
+
+    response = client.get('/settings/')
+    assert b'const amoledUnlocked = true;' in response.data
+    assert b'unreadCount: 1 }' in response.data
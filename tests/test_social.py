@@ -63,3 +63,134 @@ def test_reject_friend_request(auth_client):
     
     client.post(f'/friend/respond/{user.id}/reject')
     assert Friendship.query.filter_by(user_id=user.id, friend_id=friend.id).first() is None
+
+def test_search_friends_index_and_statuses(auth_client, count_queries):
+    client, user = auth_client
+    from app import db
+    from services.search_service import search_usernames
+    names = ['maplewood', 'Maple', 'oldmaple', 'map_le', 'birch']
+    others = [User(username=n, password_hash='x') for n in names]
+    db.session.add_all(others)
+    db.session.commit()
+    db.session.add(Friendship(user_id=user.id, friend_id=others[0].id, status='accepted'))
+    db.session.add(Friendship(user_id=others[2].id, friend_id=user.id, status='pending'))
+    db.session.commit()
+
+    # Substring match through the trigram index, exact then prefix matches first
+    assert [name for _, name, _ in search_usernames('maple')] == ['Maple', 'maplewood', 'oldmaple']
+    # Wildcards in the input are taken literally; short queries match on prefix
+    assert [name for _, name, _ in search_usernames('a_l')] == []
+    assert [name for _, name, _ in search_usernames('ma')] == ['Maple', 'map_le', 'maplewood']
+
+    with count_queries() as statements:
+        response = client.post('/friends/search', data={'username': 'MAPLE'})
+    assert b'Friend' in response.data and b'Request Received' in response.data and b'Add' in response.data
+    assert sum('friendship' in s.lower() for s in statements) == 1
+
+    # A repeat of the same prefix is served from the cache
+    with count_queries() as statements:
+        client.post('/friends/search', data={'username': 'maple'})
+    assert not any('user_search' in s for s in statements)
+
+    # Renames are re-indexed in the same flush
+    others[4].username = 'maplebirch'
+    db.session.commit()
+    assert 'maplebirch' in [name for _, name, _ in search_usernames('maple', limit=10)]
+
+def _add_friends(db, user, start, count):
+    for i in range(start, start + count):
+        friend = User(username=f'pal{i}', password_hash='x')
+        db.session.add(friend)
+        db.session.flush()
+        task = Task(title=f'Task of pal{i}', user_id=friend.id)
+        db.session.add(task)
+        db.session.flush()
+        friend.current_task_id = task.id
+        friend.current_focus_mode = 'focus'
+        friend.last_seen = datetime.utcnow()
+        friend.current_focus_end = datetime.utcnow() + timedelta(minutes=20)
+        db.session.add(Friendship(user_id=user.id, friend_id=friend.id, status='accepted'))
+    db.session.commit()
+
+def test_friends_list_presence_snapshot(auth_client, count_queries):
+    client, user = auth_client
+    from app import db
+    from services.presence_service import presence_snapshot
+    _add_friends(db, user, 0, 2)
+    pal0 = User.query.filter_by(username='pal0').first()
+    db.session.add(StudyRoom(host_id=pal0.id, status='active'))
+    db.session.commit()
+
+    snap = presence_snapshot([pal0.id])[pal0.id]
+    assert snap.task_title == 'Task of pal0' and snap.is_syncing and snap.is_online
+
+    client.get('/friends')  # Warm the per-user caches the layout reads
+    with count_queries() as statements:
+        response = client.get('/friends')
+    assert b'pal1' in response.data
+    baseline = len(statements)
+
+    _add_friends(db, user, 2, 5)
+    client.get('/friends')
+    with count_queries() as statements:
+        response = client.get('/friends')
+    assert b'pal6' in response.data
+    assert len(statements) == baseline
+
+def test_friend_links_are_symmetric(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import FriendLink
+    from services import friend_service
+    friend = User(username='mirror', password_hash=generate_password_hash('pass', method='scrypt'))
+    db.session.add(friend)
+    db.session.commit()
+
+    client.post(f'/friend/request/{friend.id}')
+    assert not friend_service.are_friends(user.id, friend.id)
+    assert friend_service.friendship_status(friend.id, user.id) == 'received'
+
+    client.get('/logout')
+    client.post('/login', data={'username': 'mirror', 'password': 'pass'})
+    client.post(f'/friend/respond/{user.id}/accept')
+    assert friend_service.are_friends(user.id, friend.id) and friend_service.are_friends(friend.id, user.id)
+    assert friend_service.friend_ids(user.id) == [friend.id]
+    assert friend_service.friend_count(friend.id) == 1
+
+    # The table can be rebuilt from Friendship alone
+    assert friend_service.rebuild_friend_links() == 2
+
+    client.post(f'/friend/respond/{user.id}/remove')
+    assert FriendLink.query.count() == 0
+    assert friend_service.friendship_status(user.id, friend.id) == 'none'
+
+def test_friend_suggestions_rank_mutual_friends(auth_client):
+    client, user = auth_client
+    from app import db
+    from models import Project, ProjectMember
+    from services.suggestion_service import rebuild_suggestions, get_suggestions
+    bridge, mutual, coworker, stranger, banned = [User(username=n, password_hash='x') for n in
+                                                  ('bridge', 'mutual', 'coworker', 'stranger', 'outcast')]
+    banned.is_banned = True
+    db.session.add_all([bridge, mutual, coworker, stranger, banned])
+    db.session.flush()
+    for a, b in ((user, bridge), (bridge, mutual), (bridge, banned)):
+        db.session.add(Friendship(user_id=a.id, friend_id=b.id, status='accepted'))
+    project = Project(name='Shared', owner_id=user.id)
+    db.session.add(project)
+    db.session.flush()
+    db.session.add_all([ProjectMember(project_id=project.id, user_id=user.id, role='owner'),
+                        ProjectMember(project_id=project.id, user_id=coworker.id)])
+    db.session.commit()
+
+    assert rebuild_suggestions(batch_size=2) > 0
+    assert [u.username for u in get_suggestions(user.id)] == ['mutual', 'coworker']
+
+    # A request sent after the job ran removes the suggestion right away
+    client.post(f'/friend/request/{mutual.id}')
+    assert [u.username for u in get_suggestions(user.id)] == ['coworker']
+    response = client.get('/friends')
+    assert b'Suggested_Nodes' in response.data and b'coworker' in response.data
+
+    # Isolated users still get someone, sampled by id range
+    assert get_suggestions(stranger.id)
@@ -50,3 +50,89 @@ def test_chat(auth_client):
     
     response = client.get(f'/study/room/{room.id}/chat')
     assert b'Hello' in response.data
+
+def test_chat_cursor_and_pagination(auth_client):
+    client, user = auth_client
+    from app import db
+    from routes.study import CHAT_PAGE_SIZE
+    room = StudyRoom(host_id=user.id, guest_id=user.id, status='active')
+    db.session.add(room)
+    db.session.commit()
+    messages = [ChatMessage(room_id=room.id, user_id=user.id, message=f'msg-{i:03d}') for i in range(CHAT_PAGE_SIZE + 5)]
+    db.session.add_all(messages)
+    db.session.commit()
+
+    # Initial load is capped to the latest page with a link to older history
+    response = client.get(f'/study/room/{room.id}/chat')
+    assert f'msg-{CHAT_PAGE_SIZE + 4:03d}'.encode() in response.data
+    assert b'msg-004' not in response.data
+    assert b'LOAD_OLDER_SIGNALS' in response.data
+
+    response = client.get(f'/study/room/{room.id}/chat?before_id={messages[5].id}')
+    assert b'msg-000' in response.data and b'msg-004' in response.data
+    assert b'msg-005' not in response.data
+    assert b'LOAD_OLDER_SIGNALS' not in response.data
+
+    # Cursor polls return only messages after the last one the client has
+    last_id = messages[-1].id
+    response = client.get(f'/study/room/{room.id}/chat?after_id={last_id}')
+    assert b'data-chat-id' not in response.data
+
+    response = client.post(f'/study/room/{room.id}/chat', data={'message': 'fresh', 'after_id': last_id})
+    assert b'fresh' in response.data
+    assert b'msg-' not in response.data
+
+def test_state_version_long_poll(auth_client):
+    client, user = auth_client
+    from app import app, db
+    import time
+    room = StudyRoom(host_id=user.id, guest_id=user.id, status='active')
+    db.session.add(room)
+    db.session.commit()
+    room_id = room.id
+
+    state = client.get(f'/study/state/{room_id}').json
+    assert state['version'] == 0 and not state['is_running'] and state['ends_at'] is None
+
+    res = client.post('/study/control', json={'room_id': room_id, 'action': 'start'})
+    assert res.json['version'] == 1
+
+    # A stale version answers immediately, with the end instant to count down to
+    state = client.get(f'/study/state/{room_id}?since=0').json
+    assert state['version'] == 1 and state['is_running']
+    assert 0 < state['ends_at'] - state['server_time'] <= 25 * 60 * 1000
+
+    # An up-to-date version parks until the timeout when nothing changes
+    app.config['STUDY_STATE_LONGPOLL_TIMEOUT'] = 0.2
+    try:
+        started = time.monotonic()
+        state = client.get(f'/study/state/{room_id}?since=1').json
+        assert time.monotonic() - started >= 0.2
+        assert state['version'] == 1
+    finally:
+        app.config['STUDY_STATE_LONGPOLL_TIMEOUT'] = 25
+
+def test_long_poll_rechecks_without_cross_process_broker(auth_client, monkeypatch):
+    client, user = auth_client
+    from app import app, db
+    import threading, time
+    room = StudyRoom(host_id=user.id, guest_id=user.id, status='active')
+    db.session.add(room)
+    db.session.commit()
+    room_id = room.id
+    monkeypatch.setitem(app.config, 'STUDY_STATE_LONGPOLL_TIMEOUT', 5)
+    monkeypatch.setitem(app.config, 'STUDY_STATE_RECHECK_INTERVAL', 0.1)
+
+    # Another worker bumps the version; the in-process broker never hears about it
+    def bump():
+        with app.app_context():
+            db.session.execute(StudyRoom.__table__.update().where(StudyRoom.__table__.c.id == room_id)
+                               .values(state_version=1))
+            db.session.commit()
+    timer = threading.Timer(0.2, bump)
+    timer.start()
+    started = time.monotonic()
+    state = client.get(f'/study/state/{room_id}?since=0').json
+    timer.join()
+    assert state['version'] == 1
+    assert time.monotonic() - started < 2
@@ -28,10 +28,30 @@ def test_study_state_timeout(auth_client):
     db.session.add(room)
     db.session.commit()
     
-    # Trigger state check which should cleanup
+    # Polling reports the room as over without deleting anything
     res = client.get(f'/study/state/{room.id}')
     assert res.json['status'] == 'finished'
-    assert StudyRoom.query.get(room.id) is None
+    assert StudyRoom.query.get(room.id) is not None
+
+    # The sweeper removes it, its chat, and abandoned sync requests; fresh rooms stay
+    from models import ChatMessage
+    from services.room_service import sweep_all_rooms
+    db.session.add(ChatMessage(room_id=room.id, user_id=user.id, message='hi'))
+    pending = StudyRoom(host_id=user.id, guest_id=user.id, status='pending_sync',
+                        last_activity=datetime.utcnow() - timedelta(hours=2))
+    running = StudyRoom(host_id=user.id, guest_id=user.id, status='active',
+                        active_start_time=datetime.utcnow() - timedelta(minutes=40),
+                        last_activity=datetime.utcnow() - timedelta(minutes=40))
+    fresh = StudyRoom(host_id=user.id, status='waiting')
+    db.session.add_all([pending, running, fresh])
+    db.session.commit()
+    stale_id, pending_id = room.id, pending.id
+
+    assert sweep_all_rooms(batch_size=1) == 2
+    db.session.expire_all()
+    assert StudyRoom.query.get(stale_id) is None and StudyRoom.query.get(pending_id) is None
+    assert ChatMessage.query.filter_by(room_id=stale_id).count() == 0
+    assert StudyRoom.query.count() == 2
 
 def test_leave_room(auth_client):
     client, user = auth_client
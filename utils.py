@@ -1,6 +1,7 @@
-from flask import render_template
-from models import db, Notification, Event, EventCompletion
-from datetime import datetime, timedelta, timezone
+from flask import render_template, g, has_request_context
+from models import db, Notification, Event, EventCompletion, StudyRoom
+from datetime import date, datetime, timedelta, timezone
+import calendar
 
 def format_minutes(minutes):
     if not minutes:
@@ -16,9 +17,32 @@ def get_pending_invite(project, user_id):
     return ProjectInvite.query.filter_by(project_id=project.id, recipient_id=user_id, status='pending').first()
 
 def create_notification(user_id, message, type='info', event_id=None, project_id=None):
-    n = Notification(user_id=user_id, message=message, type=type, event_id=event_id, project_id=project_id)
-    db.session.add(n)
-    db.session.commit()
+    """Queue a notification in the current unit of work; it is inserted (and pushed) when the caller commits."""
+    from services.notification_service import queue_notification
+    queue_notification(user_id, message, type=type, event_id=event_id, project_id=project_id)
+
+def request_memo(key, factory):
+    """Compute a per-request value once; partials rendered later in the same request reuse it."""
+    if not has_request_context():
+        return factory()
+    memo = g.setdefault('_memo', {})
+    if key not in memo:
+        memo[key] = factory()
+    return memo[key]
+
+def get_active_room(user_id):
+    return request_memo(('active_room', user_id), lambda: StudyRoom.query.filter(
+        ((StudyRoom.host_id == user_id) | (StudyRoom.guest_id == user_id)),
+        StudyRoom.status == 'active'
+    ).first())
+
+def get_focus_minutes(user_id):
+    from services.focus_stats_service import get_focus_stats
+    return request_memo(('focus_minutes', user_id), lambda: get_focus_stats(user_id)['total_minutes'])
+
+def get_unread_count(user_id):
+    return request_memo(('unread_count', user_id),
+                        lambda: Notification.query.filter_by(user_id=user_id, is_read=False).count())
 
 class EventOccurrence:
     def __init__(self, event, start_time, is_completed):
@@ -35,32 +59,95 @@ def expand_events(events, start_date, end_date):
         return []
     
     event_ids = [e.id for e in events]
-    completions = EventCompletion.query.filter(
+    completions = db.session.query(EventCompletion.event_id, EventCompletion.date).filter(
         EventCompletion.event_id.in_(event_ids),
         EventCompletion.date >= start_date,
         EventCompletion.date <= end_date
     ).all()
     
-    comp_set = {(c.event_id, c.date) for c in completions}
+    comp_set = {(event_id, day) for event_id, day in completions}
     
-    occurrences = []
+    return list(iter_occurrences(events, start_date, end_date, comp_set))
+
+def iter_occurrences(events, start_date, end_date, comp_set=frozenset()):
+    """Lazily yield an EventOccurrence per occurrence in the window; comp_set holds (event_id, date) completions."""
     for event in events:
-        current = event.start_time.replace(tzinfo=timezone.utc) if event.start_time.tzinfo is None else event.start_time
-        
-        if event.recurrence == 'none':
-            if start_date <= current.date() <= end_date:
-                is_done = (event.id, current.date()) in comp_set or event.is_completed
-                occurrences.append(EventOccurrence(event, current, is_done))
-        
-        elif event.recurrence == 'daily':
-            iter_date = max(current.date(), start_date)
-            while iter_date <= end_date:
-                occ_start = datetime.combine(iter_date, current.time()).replace(tzinfo=timezone.utc)
-                is_done = (event.id, iter_date) in comp_set
-                occurrences.append(EventOccurrence(event, occ_start, is_done))
-                iter_date += timedelta(days=1)
-                
-    return occurrences
+        for occ_start in occurrence_starts(event, start_date, end_date):
+            if event.recurrence in (None, 'none'):
+                is_done = (event.id, occ_start.date()) in comp_set or event.is_completed
+            else:
+                is_done = (event.id, occ_start.date()) in comp_set
+            yield EventOccurrence(event, occ_start, is_done)
+
+def occurrence_starts(event, start_date, end_date):
+    """Yield the (UTC) start of each occurrence of event whose date falls within [start_date, end_date]."""
+    return RecurrenceRule.from_event(event).between(start_date, end_date)
+
+class RecurrenceRule:
+    """An event's recurrence, parsed once.
+
+    `between()` jumps straight to the first candidate in the window (by week or by
+    month) instead of walking from the event's start, and yields lazily, so long
+    windows over old recurring events stay cheap. Monthly rules skip months that
+    lack the start's day-of-month, as RFC 5545 rules do.
+    """
+
+    def __init__(self, dtstart, freq='none', weekdays=None):
+        self.dtstart = dtstart.replace(tzinfo=timezone.utc) if dtstart.tzinfo is None else dtstart
+        self.freq = freq if freq in ('daily', 'weekly', 'monthly', 'custom') else 'none'
+        if self.freq == 'weekly' or (self.freq == 'custom' and not weekdays):
+            weekdays = [self.dtstart.weekday()]
+        self.weekdays = sorted(set(weekdays or []))
+
+    @classmethod
+    def from_event(cls, event):
+        weekdays = []
+        for part in (event.recurrence_days or '').split(','):
+            part = part.strip()
+            if part.isdigit() and int(part) < 7:
+                weekdays.append(int(part))
+        return cls(event.start_time, event.recurrence or 'none', weekdays)
+
+    def _at(self, day):
+        return datetime.combine(day, self.dtstart.time()).replace(tzinfo=timezone.utc)
+
+    def between(self, start_date, end_date):
+        first_day = self.dtstart.date()
+        if self.freq == 'none':
+            if start_date <= first_day <= end_date:
+                yield self.dtstart
+            return
+
+        day = max(first_day, start_date)
+        if day > end_date:
+            return
+
+        if self.freq == 'daily':
+            while day <= end_date:
+                yield self._at(day)
+                day += timedelta(days=1)
+
+        elif self.freq in ('weekly', 'custom'):
+            week = day - timedelta(days=day.weekday())
+            while week <= end_date:
+                for weekday in self.weekdays:
+                    candidate = week + timedelta(days=weekday)
+                    if candidate > end_date:
+                        return
+                    if candidate >= day:
+                        yield self._at(candidate)
+                week += timedelta(days=7)
+
+        elif self.freq == 'monthly':
+            year, month = day.year, day.month
+            while date(year, month, 1) <= end_date:
+                if first_day.day <= calendar.monthrange(year, month)[1]:
+                    candidate = date(year, month, first_day.day)
+                    if candidate > end_date:
+                        return
+                    if candidate >= day:
+                        yield self._at(candidate)
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
 
 def log_project_action(project_id, action):
     from flask_login import current_user
@@ -80,27 +167,6 @@ def check_task_access(task):
         return member is not None
     return False
 
-def check_event_notifications(user):
-    from models import User, db
-    if isinstance(user, int):
-        user = db.session.get(User, user)
-    
-    if not user or not user.notify_event_start:
-        return
-        
-    now = datetime.now(timezone.utc)
-    # Check events starting in next X minutes
-    events = Event.query.filter_by(user_id=user.id).all()
-    for event in events:
-        # Simplified: only check 'none' recurrence for now
-        if event.recurrence == 'none':
-            start = event.start_time.replace(tzinfo=timezone.utc) if event.start_time.tzinfo is None else event.start_time
-            if now < start <= now + timedelta(minutes=user.event_notify_minutes or 30):
-                # Check if already notified (prevent spam)
-                existing = Notification.query.filter_by(user_id=user.id, event_id=event.id).first()
-                if not existing:
-                    create_notification(user.id, f"EVENT_STARTING: {event.title}", type='info', event_id=event.id)
-
 def get_username_html(user):
     if user.is_verified:
         return f'{user.username} <svg class="inline w-3 h-3 text-accent fill-current" viewBox="0 0 24 24"><path d="M23 12l-2.44-2.79.34-3.69-3.61-.82-1.89-3.2L12 2.96 8.6 1.5 6.71 4.7l-3.61.81.34 3.7L1 12l2.44 2.79-.34 3.69 3.61.82 1.89 3.2L12 21.04l3.4 1.46 1.89-3.2 3.61-.82-.34-3.69L23 12zm-12.91 4.72l-3.8-3.81 1.48-1.48 2.32 2.33 5.85-5.87 1.48 1.48-7.33 7.35z"/></svg>'